@@ -11,6 +11,7 @@ import os
 import xlrd
 import math
 import jqdata
+import indicators
 import numpy as np 
 import pandas as pd
 from six import BytesIO
@@ -36,6 +37,8 @@ def initialize(context):
     g.max_list_yesterday_count = []   #全局变量需要在头部先定义
     g.max_zt_days_of_yesterday = 1     #全局变量需要在头部先定义
     g.total_is_run = 0
+    g.zt_streaks = pd.Series(dtype=float)   #股票 -> 截至g.zt_date的非一字连板天数
+    g.zt_date = None
 
 def before_trading_start(context):
     count = 20
@@ -43,39 +46,16 @@ def before_trading_start(context):
     g.daily_buy_count  = 1
     g.today_bought_stocks = set() 
     
-    #--------------取20日涨停价，收盘价，最低价-----------------
-    g.high_limit = history(count,'1d','high_limit',g.stocks_exsit)
-    g.close = history(count,'1d','close',g.stocks_exsit)
-    g.low = history(count,'1d','low',g.stocks_exsit)
-    #--------------------------------------------
-    g.x1 = history(1,'1d','high_limit',g.stocks_exsit)##用来存今日涨停价，后面会重新赋值
-    for security in (g.stocks_exsit):
-        stock_data = get_price(security, end_date=context.current_dt.date(), frequency='daily', fields=['high_limit'],skip_paused=False,fq='pre', count=1)
-        g.x1[security][0] = stock_data['high_limit'][0]
-    #----------------------------------------
-    stocks_zt={}
-    
-    for security in (g.stocks_exsit):
-        if(g.close[security][-1] == g.high_limit[security][-1]\
-        and g.low[security][-1] < g.high_limit[security][-1]):
-            stocks_zt[security] = 1#昨日非一字板涨停
-    for security in (stocks_zt):
-        for i in range(0,count-1):
-            if(g.close[security][count-2-i] == g.high_limit[security][count-2-i]\
-            and g.low[security][count-2-i] < g.high_limit[security][count-2-i]):
-                stocks_zt[security] += 1#非一字连板天数
-            else:
-                break
+    stocks = list(g.stocks_exsit)
+    #--------------今日涨停价，一次取全部股票-----------------
+    g.x1 = get_price(stocks, end_date=context.current_dt.date(), frequency='daily', fields=['high_limit'],
+                     skip_paused=False, fq='pre', count=1, panel=False).pivot(index='time', columns='code', values='high_limit')
+    #--------------非一字连板天数（最多count天）-----------------
+    streaks = update_zt_streaks(context, stocks, count)
     #涨停最多天数
-    g.max_zt_days = 0
-    for key in  stocks_zt:
-        if(stocks_zt[key] > g.max_zt_days):
-            g.max_zt_days = stocks_zt[key]
+    g.max_zt_days = int(streaks.max()) if len(streaks) else 0
     
-    g.buy_list = []
-    for key in  stocks_zt:
-        if(stocks_zt[key] == g.max_zt_days):
-            g.buy_list.append(key)
+    g.buy_list = streaks.index[streaks == g.max_zt_days].tolist() if g.max_zt_days > 0 else []
     if len(g.buy_list):
         log.info('___'*10)
         log.info('股票池：%d 最高板：%d'%(len(g.buy_list),g.max_zt_days))
@@ -135,28 +115,44 @@ def handle_data(context, data):
                     if not result==None:
                         g.today_bought_stocks.add(security)
                         log.info("买入： %s %s" % (current[security].name,security))
+
+def update_zt_streaks(context, stocks, count):
+    '''
+    增量维护 g.zt_streaks，返回 stocks 截至上一交易日的非一字连板天数（最多count天）
+    每天只取上一交易日一天的行情接到昨天的结果上；新加入的股票（或中间漏了交易日时全部股票）取count天行情重新计算
+    '''
+    fields = ['close', 'high_limit', 'low']
+    last_date = jqdata.get_trade_days(end_date=context.previous_date, count=2)[0]
+    if g.zt_date != last_date:
+        g.zt_streaks = pd.Series(dtype=float)
+    streaks = g.zt_streaks.reindex(stocks)
+    old_stocks = streaks.index[streaks.notna()].tolist()
+    new_stocks = streaks.index[streaks.isna()].tolist()
+    if old_stocks:
+        df = get_price(old_stocks, end_date=context.previous_date, frequency='daily', fields=fields,
+                       skip_paused=False, fq='pre', count=1, panel=False).set_index('code')
+        hit = ((df['close'] == df['high_limit']) & (df['low'] < df['high_limit'])).reindex(old_stocks, fill_value=False)
+        streaks.loc[old_stocks] = np.where(hit.values, np.minimum(streaks.loc[old_stocks].values + 1, count), 0)
+    if new_stocks:
+        df = get_price(new_stocks, end_date=context.previous_date, frequency='daily', fields=fields,
+                       skip_paused=False, fq='pre', count=count, panel=False)
+        close, high_limit, low = [df.pivot(index='time', columns='code', values=f).reindex(columns=new_stocks).values
+                                  for f in fields]
+        streaks.loc[new_stocks] = indicators.streaks((close == high_limit) & (low < high_limit))
+    g.zt_streaks = streaks.astype(int)
+    g.zt_date = context.previous_date
+    return g.zt_streaks
+
 #直线拟合
 def fit_linear(context,count):
     '''
     count:拟合天数
+    上证指数最近count个交易日收盘价的最小二乘斜率 m（y = mx + c），保留两位小数
+    日线数据一天只变一次，indicators 按交易日缓存，盘中每分钟调用不再重新取数拟合
     '''
-    from sklearn.linear_model import LinearRegression
     security = '000001.XSHG'
-    df = history(count=count, unit='1d', field='close', security_list=security, df=True, skip_paused=False, fq='pre')
-    model = LinearRegression()
-    x_train = np.arange(0,len(df[security])).reshape(-1,1)
-    y_train = df[security].values.reshape(-1,1)
-    # print(x_train,y_train)
-    
-    model.fit(x_train,y_train)
-    
-    # # 计算出拟合的最小二乘法方程
-    # # y = mx + c 
-    c = model.intercept_
-    m = model.coef_
-    c1 = round(float(c),2)
+    m = indicators.daily('slope', security, count, context)
     m1 = round(float(m),2)
-    # print("最小二乘法方程 : y = {} + {}x".format(c1,m1))
     return m1
 
 def before_market_open(context):
@@ -0,0 +1,229 @@
+# akshare 请求级缓存
+# 以 (接口名, 规范化后的参数) 为键，把返回的 DataFrame 以 pickle 二进制文件存到本地，索引放在 SQLite 里。
+# 每个接口有自己的过期策略：历史行情永不过期，股票列表等按天过期；总大小超过预算时按最近最少使用淘汰。
+# 用法：把 `import akshare as ak` 换成 `from ak_cache import ak`，调用方式不变，未命中时通过 fetch_engine 下载。
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import inspect
+import functools
+import threading
+from datetime import datetime
+
+import akshare
+
+import fetch_engine
+from config import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, 'ak_cache')
+BLOB_DIR = os.path.join(CACHE_DIR, 'blobs')
+DB_FILE = os.path.join(CACHE_DIR, 'index.sqlite')
+
+# 缓存占用磁盘的上限（字节）
+DISK_BUDGET = 2 * 1024 ** 3
+
+FOREVER = 'forever'
+DAILY = 'daily'
+
+# 各接口的过期策略：FOREVER、DAILY（当天有效）或秒数；0 表示不缓存
+TTL = {
+    'stock_info_a_code_name': DAILY,
+    'tool_trade_date_hist_sina': DAILY,
+    'stock_zh_a_hist': DAILY,
+    'stock_individual_info_em': DAILY,
+    'stock_financial_abstract_ths': DAILY,
+    'stock_financial_report_em': DAILY,
+    'stock_holder_change': DAILY,
+    'stock_gdfx_top_10_em': FOREVER,
+    'stock_zh_a_disclosure_report_cninfo': DAILY,
+    'stock_zh_a_gdhs': DAILY,
+    'stock_zh_a_gdhs_detail_em': DAILY,
+    'stock_yjbb_em': DAILY,
+    'stock_hsgt_stock_statistics_em': DAILY,
+}
+DEFAULT_TTL = DAILY
+
+_lock = threading.Lock()
+_conn = None
+_stats = {}
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        # 多个进程可能同时读写同一个缓存，等锁的时间放宽一些
+        _conn = sqlite3.connect(DB_FILE, check_same_thread=False, timeout=30)
+        _conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            expires REAL,
+            last_access REAL NOT NULL)''')
+        _conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON entries (last_access)')
+        _conn.commit()
+    return _conn
+
+
+def _counter(endpoint):
+    return _stats.setdefault(endpoint, {'hits': 0, 'misses': 0, 'errors': 0})
+
+
+def _normalize(func, args, kwargs):
+    """把位置参数、关键字参数和默认值统一成一个有序字典，作为缓存键的一部分"""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+    except (TypeError, ValueError):
+        params = {'args': list(args), **kwargs}
+    return params
+
+
+def _expires_at(endpoint, params, now):
+    """按接口的过期策略计算过期时间，None 表示永不过期"""
+    ttl = TTL.get(endpoint, DEFAULT_TTL)
+    # 结束日期早于今天的历史区间数据不会再变化
+    end_date = params.get('end_date')
+    if end_date and ttl == DAILY:
+        try:
+            if datetime.strptime(str(end_date).replace('-', '')[:8], '%Y%m%d').date() < datetime.now().date():
+                ttl = FOREVER
+        except ValueError:
+            pass
+    if ttl == FOREVER:
+        return None
+    if ttl == DAILY:
+        tomorrow = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() + 86400
+        return tomorrow
+    return now + ttl
+
+
+def _evict(conn):
+    """总大小超过预算时，按最近访问时间从旧到新删除"""
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+    if total <= DISK_BUDGET:
+        return
+    for key, path, size in conn.execute('SELECT key, path, size FROM entries ORDER BY last_access').fetchall():
+        if total <= DISK_BUDGET:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        total -= size
+
+
+def _get(key, now):
+    with _lock:
+        conn = _connect()
+        row = conn.execute('SELECT path, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        path, expires = row
+        if expires is not None and expires <= now:
+            return False, None
+        conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        conn.commit()
+    try:
+        with open(path, 'rb') as f:
+            return True, pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return False, None
+
+
+def _put(key, endpoint, value, expires, now):
+    path = os.path.join(BLOB_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    with _lock:
+        conn = _connect()
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (key, endpoint, path, len(data), now, expires, now))
+        _evict(conn)
+        conn.commit()
+
+
+def cached(func):
+    """给一个 akshare 接口加上缓存，未命中时通过 fetch_engine 下载"""
+    endpoint = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        params = _normalize(func, args, kwargs)
+        ttl = TTL.get(endpoint, DEFAULT_TTL)
+        if ttl == 0:
+            return fetch_engine.call(func, *args, **kwargs)
+        key = json.dumps([endpoint, params], sort_keys=True, ensure_ascii=False, default=str)
+        now = time.time()
+        hit, value = _get(key, now)
+        counter = _counter(endpoint)
+        if hit:
+            counter['hits'] += 1
+            return value
+        counter['misses'] += 1
+        value = fetch_engine.call(func, *args, **kwargs)
+        try:
+            _put(key, endpoint, value, _expires_at(endpoint, params, now), now)
+        except Exception as e:
+            counter['errors'] += 1
+            print(f"写入缓存 {endpoint} 失败: {e}")
+        return value
+
+    return wrapper
+
+
+class CachedAkshare:
+    """akshare 模块的代理，所有公开接口自动带上缓存"""
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if name.startswith('_') or not inspect.isfunction(attr):
+            return attr
+        wrapped = cached(attr)
+        setattr(self, name, wrapped)
+        return wrapped
+
+
+ak = CachedAkshare(akshare)
+
+
+def stats():
+    """各接口的命中/未命中次数"""
+    return {endpoint: dict(counter) for endpoint, counter in _stats.items()}
+
+
+def disk_usage():
+    """缓存条目数和占用的字节数"""
+    with _lock:
+        count, size = _connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+    return {'entries': count, 'bytes': size}
+
+
+def clear(endpoint=None):
+    """清空全部缓存，或只清空某个接口的缓存"""
+    with _lock:
+        conn = _connect()
+        if endpoint is None:
+            rows = conn.execute('SELECT key, path FROM entries').fetchall()
+        else:
+            rows = conn.execute('SELECT key, path FROM entries WHERE endpoint = ?', (endpoint,)).fetchall()
+        for key, path in rows:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+        conn.commit()
@@ -0,0 +1,299 @@
+# 本地公告库
+# 每只股票记录已经同步过的日期区间（可以有多段），增量同步时只下载缺失的部分；
+# 公告标题、时间、链接存成一张列式表（Parquet）。
+# 查询时先用标题的二元字倒排索引缩小候选范围，再用 Aho-Corasick 自动机一次匹配多个关键词，
+# 全市场“哪些股票发了重整/重组公告”只需要在本地数据上扫一遍。
+import os
+import json
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+import fetch_engine
+from config import DATA_DIR
+
+ANN_DIR = os.path.join(DATA_DIR, 'announcements')
+TABLE_FILE = os.path.join(ANN_DIR, 'announcements.parquet')
+COVERAGE_FILE = os.path.join(ANN_DIR, '_coverage.json')
+
+# 每批并发同步这么多只股票，每批结束落盘一次
+FLUSH_EVERY = 200
+RESTRUCTURING_KEYWORDS = ['重整', '重组', '破产', '清算']
+
+COLUMNS = ['股票代码', '公告标题', '公告时间', '公告链接']
+# 不同版本的 akshare 返回的列名不同
+_RENAME = {
+    '代码': '股票代码', 'announcement_title': '公告标题',
+    'announcement_time': '公告时间', 'announcement_url': '公告链接',
+    '公告日期': '公告时间', '网址': '公告链接',
+}
+
+_lock = threading.RLock()
+_table = None
+_coverage = None
+_index = None
+
+
+class AhoCorasick:
+    """多关键词匹配自动机：一次扫描文本，找出其中出现的全部关键词"""
+
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].add(keyword)
+        # 按层次遍历建立失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+
+    def find(self, text):
+        """text 中出现的关键词集合"""
+        state = 0
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+def _to_date_str(date):
+    return pd.to_datetime(date).strftime('%Y%m%d')
+
+
+def _load():
+    global _table, _coverage
+    if _table is None:
+        if os.path.exists(TABLE_FILE):
+            _table = pd.read_parquet(TABLE_FILE)
+        else:
+            _table = pd.DataFrame({column: pd.Series(dtype=object) for column in COLUMNS})
+            _table['公告时间'] = pd.to_datetime(_table['公告时间'])
+        if os.path.exists(COVERAGE_FILE):
+            with open(COVERAGE_FILE, 'r', encoding='utf-8') as f:
+                _coverage = json.load(f)
+            # 旧版本每只股票只记一段 [a, b]
+            for symbol, covered in _coverage.items():
+                if covered and isinstance(covered[0], str):
+                    _coverage[symbol] = [covered]
+        else:
+            _coverage = {}
+
+
+def _save():
+    os.makedirs(ANN_DIR, exist_ok=True)
+    tmp = TABLE_FILE + '.tmp'
+    _table.to_parquet(tmp, index=False)
+    os.replace(tmp, TABLE_FILE)
+    tmp = COVERAGE_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_coverage, f)
+    os.replace(tmp, COVERAGE_FILE)
+
+
+def _normalize(symbol, df):
+    """统一列名和类型，symbol 为 None 时保留每行自带的股票代码（全市场批量接口）"""
+    df = df.rename(columns=_RENAME)
+    df = df.reindex(columns=COLUMNS)
+    if symbol is not None:
+        df['股票代码'] = symbol
+    df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
+    df['公告时间'] = pd.to_datetime(df['公告时间'], errors='coerce')
+    df['公告标题'] = df['公告标题'].astype(str)
+    return df
+
+
+def _merge_ranges(ranges):
+    """合并重叠或相邻的日期区间"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged:
+            last_end = datetime.strptime(merged[-1][1], '%Y%m%d') + timedelta(days=1)
+            if start <= last_end.strftime('%Y%m%d'):
+                merged[-1][1] = max(merged[-1][1], end)
+                continue
+        merged.append([start, end])
+    return merged
+
+
+def _missing_ranges(covered, start, end):
+    """返回 [start, end] 中还没有同步过的子区间，covered 为按起点排序、互不相邻的区间列表"""
+    missing = []
+    cursor = start
+    for a, b in covered:
+        if b < cursor:
+            continue
+        if a > end:
+            break
+        if a > cursor:
+            day_before = datetime.strptime(a, '%Y%m%d') - timedelta(days=1)
+            missing.append((cursor, day_before.strftime('%Y%m%d')))
+        cursor = (datetime.strptime(b, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+        if cursor > end:
+            return missing
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def sync(symbols, start_date, end_date):
+    """增量同步公告：只下载每只股票还没有同步过的日期区间，返回请求数"""
+    start = _to_date_str(start_date)
+    end = _to_date_str(end_date)
+    # 今天的公告可能还没发完，不记入已同步区间
+    last_complete = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+
+    with _lock:
+        _load()
+        tasks = []
+        for symbol in symbols:
+            for a, b in _missing_ranges(_coverage.get(symbol, []), start, end):
+                tasks.append((symbol, a, b))
+        if not tasks:
+            return 0
+
+        for i in range(0, len(tasks), FLUSH_EVERY):
+            chunk = tasks[i:i + FLUSH_EVERY]
+            results = fetch_engine.fetch_many(ak.stock_zh_a_disclosure_report_cninfo, [
+                dict(symbol=symbol, market="沪深京", start_date=a, end_date=b) for symbol, a, b in chunk
+            ])
+            frames = []
+            for (symbol, a, b), df in zip(chunk, results):
+                if isinstance(df, Exception):
+                    print(f"同步股票{symbol} {a}-{b} 公告失败: {df}")
+                    continue
+                if df is not None and not df.empty:
+                    frames.append(_normalize(symbol, df))
+                b = min(b, last_complete)
+                if a <= b:
+                    _coverage[symbol] = _merge_ranges(_coverage.get(symbol, []) + [[a, b]])
+            if frames:
+                _append(pd.concat(frames, ignore_index=True))
+            _save()
+        return len(tasks)
+
+
+def _append(new):
+    global _table, _index
+    _table = pd.concat([_table, new], ignore_index=True) if not _table.empty else new
+    _table = _table.drop_duplicates(subset=['股票代码', '公告标题', '公告时间'], keep='last')
+    _table = _table.reset_index(drop=True)
+    _index = None
+
+
+def append_days(start_date, end_date, df, symbols):
+    """写入全市场批量接口取得的 [start_date, end_date] 内的公告，返回写入的行数
+
+    批量接口取的是这段时间的全市场公告，symbols 都把 [start_date, end_date] 并入已同步区间，
+    与原有区间不相接时单独记一段，中间的缺口留给 sync 补齐；
+    今天的公告可能还没发完，和 sync 一样不记入已同步区间。
+    """
+    start = _to_date_str(start_date)
+    end = min(_to_date_str(end_date), (datetime.now() - timedelta(days=1)).strftime('%Y%m%d'))
+    with _lock:
+        _load()
+        rows = 0
+        if df is not None and not df.empty:
+            new = _normalize(None, df)
+            new = new[new['股票代码'].isin(list(symbols))]
+            rows = len(new)
+            if rows:
+                _append(new)
+        if start <= end:
+            for symbol in symbols:
+                _coverage[symbol] = _merge_ranges(_coverage.get(symbol, []) + [[start, end]])
+        _save()
+        return rows
+
+
+def table():
+    """全部本地公告"""
+    with _lock:
+        _load()
+        return _table
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _build_index():
+    """标题二元字 -> 行号数组 的倒排索引"""
+    global _index
+    if _index is None:
+        postings = {}
+        for row, title in enumerate(_table['公告标题'].values):
+            for gram in _bigrams(title):
+                postings.setdefault(gram, []).append(row)
+        _index = {gram: np.asarray(rows, dtype=np.int64) for gram, rows in postings.items()}
+    return _index
+
+
+def _candidates(keywords):
+    """可能包含任意一个关键词的行号：每个关键词的全部二元字倒排表求交，再对关键词求并"""
+    index = _build_index()
+    rows = []
+    for keyword in keywords:
+        grams = _bigrams(keyword)
+        if not grams:
+            # 单字关键词无法用二元字索引，只能全表扫描
+            return np.arange(len(_table))
+        postings = [index.get(gram) for gram in grams]
+        if any(p is None for p in postings):
+            continue
+        hit = postings[0]
+        for p in postings[1:]:
+            hit = np.intersect1d(hit, p, assume_unique=True)
+        rows.append(hit)
+    if not rows:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(rows))
+
+
+def match(keywords, start_date=None, end_date=None, symbols=None):
+    """找出标题包含任意关键词的公告，返回公告行并附带命中的关键词列"""
+    keywords = list(keywords)
+    with _lock:
+        _load()
+        rows = _candidates(keywords)
+        df = _table.iloc[rows]
+    if start_date is not None:
+        df = df[df['公告时间'] >= pd.to_datetime(start_date)]
+    if end_date is not None:
+        df = df[df['公告时间'] < pd.to_datetime(end_date) + pd.Timedelta(days=1)]
+    if symbols is not None:
+        df = df[df['股票代码'].isin(list(symbols))]
+    matcher = AhoCorasick(keywords)
+    found = [matcher.find(title) for title in df['公告标题'].values]
+    df = df.assign(关键词=['、'.join(sorted(f)) for f in found])
+    return df[df['关键词'] != ''].sort_values(['公告时间', '股票代码']).reset_index(drop=True)
+
+
+def restructuring_stocks(date, keywords=RESTRUCTURING_KEYWORDS):
+    """某一天发布了重整、重组、破产等公告的股票"""
+    return sorted(match(keywords, date, date)['股票代码'].unique())
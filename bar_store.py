@@ -0,0 +1,251 @@
+# 本地日线行情库
+# 按交易日分区存为 Parquet 文件（每个交易日一个文件，文件内以股票代码为键），
+# 并记录每只股票已经同步过的日期区间，增量同步时只下载缺失的 (股票, 日期区间)。
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import akshare as ak
+import pandas as pd
+
+import fetch_engine
+from config import DATA_DIR
+
+BAR_DIR = os.path.join(DATA_DIR, 'bars')
+COVERAGE_FILE = os.path.join(BAR_DIR, '_coverage.json')
+
+# 每批并发同步这么多个区间，每批结束落盘一次，避免中途失败丢失全部进度
+FLUSH_EVERY = 200
+# 进程内缓存的分区数量
+PARTITION_CACHE_SIZE = 64
+# 为 True 时 sync 不下载也不写文件，只读本地已有数据（多个进程共享同一份行情库时在工作进程中设置）
+READ_ONLY = False
+
+_lock = threading.RLock()
+_partition_cache = OrderedDict()
+_coverage = None
+
+
+def _to_date_str(date):
+    """把 '2024-08-05' / '20240805' / datetime 统一成 '20240805'"""
+    return pd.to_datetime(date).strftime('%Y%m%d')
+
+
+def _partition_path(date_str):
+    return os.path.join(BAR_DIR, f"{date_str}.parquet")
+
+
+def _load_coverage():
+    """读取每只股票已同步的日期区间 {code: [[start, end], ...]}"""
+    global _coverage
+    if _coverage is None:
+        if os.path.exists(COVERAGE_FILE):
+            with open(COVERAGE_FILE, 'r', encoding='utf-8') as f:
+                _coverage = json.load(f)
+        else:
+            _coverage = {}
+    return _coverage
+
+
+def _save_coverage():
+    os.makedirs(BAR_DIR, exist_ok=True)
+    tmp = COVERAGE_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_coverage, f)
+    os.replace(tmp, COVERAGE_FILE)
+
+
+def _merge_ranges(ranges):
+    """合并重叠或相邻的日期区间"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged:
+            last_end = datetime.strptime(merged[-1][1], '%Y%m%d') + timedelta(days=1)
+            if start <= last_end.strftime('%Y%m%d'):
+                merged[-1][1] = max(merged[-1][1], end)
+                continue
+        merged.append([start, end])
+    return merged
+
+
+def _missing_ranges(covered, start, end):
+    """返回 [start, end] 中还没有同步过的子区间"""
+    missing = []
+    cursor = start
+    for a, b in covered:
+        if b < cursor:
+            continue
+        if a > end:
+            break
+        if a > cursor:
+            day_before = datetime.strptime(a, '%Y%m%d') - timedelta(days=1)
+            missing.append((cursor, day_before.strftime('%Y%m%d')))
+        cursor = (datetime.strptime(b, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+        if cursor > end:
+            return missing
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def _read_partition(date_str):
+    """读取某个交易日的全市场行情，带进程内缓存"""
+    with _lock:
+        if date_str in _partition_cache:
+            _partition_cache.move_to_end(date_str)
+            return _partition_cache[date_str]
+    path = _partition_path(date_str)
+    if os.path.exists(path):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.DataFrame()
+    with _lock:
+        _partition_cache[date_str] = df
+        while len(_partition_cache) > PARTITION_CACHE_SIZE:
+            _partition_cache.popitem(last=False)
+    return df
+
+
+def _write_partitions(bars):
+    """把新下载的行情按日期合并写入分区文件（先写临时文件再替换，保证原子性）"""
+    os.makedirs(BAR_DIR, exist_ok=True)
+    bars = bars.copy()
+    bars['日期'] = pd.to_datetime(bars['日期'])
+    bars['股票代码'] = bars['股票代码'].astype(str)
+    for day, group in bars.groupby('日期'):
+        date_str = day.strftime('%Y%m%d')
+        path = _partition_path(date_str)
+        if os.path.exists(path):
+            group = pd.concat([pd.read_parquet(path), group], ignore_index=True)
+            group = group.drop_duplicates(subset='股票代码', keep='last')
+        group = group.sort_values('股票代码').reset_index(drop=True)
+        tmp = path + '.tmp'
+        group.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        _partition_cache.pop(date_str, None)
+
+
+def _fetch_bars(tasks):
+    """通过请求调度引擎并发下载多段不复权日线，按输入顺序返回 DataFrame、None（无数据）或异常"""
+    results = fetch_engine.fetch_many(ak.stock_zh_a_hist, [
+        dict(symbol=symbol, period="daily", start_date=a, end_date=b, adjust="") for symbol, a, b in tasks
+    ])
+    bars = []
+    for (symbol, a, b), df in zip(tasks, results):
+        if isinstance(df, Exception) or df is None or df.empty:
+            bars.append(df if isinstance(df, Exception) else None)
+            continue
+        df = df.copy()
+        df['股票代码'] = symbol
+        bars.append(df)
+    return bars
+
+
+def sync(symbols, start_date, end_date):
+    """增量同步行情：只下载本地缺失的 (股票, 日期区间)，返回实际发出的请求数
+
+    有股票下载失败时，其余股票照常写入，最后抛出 fetch_engine.FetchFailed，失败的区间下次重新下载。
+    """
+    if READ_ONLY:
+        return 0
+    start = _to_date_str(start_date)
+    end = _to_date_str(end_date)
+    # 今天及以后的数据可能还不完整，不记入已同步区间，下次会重新下载
+    last_complete = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+
+    # 只在计算缺失区间和合并写入时持锁，下载不占用锁，其他线程的读取和同步不必等待
+    with _lock:
+        coverage = _load_coverage()
+        tasks = []
+        for symbol in symbols:
+            for a, b in _missing_ranges(coverage.get(symbol, []), start, end):
+                tasks.append((symbol, a, b))
+    if not tasks:
+        return 0
+
+    failed = {}
+    for i in range(0, len(tasks), FLUSH_EVERY):
+        chunk = tasks[i:i + FLUSH_EVERY]
+        frames = []
+        fetched = []
+        for (symbol, a, b), df in zip(chunk, _fetch_bars(chunk)):
+            if isinstance(df, Exception):
+                print(f"同步股票{symbol} {a}-{b} 行情失败: {df}")
+                failed[symbol] = df
+                continue
+            if df is not None:
+                frames.append(df)
+            fetched.append((symbol, a, b))
+        with _lock:
+            if frames:
+                _write_partitions(pd.concat(frames, ignore_index=True))
+            coverage = _load_coverage()
+            for symbol, a, b in fetched:
+                b = min(b, last_complete)
+                if a <= b:
+                    coverage[symbol] = _merge_ranges(coverage.get(symbol, []) + [[a, b]])
+            _save_coverage()
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return len(tasks)
+
+
+def append_day(date, bars, symbols, since=None):
+    """写入批量接口取得的某个交易日的全市场行情，并把 symbols 的这一天记为已同步，返回写入的行数
+
+    since 为上一个交易日时，已同步到 since 的股票把 (since, date] 整段记为已同步，
+    中间的周末和节假日不会留下缺口，之后的增量同步不会再为它们发请求。
+    """
+    if READ_ONLY:
+        return 0
+    day = _to_date_str(date)
+    prev = _to_date_str(since) if since is not None else None
+    with _lock:
+        coverage = _load_coverage()
+        if bars is not None and not bars.empty:
+            _write_partitions(bars)
+        for symbol in symbols:
+            covered = coverage.get(symbol, [])
+            start = day
+            if prev is not None and not _missing_ranges(covered, prev, prev):
+                start = prev
+            coverage[symbol] = _merge_ranges(covered + [[start, day]])
+        _save_coverage()
+    return 0 if bars is None else len(bars)
+
+
+def partition_dates(start_date, end_date):
+    """本地已有分区中落在 [start_date, end_date] 内的交易日"""
+    start = _to_date_str(start_date)
+    end = _to_date_str(end_date)
+    if not os.path.isdir(BAR_DIR):
+        return []
+    dates = [name[:8] for name in os.listdir(BAR_DIR)
+             if name.endswith('.parquet') and name[:8].isdigit()]
+    return sorted(d for d in dates if start <= d <= end)
+
+
+def read_date(date, symbols=None):
+    """一次读出某个交易日的全市场（或指定股票）行情"""
+    df = _read_partition(_to_date_str(date))
+    if symbols is not None and not df.empty:
+        df = df[df['股票代码'].isin(list(symbols))]
+    return df.reset_index(drop=True)
+
+
+def read_window(start_date, end_date, symbols=None):
+    """一次读出一段时间窗口内的全市场（或指定股票）行情，按股票代码、日期排序"""
+    frames = [read_date(d, symbols) for d in partition_dates(start_date, end_date)]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values(['股票代码', '日期']).reset_index(drop=True)
+
+
+def get_bars(symbol, start_date, end_date):
+    """读取单只股票一段时间的日线，本地缺失的部分先增量同步"""
+    sync([symbol], start_date, end_date)
+    return read_window(start_date, end_date, [symbol])
@@ -0,0 +1,135 @@
+# 选股性能基准
+# 用 fake_akshare 提供的离线合成数据，在不同股票数量下运行 chongzu / chongzu2 的 run_daily_selection，
+# 报告耗时、实际发出的接口请求数和内存峰值。每个组合在独立的子进程和临时数据目录中运行，
+# 先和 main() 一样批量同步行情（sync），再冷启动（其他数据都还没下载）和热启动（同一交易日再跑一次），
+# 结果可以和改动前后对比。
+#
+# 用法：python bench_screener.py [--sizes 500 3000 5000] [--screeners chongzu chongzu2]
+#                               [--latency 0.005] [--error-rate 0.01] [--date 2024-08-05]
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+import contextlib
+import subprocess
+import tracemalloc
+
+RESULT_PREFIX = 'BENCH_RESULT '
+DEFAULT_SIZES = [500, 3000, 5000]
+DEFAULT_SCREENERS = ['chongzu', 'chongzu2']
+
+
+def _run_child(args):
+    """在子进程中运行一个 (脚本, 股票数量) 组合，输出一行 JSON 结果"""
+    import fake_akshare
+    fake_akshare.configure(universe_size=args.stocks, latency=args.latency, error_rate=args.error_rate, seed=0)
+    fake_akshare.install()
+
+    import fetch_engine
+    # 假接口没有限流，去掉限速只测量程序本身和模拟的网络延迟
+    fetch_engine.RATE_LIMITS.clear()
+    fetch_engine.DEFAULT_RATE = 1e6
+    import bar_store
+    import trade_calendar
+    screener = importlib.import_module(args.child)
+
+    def prepare():
+        # 与 main() 相同：先把选股窗口内全部股票的行情一次同步到本地
+        stocks = screener.get_trading_stocks()
+        bar_store.sync(stocks, trade_calendar.shift(args.date, -5), args.date)
+        return {args.date: stocks}
+
+    tracemalloc.start()
+    results = []
+    for run in ('sync', 'cold', 'warm'):
+        fake_akshare.reset_counts()
+        engine_before = fetch_engine.total_requests()
+        tracemalloc.reset_peak()
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output if not args.verbose else sys.stdout):
+            if run == 'sync':
+                selected = []
+                prepare()
+            else:
+                selected = screener.run_daily_selection(args.date)[args.date]
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        results.append({
+            'screener': args.child,
+            'stocks': args.stocks,
+            'run': run,
+            'wall_seconds': round(wall, 3),
+            'requests': sum(fake_akshare.call_counts().values()),
+            'engine_requests': fetch_engine.total_requests() - engine_before,
+            'peak_mb': round(peak / 1024 ** 2, 1),
+            'selected': len(selected),
+            'by_endpoint': fake_akshare.call_counts(),
+        })
+    tracemalloc.stop()
+    print(RESULT_PREFIX + json.dumps(results, ensure_ascii=False))
+
+
+def run_case(screener, stocks, args):
+    """启动子进程运行一个组合，返回它的结果列表"""
+    with tempfile.TemporaryDirectory(prefix='bench_screener_') as data_dir:
+        env = dict(os.environ, STOCKS_DATA_DIR=data_dir)
+        command = [sys.executable, os.path.abspath(__file__), '--child', screener,
+                   '--stocks', str(stocks), '--date', args.date,
+                   '--latency', str(args.latency), '--error-rate', str(args.error_rate)]
+        if args.verbose:
+            command.append('--verbose')
+        proc = subprocess.run(command, env=env, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    print(f"{screener} {stocks}只 运行失败:\n{proc.stdout[-2000:]}\n{proc.stderr[-4000:]}")
+    return []
+
+
+def print_table(rows):
+    header = f"{'脚本':<10}{'股票数':>8}{'运行':>6}{'耗时(秒)':>10}{'请求数':>9}{'引擎请求':>9}{'内存峰值(MB)':>13}{'入选':>6}"
+    print(header)
+    print('-' * len(header) * 2)
+    for row in rows:
+        print(f"{row['screener']:<10}{row['stocks']:>8}{row['run']:>6}{row['wall_seconds']:>10.2f}"
+              f"{row['requests']:>9}{row['engine_requests']:>9}{row['peak_mb']:>13.1f}{row['selected']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='选股性能基准（离线假数据）')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='股票数量')
+    parser.add_argument('--screeners', nargs='+', default=DEFAULT_SCREENERS, help='要测试的脚本')
+    parser.add_argument('--date', default='2024-08-05', help='选股日期')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次接口调用的平均延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='接口调用出错的概率')
+    parser.add_argument('--json', help='把结果另存为 JSON 文件')
+    parser.add_argument('--verbose', action='store_true', help='显示选股脚本自身的输出')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--stocks', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args)
+        return
+
+    rows = []
+    for stocks in args.sizes:
+        for screener in args.screeners:
+            print(f"运行 {screener} {stocks}只 ...")
+            rows.extend(run_case(screener, stocks, args))
+    print()
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到文件: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,74 @@
-import akshare as ak
 import pandas as pd
-from datetime import datetime, timedelta
-import time
+from datetime import datetime
+import argparse
+
+import bar_store
+import fetch_engine
+import financial_abstract
+import holder_store
+import market_cap
+import pipeline
+import symbol_master
+import trade_calendar
+from run_journal import RunJournal
 
 def get_trading_stocks():
     """获取主板A股代码列表"""
-    stock_info = ak.stock_info_a_code_name()
-    # 排除创业板、科创板等
-    main_board = stock_info[stock_info['code'].str.match('^(600|601|603|000|001|002)')]
-    return main_board['code'].tolist()
+    return symbol_master.main_board_codes()
 
 #获取市值
 def market_value(stock_code, target_date):
+    """target_date 当天的总市值：当时的总股本 × 当日收盘价"""
     try:
-        # 获取股票的总股本信息
-        stock_info_df = ak.stock_individual_info_em(symbol=stock_code)
-        total_shares = stock_info_df.iloc[2, 1]
-
-        # 获取指定日期的收盘价
-        hangqing = ak.stock_zh_a_hist(symbol=stock_code, period="daily", start_date=target_date, end_date=target_date, adjust="")
-        closing_price = hangqing["收盘"].iloc[0]
-
-        # 计算市值
-        market_value = total_shares * closing_price
-        return market_value
+        cap = market_cap.on(target_date, [stock_code]).iloc[0]
+        return None if pd.isna(cap) else float(cap)
 
     except Exception as e:
         print(f"计算股票 {stock_code} 在 {target_date} 的市值时出现错误: {e}")
         return None
 
-def convert_to_float(value_str):
-    """将带有单位的字符串数据转换为浮点数"""
-    if '亿' in value_str:
-        return float(value_str.replace('亿', '')) * 100000000
-    elif '万' in value_str:
-        return float(value_str.replace('万', '')) * 10000
-    else:
-        return float(value_str)
+def market_value_batch(stock_codes, target_date):
+    """批量获取市值（历史市值面板查表），返回 {股票: 市值或None}；下载失败时抛出异常"""
+    caps = market_cap.on(target_date, stock_codes)
+    return {code: (None if pd.isna(cap) else float(cap)) for code, cap in caps.items()}
 
 def get_financial_data(stock_code, date):
     """获取营收和利润数据"""
-    try:
-        financial = ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按报告期")
-
-        if not financial.empty:
-            # 获取最近的财务数据
-            latest = financial.iloc[0]
-            revenue=convert_to_float(latest['营业总收入'])
-            net_profit= convert_to_float(latest['扣非净利润'])
-            return {
-                'revenue': revenue,
-                'net_profit': net_profit
-            }
+    return get_financial_data_batch([stock_code], date).get(stock_code)
 
-    except Exception as e:
-        print(f"获取股票{stock_code}财务数据失败: {e}")
-    return None
+def get_financial_data_batch(stock_codes, date):
+    """批量获取营收和扣非净利润：只使用在 date 当天已经公告的最新一期，避免回测用到未来数据
+
+    取数失败时抛出异常（部分股票下载失败时为 fetch_engine.FetchFailed），出错的股票不记入运行日志，
+    不会被当成财务不达标。
+    """
+    latest = financial_abstract.as_of(date, stock_codes, ['营业总收入', '扣非净利润'])
+    return {
+        code: {'revenue': row['营业总收入'], 'net_profit': row['扣非净利润']}
+        for code, row in latest.iterrows()
+    }
 
 def get_major_holder(stock_code, target_date):
-    """获取第一大股东持股比例，如果当天没有数据就往前查询"""
-    # 处理股票代码前缀
-    if stock_code.startswith(('sh', 'sz')):
-        formatted_code = stock_code
-    else:
-        # 上交所股票以6开头，深交所股票以0或3开头
-        if stock_code.startswith('6'):
-            formatted_code = 'sh' + stock_code
-        elif stock_code.startswith(('0', '3')):
-            formatted_code = 'sz' + stock_code
-        else:
-            print(f"无效的股票代码: {stock_code}")
-            return None
-    # 转换日期为datetime对象，方便进行日期计算
-    current_date = pd.to_datetime(target_date)
-    
-    # 最多往前查询100天
-    for _ in range(100):
-        try:
-            date_str = current_date.strftime('%Y%m%d')
-            holders = ak.stock_gdfx_top_10_em(symbol=formatted_code, date=date_str)
-            ratio = float(holders.iloc[0]['占总股本持股比例'])
-            return ratio
-        except:
-            # 有任何问题直接忽略，查询前一天
-            current_date = current_date - pd.Timedelta(days=1)
-            continue
-    
-    print(f"未能找到股票{formatted_code}的股东数据")
-    return None
+    """获取第一大股东持股比例，只查询往前100天内的季度报告期"""
+    return holder_store.first_holder_ratio(stock_code, target_date)
 
 def get_trading_data(stock_code, date):
-    """获取交易数据"""
-    try:
-        # 使用 stock_zh_a_hist 接口获取历史行情数据
-        end_date = pd.to_datetime(date)
-        start_date = end_date - timedelta(days=10)
-        df = ak.stock_zh_a_hist(
-            symbol=stock_code,
-            start_date=start_date.strftime('%Y%m%d'),
-            end_date=end_date.strftime('%Y%m%d'),
-            period="daily"
-        )
-        if not df.empty:
-            return df.tail(6)
-    except Exception as e:
-        print(f"获取股票{stock_code}交易数据失败: {e}")
-    return None
+    """获取交易数据，没有行情时返回 None；取数出错时抛出异常，由筛选流程记为失败"""
+    return get_trading_data_batch([stock_code], date).get(stock_code)
+
+def get_trading_data_batch(stock_codes, date):
+    """批量获取最近6个交易日的行情，返回 {股票: 行情或None}
+
+    先增量同步缺失的行情，再一次读出整个窗口按股票切分，不必为每只股票重新列出和读取分区；
+    部分股票下载失败时抛出 fetch_engine.FetchFailed。
+    """
+    end_date = pd.to_datetime(date)
+    start_date = trade_calendar.shift(end_date, -5)
+    bar_store.sync(stock_codes, start_date, end_date)
+    df = bar_store.read_window(start_date, end_date, stock_codes)
+    bars = {} if df.empty else {code: group.tail(6).reset_index(drop=True)
+                                  for code, group in df.groupby('股票代码', sort=False)}
+    return {code: bars.get(code) for code in stock_codes}
 
 def check_volume_conditions(trading_data):
     """检查成交量条件"""
@@ -131,98 +94,128 @@ def check_limit_up(trading_data):
 
 def get_trading_dates(start_date, end_date):
     """获取交易日历"""
-    try:
-        trading_calendar = ak.tool_trade_date_hist_sina()
-        trading_calendar['trade_date'] = pd.to_datetime(trading_calendar['trade_date'])
-        mask = (trading_calendar['trade_date'] >= pd.to_datetime(start_date)) & \
-               (trading_calendar['trade_date'] <= pd.to_datetime(end_date))
-        return trading_calendar[mask]['trade_date'].dt.strftime('%Y%m%d').tolist()
-    except Exception as e:
-        print(f"获取交易日历失败: {e}")
-        return []
+    return trade_calendar.get_trading_dates(start_date, end_date, fmt='%Y%m%d')
+
+def check_market_cap(values):
+    """市值不超过30亿"""
+    market_cap = values['market_cap']
+    return market_cap is not None and market_cap <= 3000000000
+
+def check_major_holder(values):
+    """第一大股东持股比例不低于30%"""
+    ratio = values['major_holder']
+    return ratio is not None and ratio >= 30
+
+def check_financial(values):
+    """营收不超过2亿且净利润不超过300万，营收或净利润缺失（NaN）时不通过"""
+    financial = values['financial']
+    if financial is None:
+        return False
+    revenue = financial.get('revenue')
+    net_profit = financial.get('net_profit')
+    if not (pd.notna(revenue) and pd.notna(net_profit)):
+        return False
+    return revenue <= 200000000 and net_profit <= 3000000
 
-def run_daily_selection(date):
-    """每个交易日的选股逻辑"""
+def check_trading(values):
+    """放量且最近两天没有一字涨停"""
+    trading_data = values['trading']
+    if trading_data is None or len(trading_data) < 5:
+        return False
+    return check_volume_conditions(trading_data) and not check_limit_up(trading_data)
+
+# 各数据源单只股票的估计请求数：市值和行情在 main 中已提前同步到本地，取数只是一次批量读取
+SELECTION_PIPELINE = pipeline.Pipeline(
+    sources=[
+        pipeline.batch_source('market_cap', market_value_batch, cost=0.05),
+        pipeline.per_stock_source('major_holder', get_major_holder, cost=2),
+        pipeline.batch_source('financial', get_financial_data_batch, cost=1),
+        pipeline.batch_source('trading', get_trading_data_batch, cost=0.05),
+    ],
+    stages=[
+        pipeline.Stage('市值', ['market_cap'], check_market_cap, pass_rate=0.2),
+        pipeline.Stage('大股东持股', ['major_holder'], check_major_holder, pass_rate=0.5),
+        pipeline.Stage('营收利润', ['financial'], check_financial, pass_rate=0.1),
+        pipeline.Stage('成交量', ['trading'], check_trading, pass_rate=0.05),
+    ],
+)
+
+def run_daily_selection(date, journal=None):
+    """每个交易日的选股逻辑：按成本和淘汰率排序的分阶段筛选
+
+    传入 journal 时每只股票一有结论就把结果和取到的数据写入运行日志，续跑时跳过已经处理过的股票；
+    取数或判断出错的股票不写入，续跑时重新处理。
+    """
     print(f"\n开始处理日期: {date}")
     
     stocks = get_trading_stocks()
     selected_stocks = []
+    on_done = None
+    if journal is not None:
+        done = journal.done_stocks(date)
+        selected_stocks = [stock for stock, record in done.items() if record['selected']]
+        stocks = [stock for stock in stocks if stock not in done]
+
+        def on_done(stock, selected, values):
+            journal.record_stock(date, stock, selected, values)
     
-    # for stock in stocks[:10]:  # 先测试前10只股票
-    for stock in stocks:  
-        try:
-            # 添加进度显示，打印当前股票是正在处理的第几只股票，并显示总数
-            print(f"{date}  -   正在处理: {stock}，{stocks.index(stock) + 1}/{len(stocks)}")     
-            time.sleep(0.5)  # 增加延时以避免被限制
-            
-            market_cap = market_value(stock, date)
-            if market_cap > 3000000000:  # 市值大于30亿
-                print(f"股票{stock}市值{market_cap},过大")
-                continue
-            
-            # 获取大股东持股
-            major_holder_ratio = get_major_holder(stock, date)
-            if major_holder_ratio < 30:
-                print(f"股票{stock}大股东持股比例{major_holder_ratio},过小")
-                continue
-            
-            # 获取财务数据    
-            financial = get_financial_data(stock, date)
-            if financial is None:
-                continue
-                
-            revenue = financial.get('revenue', 300000000)
-            net_profit = financial.get('net_profit', float('300000000'))
-            
-            if revenue > 200000000 or net_profit > 3000000:
-                print(f"股票{stock}营收{revenue},净利润{net_profit},过大")
-                continue
-            
-            # 获取交易数据
-            trading_data = get_trading_data(stock, date)
-            if trading_data is None or len(trading_data) < 5:
-                continue
-            
-            if check_volume_conditions(trading_data) and not check_limit_up(trading_data):
-                selected_stocks.append(stock)
-                print(f"股票{stock}满足所有条件")
-            
-        except Exception as e:
-            print(f"处理股票 {stock} 时发生错误: {e}")
-            continue
+    selected, _ = SELECTION_PIPELINE.run(stocks, date, on_done)
+    SELECTION_PIPELINE.print_report()
+    selected_stocks.extend(selected)
+    for stock in selected_stocks:
+        print(f"股票{stock}满足所有条件")
     
     return {date: selected_stocks}
 
-def main(start_date, end_date):
-    """主函数"""
+def main(start_date, end_date, resume=False):
+    """主函数，resume=True 时从上次中断的地方继续"""
     # 获取交易日列表
     trading_dates = get_trading_dates(start_date, end_date)
     if not trading_dates:
         print("未获取到交易日期")
         return
     
-    # 存储所有结果
-    all_results = {}
+    # 每个交易日完成后立即写入运行日志，中断后可以续跑
+    journal = RunJournal(f"chongzu_{start_date}_{end_date}", resume=resume)
+    pending_dates = [date for date in trading_dates if not journal.is_date_done(date)]
+    if len(pending_dates) < len(trading_dates):
+        print(f"从运行日志恢复 {len(trading_dates) - len(pending_dates)} 个已完成的交易日")
+    
+    # 一次性把整个区间的行情同步到本地并算好市值矩阵，之后逐日读取不再联网；
+    # 下载失败的股票在逐日筛选时重新下载，仍然失败的记为出错
+    if pending_dates:
+        stocks = get_trading_stocks()
+        fetch_engine.prefetch(
+            lambda: bar_store.sync(stocks, trade_calendar.shift(pending_dates[0], -5), pending_dates[-1]),
+            lambda: market_cap.load_panel(pending_dates[0], pending_dates[-1], stocks),
+        )
     
     # 对每个交易日进行处理
-    for date in trading_dates:
-        try:
-            result = run_daily_selection(date)
-            all_results.update(result)
-            
-            # 打印当天结果
-            stocks = result[date]
-            if stocks:
-                print(f"\n{date} 满足条件的股票：{stocks}")
-            else:
-                print(f"\n{date} 没有满足条件的股票")
+    try:
+        for date in pending_dates:
+            try:
+                result = run_daily_selection(date, journal)
+                failed = SELECTION_PIPELINE.last_failed
+                if failed:
+                    print(f"\n{date} 有{len(failed)}只股票处理出错，这一天不记为完成，续跑时重新处理")
+                    continue
+                journal.finish_date(date, result[date])
                 
-        except Exception as e:
-            print(f"处理日期 {date} 时发生错误: {e}")
-            continue
+                # 打印当天结果
+                stocks = result[date]
+                if stocks:
+                    print(f"\n{date} 满足条件的股票：{stocks}")
+                else:
+                    print(f"\n{date} 没有满足条件的股票")
+                    
+            except Exception as e:
+                print(f"处理日期 {date} 时发生错误: {e}")
+                continue
+    finally:
+        journal.close()
     
-    # 保存结果到CSV文件
-    save_results(all_results)
+    # 汇总运行日志里全部已完成交易日的结果，保存到CSV文件
+    save_results(journal.results())
 
 def save_results(results):
     """保存结果到CSV文件"""
@@ -240,8 +233,11 @@ def save_results(results):
 
 if __name__ == "__main__":
     # 设置起止日期
-    start_date = '20240805'
-    end_date = '20240805'
+    parser = argparse.ArgumentParser(description='回溯选股')
+    parser.add_argument('--start', default='20240805', help='开始日期')
+    parser.add_argument('--end', default='20240805', help='结束日期')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的地方继续')
+    args = parser.parse_args()
     
-    print(f"开始回溯选股 - 从 {start_date} 到 {end_date}")
-    main(start_date, end_date)
\ No newline at end of file
+    print(f"开始回溯选股 - 从 {args.start} 到 {args.end}")
+    main(args.start, args.end, args.resume)
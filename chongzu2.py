@@ -1,108 +1,69 @@
-import akshare as ak
 import pandas as pd
-from datetime import datetime, timedelta
-import time
+from datetime import datetime
 import concurrent.futures
-import threading
+import argparse
+import multiprocessing
 from functools import lru_cache
 
-# 添加线程锁
-print_lock = threading.Lock()
+import bar_store
+import fetch_engine
+import financial_index
+import holder_store
+import market_cap
+import screen_log
+import symbol_master
+import trade_calendar
+from run_journal import RecordBuffer, RunJournal
 
 def get_trading_stocks():
-    """获取主板A股代码列表"""
+    """获取主板A股代码列表（股票基础信息表每个进程只加载一次）"""
     try:
-        stock_info = ak.stock_info_a_code_name()
-        main_board = stock_info[stock_info['code'].str.match('^(600|601|603|000|001|002)')]
-        print(f"获取到{len(main_board)}只股票")
-        return main_board['code'].tolist()
+        return symbol_master.main_board_codes()
     except Exception as e:
         print(f"获取股票列表失败: {e}")
         return []
 
 def get_stock_data_batch(date):
-    """获取指定日期的股票数据"""
+    """获取指定日期的股票数据；出错时抛出异常，这一天不记入运行日志"""
     try:
         stocks = get_trading_stocks()
-        stock_data = {}
-        for stock in stocks:
-            df = ak.stock_zh_a_hist(
-                symbol=stock,
-                start_date=date.replace('-', ''),
-                end_date=date.replace('-', ''),
-                period="daily"
-            )
-            if not df.empty:
-                stock_data[stock] = df.iloc[0]
-            time.sleep(0.1)
-        return pd.DataFrame(stock_data).T
+        # 本地缺失的部分先增量同步，再一次读出全市场当日行情
+        bar_store.sync(stocks, date, date)
+        df = bar_store.read_date(date, stocks)
+        if df.empty:
+            return pd.DataFrame()
+        df = df.set_index('股票代码')
+        # 行情接口不带市值，按当时的总股本从历史市值面板补上
+        df['总市值'] = market_cap.on(date, stocks).reindex(df.index)
+        return df
     except Exception as e:
         print(f"获取{date}的股票数据失败: {e}")
-        return pd.DataFrame()
+        raise
 
 def get_financial_data_batch(date):
-    """获取指定日期的财务数据"""
+    """获取指定日期已经公告的最新财务数据（财报历史只下载一次，之后按日期做时点查询）；
+    出错时抛出异常，这一天不记入运行日志"""
     try:
         stocks = get_trading_stocks()
-        financial_data = {}
-        for stock in stocks:
-            df = ak.stock_financial_report_em(symbol=stock)
-            if not df.empty:
-                df['日期'] = pd.to_datetime(df['日期'])
-                historical_data = df[df['日期'] <= pd.to_datetime(date)]
-                if not historical_data.empty:
-                    latest_data = historical_data.iloc[0]
-                    financial_data[stock] = {
-                        'revenue': float(latest_data['营业收入']),
-                        'net_profit': float(latest_data['净利润'])
-                    }
-            time.sleep(0.1)
-        return financial_data
+        latest = financial_index.as_of(date, stocks)
+        return latest[['revenue', 'net_profit']].to_dict(orient='index')
     except Exception as e:
         print(f"获取财务数据失败: {e}")
-        return {}
+        raise
 
-def get_major_holder(stock_code, date, max_retries=3):
-    """获取指定日期的大股东持股数据"""
-    for attempt in range(max_retries):
-        try:
-            holders_df = ak.stock_holder_change(symbol=stock_code)
-            if not holders_df.empty:
-                holders_df['变动日期'] = pd.to_datetime(holders_df['变动日期'])
-                historical_data = holders_df[holders_df['变动日期'] <= pd.to_datetime(date)]
-                if not historical_data.empty:
-                    ratio = historical_data.iloc[0]['持股比例']
-                    if isinstance(ratio, str):
-                        ratio = float(ratio.replace('%', ''))
-                    return ratio
-            time.sleep(0.5)
-        except Exception as e:
-            if attempt == max_retries - 1:
-                with print_lock:
-                    print(f"获取股票{stock_code}股东信息失败: {e}")
-            time.sleep(1)
-    return 0
+def get_major_holder(stock_code, date):
+    """获取指定日期的大股东持股比例（持股变动历史每只股票只下载一次，按日期做时点查询），
+    没有变动记录的按0处理；取数出错时抛出异常，由 process_single_stock 记为出错"""
+    ratio = holder_store.change_ratio_on(date, [stock_code]).iloc[0]
+    return 0 if pd.isna(ratio) else ratio
 
-def get_trading_data(stock_code, date, max_retries=3):
-    """获取交易数据"""
-    for attempt in range(max_retries):
-        try:
-            end_date = pd.to_datetime(date)
-            start_date = end_date - timedelta(days=10)
-            df = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                start_date=start_date.strftime('%Y%m%d'),
-                end_date=end_date.strftime('%Y%m%d'),
-                period="daily"
-            )
-            if not df.empty:
-                return df.tail(6)
-            time.sleep(0.5)
-        except Exception as e:
-            if attempt == max_retries - 1:
-                with print_lock:
-                    print(f"获取股票{stock_code}交易数据失败: {e}")
-            time.sleep(1)
+def get_trading_data(stock_code, date):
+    """获取最近6个交易日的交易数据，没有行情时返回 None；取数出错时抛出异常，由 process_single_stock 记为出错"""
+    end_date = pd.to_datetime(date)
+    start_date = trade_calendar.shift(end_date, -5)
+    df = bar_store.get_bars(stock_code, start_date, end_date)
+    if not df.empty:
+        return df.tail(6)
     return None
 
 def check_volume_conditions(trading_data):
@@ -134,109 +95,169 @@ def check_limit_up(trading_data):
         print(f"检查一字涨停时发生错误: {e}")
         return True
 
-def get_trading_dates(start_date, end_date, max_retries=3):
+def get_trading_dates(start_date, end_date):
     """获取交易日历"""
-    for attempt in range(max_retries):
-        try:
-            trading_calendar = ak.tool_trade_date_hist_sina()
-            trading_calendar['trade_date'] = pd.to_datetime(trading_calendar['trade_date'])
-            mask = (trading_calendar['trade_date'] >= pd.to_datetime(start_date)) & \
-                   (trading_calendar['trade_date'] <= pd.to_datetime(end_date))
-            return trading_calendar[mask]['trade_date'].dt.strftime('%Y-%m-%d').tolist()
-        except Exception as e:
-            if attempt == max_retries - 1:
-                print(f"获取交易日历失败: {e}")
-            time.sleep(1)
-    return []
+    return trade_calendar.get_trading_dates(start_date, end_date)
 
-def process_single_stock(stock, date, stock_data_batch, financial_data_batch):
-    print(f"处理股票 {stock} 数据")
-    """处理单个股票的逻辑"""
+def process_single_stock(stock, date, stock_data_batch, financial_data_batch, values=None):
+    """处理单个股票的逻辑，values 不为 None 时把中间数据写进去供运行日志记录
+
+    筛选结果（淘汰原因或入选）只放进选股日志队列，不在线程里输出。
+    出错时记入选股日志后抛出异常，调用方不把这只股票记为处理完成。
+    """
+    values = {} if values is None else values
     try:
-        # 获取股票名称
-        stock_name = None
-        try:
-            stock_info_list = ak.stock_info_a_code_name()
-            stock_name = stock_info_list[stock_info_list['code'] == stock]['name'].values[0]
-        except:
-            stock_name = "未知"
-            
         # 从批量数据中获取股票信息
         if stock not in stock_data_batch.index:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 无法获取股票数据")
+            screen_log.log(stock, date, '无法获取股票数据')
             return None
             
         stock_info = stock_data_batch.loc[stock]
         market_cap = float(stock_info['总市值']) if '总市值' in stock_info else float('inf')
+        values['market_cap'] = market_cap
         
         # 快速筛选市值
-        if market_cap > 3000000000:  # 市值大于30亿
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 市值{market_cap:.2f}, 市值超过30亿")
+        if not market_cap <= 3000000000:  # 市值大于30亿（或没有市值数据）
+            screen_log.log(stock, date, '市值超过30亿', **values)
             return None
             
         # 检查财务数据
         financial = financial_data_batch.get(stock)
         if not financial:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 无法获取财务数据")
+            screen_log.log(stock, date, '无法获取财务数据', **values)
+            return None
+        values['revenue'] = financial['revenue']
+        values['net_profit'] = financial['net_profit']
+        if pd.isna(financial['revenue']) or pd.isna(financial['net_profit']):
+            screen_log.log(stock, date, '营收或净利润缺失', **values)
             return None
         
         if financial['revenue'] > 200000000:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 营收{financial['revenue']:.2f}, 营收超过2亿")
+            screen_log.log(stock, date, '营收超过2亿', **values)
             return None
             
         if financial['net_profit'] > 3000000:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 净利润{financial['net_profit']:.2f}, 净利润超过300万")
+            screen_log.log(stock, date, '净利润超过300万', **values)
             return None
         
         # 获取大股东持股
         major_holder_ratio = get_major_holder(stock, date)
+        values['major_holder_ratio'] = major_holder_ratio
         if major_holder_ratio < 30:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 大股东持股比例{major_holder_ratio:.2f}%, 持股比例低于30%")
+            screen_log.log(stock, date, '持股比例低于30%', **values)
             return None
         
         # 获取交易数据并检查条件
         trading_data = get_trading_data(stock, date)
         if trading_data is None or len(trading_data) < 5:
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 无法获取足够的交易数据")
+            screen_log.log(stock, date, '无法获取足够的交易数据', **values)
             return None
+        values['volumes'] = trading_data['成交量'].tolist()
         
         if not check_volume_conditions(trading_data):
-            current_volume = trading_data['成交量'].iloc[-1]
-            last_volume = trading_data['成交量'].iloc[-2]
-            avg_volume = trading_data['成交量'].iloc[-5:].mean()
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 当日成交量{current_volume:.0f}, 前日成交量{last_volume:.0f}, "
-                      f"5日均量{avg_volume:.0f}, 成交量条件不满足")
+            screen_log.log(stock, date, '成交量条件不满足', **values,
+                           current_volume=trading_data['成交量'].iloc[-1],
+                           last_volume=trading_data['成交量'].iloc[-2],
+                           avg_volume=trading_data['成交量'].iloc[-5:].mean())
             return None
         
         if check_limit_up(trading_data):
-            with print_lock:
-                print(f"{stock}, {stock_name}, {date}, 存在一字涨停")
+            screen_log.log(stock, date, '存在一字涨停', **values)
             return None
         
         # 满足所有条件
-        with print_lock:
-            print(f"★★★ {stock}, {stock_name}, {date} 满足所有条件 ★★★")
-            print(f"    市值: {market_cap:.2f}")
-            print(f"    营收: {financial['revenue']:.2f}")
-            print(f"    净利润: {financial['net_profit']:.2f}")
-            print(f"    大股东持股: {major_holder_ratio:.2f}%")
+        screen_log.log(stock, date, screen_log.SELECTED, **values)
         return stock
             
     except Exception as e:
-        with print_lock:
-            print(f"处理股票 {stock} 时发生错误: {e}")
-    return None
+        screen_log.error(stock, date, f"处理股票时发生错误: {e}")
+        raise
+
+def build_trading_matrix(stocks, date, window=6):
+    """把每只股票截至 date 的最近 window 个交易日行情排成 交易日×股票 矩阵
+
+    行号按“倒数第几个交易日”对齐（最后一行是各股最近一个有行情的交易日），
+    与逐只股票 get_trading_data(...).tail(6) 取到的数据完全一致，停牌也不会错位。
+    """
+    end_date = pd.to_datetime(date)
+    start_date = trade_calendar.shift(end_date, 1 - window)
+    bar_store.sync(stocks, start_date, end_date)
+    bars = bar_store.read_window(start_date, end_date, stocks)
+    if bars.empty:
+        return {}
+    bars['offset'] = window - 1 - bars.groupby('股票代码').cumcount(ascending=False)
+    bars = bars[bars['offset'] >= 0]
+    return {
+        field: bars.pivot(index='offset', columns='股票代码', values=field).sort_index()
+        for field in ['开盘', '收盘', '成交量']
+    }
+
+def build_cross_section(stocks, date, stock_data_batch, financial_data_batch):
+    """构造当日截面：每只股票一行，包含所有筛选需要的字段"""
+    frame = pd.DataFrame(index=pd.Index(stocks, name='股票代码'))
+    frame['has_bar'] = frame.index.isin(stock_data_batch.index)
+    if '总市值' in stock_data_batch.columns:
+        frame['market_cap'] = pd.to_numeric(stock_data_batch['总市值'], errors='coerce').reindex(frame.index)
+    else:
+        frame['market_cap'] = float('inf')
+
+    financial = pd.DataFrame.from_dict(financial_data_batch, orient='index', columns=['revenue', 'net_profit'])
+    frame['has_financial'] = frame.index.isin(financial.index)
+    frame = frame.join(financial)
+
+    # 成交量条件和一字板条件：在 交易日×股票 矩阵上做滚动计算
+    matrix = build_trading_matrix(stocks, date)
+    if matrix:
+        volume = matrix['成交量']
+        one_price = ((matrix['开盘'] - matrix['收盘']).abs() < 0.01).astype(float)
+        frame['bar_count'] = volume.notna().sum().reindex(frame.index).fillna(0)
+        frame['current_volume'] = volume.iloc[-1].reindex(frame.index)
+        frame['last_volume'] = volume.shift(1).iloc[-1].reindex(frame.index)
+        frame['avg_volume'] = volume.rolling(5).mean().iloc[-1].reindex(frame.index)
+        frame['one_price_limit'] = one_price.rolling(2).max().iloc[-1].reindex(frame.index).fillna(1).astype(bool)
+    else:
+        frame['bar_count'] = 0
+        frame['current_volume'] = frame['last_volume'] = frame['avg_volume'] = float('nan')
+        frame['one_price_limit'] = True
+    return frame
+
+def select_cross_sectional(stocks, date, stock_data_batch, financial_data_batch, journal=None):
+    """截面选股：所有阈值都用布尔列掩码一次判断，结果与逐只股票的 process_single_stock 相同"""
+    frame = build_cross_section(stocks, date, stock_data_batch, financial_data_batch)
+
+    mask = frame['has_bar'] & (frame['market_cap'] <= 3000000000)
+    mask &= frame['has_financial']
+    mask &= (frame['revenue'] <= 200000000) & (frame['net_profit'] <= 3000000)
+    mask &= frame['bar_count'] >= 5
+    mask &= (frame['current_volume'] > 2 * frame['last_volume']) & \
+            (frame['current_volume'] > 3 * frame['avg_volume'])
+    mask &= ~frame['one_price_limit']
+
+    # 大股东持股只对其余条件都满足的股票查询，没有变动记录的按0处理
+    candidates = frame.index[mask].tolist()
+    ratios = holder_store.change_ratio_on(date, candidates).fillna(0) if candidates else pd.Series(dtype=float)
+    frame['major_holder_ratio'] = ratios.reindex(frame.index)
+    mask &= ~(frame['major_holder_ratio'] < 30)
+
+    selected = frame.index[mask].tolist()
+    if journal is not None:
+        for stock, values in frame.drop(columns=['has_bar', 'has_financial']).to_dict(orient='index').items():
+            journal.record_stock(date, stock, mask[stock], values)
+    for stock in selected:
+        row = frame.loc[stock]
+        print(f"★★★ {stock}, {date} 满足所有条件 ★★★")
+        print(f"    市值: {row['market_cap']:.2f}")
+        print(f"    营收: {row['revenue']:.2f}")
+        print(f"    净利润: {row['net_profit']:.2f}")
+        print(f"    大股东持股: {row['major_holder_ratio']:.2f}%")
+    return selected
 
-def run_daily_selection(date):
-    """每个交易日的选股逻辑"""
+def run_daily_selection(date, cross_sectional=False, journal=None):
+    """每个交易日的选股逻辑，cross_sectional=True 时使用截面向量化筛选
+
+    传入 journal 时每只股票处理完就写入运行日志，续跑时跳过日志里已经处理过的股票（两种筛选方式相同）；
+    有股票处理出错时，其余股票照常写入，最后抛出异常，这一天不记为完成，续跑时只重新处理出错的股票。
+    """
     print(f"\n开始处理日期: {date}")
     
     # 批量获取数据
@@ -245,29 +266,49 @@ def run_daily_selection(date):
     
     stocks = get_trading_stocks()
     selected_stocks = []
+    if journal is not None:
+        done = journal.done_stocks(date)
+        if done:
+            print(f"{date} 已处理 {len(done)} 只股票，从运行日志恢复")
+        selected_stocks = [stock for stock, record in done.items() if record['selected']]
+        stocks = [stock for stock in stocks if stock not in done]
+    
+    if cross_sectional:
+        if stocks:
+            selected_stocks += select_cross_sectional(stocks, date, stock_data_batch, financial_data_batch, journal)
+        return {date: selected_stocks}
     
+    failed = []
     # 使用线程池处理股票
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_stock = {
-            executor.submit(
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_engine.MAX_CONCURRENCY) as executor:
+        future_to_stock = {}
+        for stock in stocks:
+            values = {}
+            future = executor.submit(
                 process_single_stock, 
                 stock, 
                 date, 
                 stock_data_batch, 
-                financial_data_batch
-            ): stock for stock in stocks
-        }
+                financial_data_batch,
+                values
+            )
+            future_to_stock[future] = (stock, values)
         
         for future in concurrent.futures.as_completed(future_to_stock, timeout=300):
-            stock = future_to_stock[future]
+            stock, values = future_to_stock[future]
             try:
                 result = future.result(timeout=60)
                 if result:
                     selected_stocks.append(result)
-            except Exception as e:
-                with print_lock:
-                    print(f"处理股票 {stock} 时发生错误: {e}")
+                if journal is not None:
+                    journal.record_stock(date, stock, bool(result), values)
+            except Exception:
+                # 错误已经在 process_single_stock 中记入选股日志
+                failed.append(stock)
     
+    screen_log.print_summary(date)
+    if failed:
+        raise RuntimeError(f"{len(failed)}只股票处理出错，这一天不记为完成")
     return {date: selected_stocks}
 
 def save_results(results):
@@ -287,35 +328,98 @@ def save_results(results):
     except Exception as e:
         print(f"保存结果时发生错误: {e}")
 
-def main(start_date, end_date):
-    """主函数"""
+def _init_worker(workers):
+    """工作进程初始化：只读共享主进程已经同步好的本地数据，限速额度按进程数平分"""
+    bar_store.READ_ONLY = True
+    financial_index.READ_ONLY = True
+    market_cap.READ_ONLY = True
+    holder_store.READ_ONLY = True
+    for name in fetch_engine.RATE_LIMITS:
+        fetch_engine.RATE_LIMITS[name] /= workers
+    fetch_engine.DEFAULT_RATE /= workers
+
+def _run_date_in_worker(date, cross_sectional, done):
+    """在工作进程中处理一个交易日，返回 (日期, 入选股票, 逐只股票的日志记录)"""
+    buffer = RecordBuffer(done)
+    result = run_daily_selection(date, cross_sectional, buffer)
+    return date, result[date], buffer.records
+
+def _report_date(date, stocks):
+    if stocks:
+        print(f"\n{date} 满足条件的股票：{stocks}")
+    else:
+        print(f"\n{date} 没有满足条件的股票")
+
+def _run_dates_parallel(dates, cross_sectional, journal, workers):
+    """把交易日分给多个进程并行处理，结果由主进程统一写入运行日志"""
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                initializer=_init_worker, initargs=(workers,)) as executor:
+        futures = {
+            executor.submit(_run_date_in_worker, date, cross_sectional, journal.done_stocks(date)): date
+            for date in dates
+        }
+        for future in concurrent.futures.as_completed(futures):
+            date = futures[future]
+            try:
+                date, stocks, records = future.result()
+                for record in records:
+                    journal.record_stock(*record)
+                journal.finish_date(date, stocks)
+                _report_date(date, stocks)
+            except Exception as e:
+                print(f"处理日期 {date} 时发生错误: {e}")
+
+def main(start_date, end_date, cross_sectional=False, resume=False, workers=1):
+    """主函数，resume=True 时从上次中断的地方继续，workers>1 时多个交易日在多个进程中并行处理"""
     trading_dates = get_trading_dates(start_date, end_date)
     if not trading_dates:
         print("未获取到交易日期")
         return
     
-    all_results = {}
+    journal = RunJournal(f"chongzu2_{start_date}_{end_date}", resume=resume)
+    pending_dates = [date for date in trading_dates if not journal.is_date_done(date)]
+    if len(pending_dates) < len(trading_dates):
+        print(f"从运行日志恢复 {len(trading_dates) - len(pending_dates)} 个已完成的交易日")
     
-    for date in trading_dates:
-        try:
-            result = run_daily_selection(date)
-            all_results.update(result)
-            
-            stocks = result[date]
-            if stocks:
-                print(f"\n{date} 满足条件的股票：{stocks}")
-            else:
-                print(f"\n{date} 没有满足条件的股票")
-                
-        except Exception as e:
-            print(f"处理日期 {date} 时发生错误: {e}")
-            continue
+    # 一次性把整个区间的行情、财报和股东持股变动历史同步到本地，之后逐日读取不再联网
+    stocks = get_trading_stocks()
+    prefetched = True
+    if pending_dates:
+        prefetched = fetch_engine.prefetch(
+            lambda: bar_store.sync(stocks, trade_calendar.shift(pending_dates[0], -5), pending_dates[-1]),
+            lambda: financial_index.update(stocks),
+            lambda: market_cap.load_panel(pending_dates[0], pending_dates[-1], stocks),
+            lambda: holder_store.load_change_panel(pending_dates[0], pending_dates[-1], stocks),
+        )
+    
+    try:
+        # 工作进程只读本地数据，预先下载有失败时在主进程逐日处理，失败的股票在处理时重新下载
+        if workers > 1 and len(pending_dates) > 1 and prefetched:
+            _run_dates_parallel(pending_dates, cross_sectional, journal, workers)
+        else:
+            for date in pending_dates:
+                try:
+                    result = run_daily_selection(date, cross_sectional, journal)
+                    journal.finish_date(date, result[date])
+                    _report_date(date, result[date])
+                except Exception as e:
+                    print(f"处理日期 {date} 时发生错误: {e}")
+                    continue
+    finally:
+        journal.close()
     
-    save_results(all_results)
+    # 汇总运行日志里全部已完成交易日的结果（按日期排序，与并行完成的先后无关）
+    save_results(journal.results())
 
 if __name__ == "__main__":
-    start_date = '2024-08-05'
-    end_date = '2024-11-28'
+    parser = argparse.ArgumentParser(description='回溯选股')
+    parser.add_argument('--start', default='2024-08-05', help='开始日期')
+    parser.add_argument('--end', default='2024-11-28', help='结束日期')
+    parser.add_argument('--cross-sectional', action='store_true', help='使用截面向量化筛选')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的地方继续')
+    parser.add_argument('--workers', type=int, default=1, help='并行处理交易日的进程数')
+    args = parser.parse_args()
     
-    print(f"开始回溯选股 - 从 {start_date} 到 {end_date}")
-    main(start_date, end_date)
\ No newline at end of file
+    print(f"开始回溯选股 - 从 {args.start} 到 {args.end}")
+    main(args.start, args.end, args.cross_sectional, args.resume, args.workers)
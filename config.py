@@ -0,0 +1,5 @@
+# 本地数据相关的公共配置
+import os
+
+# 本地数据根目录，可通过环境变量 STOCKS_DATA_DIR 指定
+DATA_DIR = os.environ.get('STOCKS_DATA_DIR', 'data')
@@ -0,0 +1,119 @@
+# 取数规划
+# 登记每个字段可以从哪些接口获取：全市场批量接口每个报告期一次调用返回所有股票，逐只股票接口每只股票一次调用返回全部历史。
+# 本地库补数时按“股票数 × 需要补的报告期数”估算各接口的请求数，挑选最便宜的一个；
+# 批量结果按股票代码向量化筛选后合并进本地库。例如3000只股票补一期营收净利润，批量接口十几个请求，逐只接口3000个。
+import akshare as ak
+import pandas as pd
+
+import fetch_engine
+
+# 本地没有历史的股票走批量接口时，从这个报告期开始补齐
+HISTORY_START = '20150331'
+
+
+class Source:
+    """数据源：bulk=True 为全市场批量接口，cost 为每个报告期一次调用的估计请求数（接口内部分页）；
+    否则为逐只股票接口，cost 为每只股票的请求数。批量接口的 fetch(periods, symbols) 在本模块实现，
+    逐只股票接口由对应的本地库（financial_index / holder_store）自己下载，fetch 为 None。"""
+
+    def __init__(self, name, fields, cost, bulk, fetch=None):
+        self.name = name
+        self.fields = list(fields)
+        self.cost = cost
+        self.bulk = bulk
+        self.fetch = fetch
+
+    def estimate(self, n_symbols, n_periods):
+        """为 n_symbols 只股票补 n_periods 个报告期的估计请求数"""
+        return self.cost * (n_periods if self.bulk else n_symbols)
+
+
+def quarter_ends(start_date, end_date):
+    """[start_date, end_date] 内的季度报告期末 'YYYYMMDD'，从早到晚"""
+    periods = pd.date_range(pd.to_datetime(start_date).normalize(), pd.to_datetime(end_date).normalize(), freq='QE-DEC')
+    return list(periods.strftime('%Y%m%d'))
+
+
+def periods_to_fetch(latest, symbols, end_period, force=False):
+    """symbols 需要补齐的报告期：从各股票本地最新一期的下一期（没有历史或 force 时从 HISTORY_START）到 end_period，
+    latest 为 {股票: 本地最新报告期}"""
+    starts = []
+    for symbol in symbols:
+        last = None if force else latest.get(symbol)
+        if last is None or pd.isna(last):
+            starts.append(pd.Timestamp(HISTORY_START))
+        else:
+            starts.append(pd.Timestamp(last) + pd.offsets.QuarterEnd(1))
+    return quarter_ends(min(starts), end_period) if starts else []
+
+
+def _fetch_periods(func, kwarg, periods, symbols, code_col):
+    """对每个报告期（从早到晚）调用一次批量接口，只保留 symbols 的行并加上 报告期 列
+
+    有报告期下载失败时，symbols 全部记为失败，并且只返回失败报告期之前的数据：
+    本地历史保持连续，下次从失败的报告期接着补，不会留下中间的缺口。
+    """
+    frames, failed = [], {}
+    results = fetch_engine.fetch_many(func, [{kwarg: period} for period in periods])
+    for period, df in zip(periods, results):
+        if isinstance(df, Exception):
+            print(f"批量获取报告期{period}数据失败: {df}")
+            failed = dict.fromkeys(symbols, df)
+            break
+        if df is None or df.empty:
+            continue
+        df = df.assign(股票代码=df[code_col].astype(str).str.zfill(6), 报告期=pd.Timestamp(period))
+        frames.append(df[df['股票代码'].isin(symbols)])
+    frames = [df for df in frames if not df.empty]
+    return (pd.concat(frames, ignore_index=True) if frames else None), failed
+
+
+def fetch_performance(periods, symbols):
+    """业绩报表（stock_yjbb_em）：返回 (股票代码, 报告期, 公告日期, 营业收入, 净利润 的 DataFrame 或 None, {股票: 错误})
+
+    公告日期用的是最新公告日期，有更正时晚于首次公告，按它查询不会用到未来数据。
+    """
+    df, failed = _fetch_periods(ak.stock_yjbb_em, 'date', periods, set(symbols), '股票代码')
+    if df is None:
+        return None, failed
+    return pd.DataFrame({
+        '股票代码': df['股票代码'].values,
+        '报告期': df['报告期'].values,
+        '公告日期': pd.to_datetime(df['最新公告日期'], errors='coerce').values,
+        '营业收入': pd.to_numeric(df['营业总收入-营业总收入'], errors='coerce').values,
+        '净利润': pd.to_numeric(df['净利润-净利润'], errors='coerce').values,
+    }), failed
+
+
+def fetch_holder_counts(periods, symbols):
+    """股东户数（stock_zh_a_gdhs）：返回 (股票代码, 报告期, 公告日期, 总股本, 股东户数 的 DataFrame 或 None, {股票: 错误})，
+    报告期为股东户数统计截止日"""
+    df, failed = _fetch_periods(ak.stock_zh_a_gdhs, 'symbol', periods, set(symbols), '代码')
+    if df is None:
+        return None, failed
+    cutoff = pd.to_datetime(df['股东户数统计截止日-本次'], errors='coerce')
+    return pd.DataFrame({
+        '股票代码': df['股票代码'].values,
+        '报告期': cutoff.fillna(df['报告期']).values,
+        '公告日期': pd.to_datetime(df['公告日期'], errors='coerce').values,
+        '总股本': pd.to_numeric(df['总股本'], errors='coerce').values,
+        '股东户数': pd.to_numeric(df['股东户数-本次'], errors='coerce').values,
+    }), failed
+
+
+# 全市场约5500只股票，批量接口每页500条，每个报告期一次调用约12个请求
+SOURCES = [
+    Source('stock_yjbb_em', ['营业收入', '净利润'], cost=12, bulk=True, fetch=fetch_performance),
+    Source('stock_financial_report_em', ['营业收入', '净利润'], cost=1, bulk=False),
+    Source('stock_zh_a_gdhs', ['总股本', '股东户数'], cost=12, bulk=True, fetch=fetch_holder_counts),
+    Source('stock_zh_a_gdhs_detail_em', ['总股本', '股东户数'], cost=1, bulk=False),
+]
+
+
+def plan(fields, n_symbols, n_periods):
+    """为 n_symbols 只股票补 n_periods 个报告期的 fields，返回估计请求数最少、能提供全部字段的数据源；
+    请求数相同时优先批量接口，没有数据源提供全部字段时抛出 KeyError"""
+    candidates = [source for source in SOURCES if set(fields) <= set(source.fields)]
+    if not candidates:
+        raise KeyError(f"没有数据源提供字段: {list(fields)}")
+    return min(candidates, key=lambda source: (source.estimate(n_symbols, n_periods), not source.bulk))
@@ -0,0 +1,167 @@
+# 收盘后增量同步
+# 每个交易日收盘后（或第二天开盘前）运行一次，用全市场批量接口只取最新一个交易日的数据追加进本地库：
+#   行情    stock_zh_a_spot_em 一次取回全市场快照，作为当天日线写入行情库
+#   总股本  由同一份快照的 总市值/最新价 反推，有变化的记为一次股本变动
+#   持股变动 stock_ggcg_em 列出这段时间有股东增减持公告的股票，只重新下载这些股票的持股变动历史
+#   公告    stock_notice_report 按天取全市场公告
+# 各个本地库都是先写临时文件再替换，中途失败不会留下写了一半的文件。
+# 之后的选股从完整的本地数据开始，不再逐只股票补下载最近的数据。
+#
+# 用法：python eod_sync.py [--date 2024-08-05]
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import akshare as ak
+import pandas as pd
+
+import announcement_store
+import bar_store
+import fetch_engine
+import holder_store
+import market_cap
+import symbol_master
+import trade_calendar
+
+# 收盘后快照稳定下来的时间，以及下一个交易日集合竞价开始的时间
+CLOSE_TIME = '15:30'
+OPEN_TIME = '09:15'
+
+# 全市场快照的列名 -> 本地日线的列名
+SPOT_COLUMNS = {
+    '代码': '股票代码', '今开': '开盘', '最新价': '收盘', '最高': '最高', '最低': '最低',
+    '成交量': '成交量', '成交额': '成交额', '振幅': '振幅', '涨跌幅': '涨跌幅', '涨跌额': '涨跌额',
+    '换手率': '换手率',
+}
+
+
+def get_trading_stocks():
+    """与选股脚本相同的股票范围：主板A股"""
+    return symbol_master.main_board_codes()
+
+
+def snapshot_date(now=None):
+    """全市场快照当前对应的交易日：收盘后是当天，开盘前和非交易日是上一个交易日，盘中返回 None"""
+    now = now or datetime.now()
+    today = pd.Timestamp(now.date())
+    clock = now.strftime('%H:%M')
+    if trade_calendar.is_trading_day(today):
+        if clock >= CLOSE_TIME:
+            return today
+        if clock >= OPEN_TIME:
+            return None
+    return trade_calendar.prev_trading_day(today)
+
+
+def spot_to_bars(spot, date, stocks):
+    """把全市场快照整理成本地日线的格式，去掉停牌（没有成交）的股票"""
+    df = spot.rename(columns=SPOT_COLUMNS)
+    df['股票代码'] = df['股票代码'].astype(str).str.zfill(6)
+    df = df[df['股票代码'].isin(stocks)]
+    bars = df.reindex(columns=list(SPOT_COLUMNS.values())).copy()
+    for column in bars.columns[1:]:
+        bars[column] = pd.to_numeric(bars[column], errors='coerce')
+    bars.insert(0, '日期', pd.to_datetime(date).strftime('%Y-%m-%d'))
+    bars = bars[bars['收盘'].notna() & (bars['成交量'] > 0)]
+    return bars.reset_index(drop=True)
+
+
+def spot_shares(spot, stocks):
+    """由快照的 总市值/最新价 反推总股本（股），返回以股票代码为索引的 Series"""
+    codes = spot['代码'].astype(str).str.zfill(6)
+    shares = pd.to_numeric(spot['总市值'], errors='coerce') / pd.to_numeric(spot['最新价'], errors='coerce')
+    shares = pd.Series(shares.values, index=codes.values)
+    return shares[shares.index.isin(stocks)]
+
+
+def sync_bars_and_shares(date, since, stocks):
+    """用全市场快照写入 date 当天的日线和总股本；快照不是 date 当天的时逐只股票补下载"""
+    if pd.Timestamp(date) != snapshot_date():
+        print(f"全市场快照不是{date:%Y-%m-%d}的数据，逐只股票下载行情")
+        requests = bar_store.sync(stocks, date, date)
+        print(f"行情: 发出{requests}个请求")
+        return
+    spot = fetch_engine.call(ak.stock_zh_a_spot_em)
+    bars = spot_to_bars(spot, date, stocks)
+    rows = bar_store.append_day(date, bars, stocks, since=since)
+    print(f"行情: 写入{rows}只股票（{len(stocks) - rows}只停牌或无数据）")
+    changed = market_cap.append_shares(date, spot_shares(spot, stocks), since)
+    print(f"总股本: {changed}只股票股本有变动")
+
+
+def sync_holder_changes(date, since, stocks):
+    """只重新下载 (since, date] 内有股东增减持公告的股票的持股变动历史"""
+    notices = fetch_engine.call(ak.stock_ggcg_em, symbol="全部")
+    announced = pd.to_datetime(notices['公告日'], errors='coerce')
+    in_range = (announced > pd.Timestamp(since)) & (announced <= pd.Timestamp(date))
+    changed = set(notices.loc[in_range, '代码'].astype(str).str.zfill(6)) & set(stocks)
+    # 先记下没有公告的股票，有公告的股票下载失败抛出异常时不影响它们
+    holder_store.mark_changes_fetched([s for s in stocks if s not in changed], date, since)
+    requests = holder_store.update_changes(sorted(changed), date, force=True)
+    print(f"持股变动: {len(changed)}只股票有增减持公告，发出{requests}个请求")
+
+
+def sync_announcements(date, since, stocks):
+    """按天下载 (since, date] 内（包括周末和节假日）的全市场公告
+
+    某一天下载失败时记下来继续下载其余的天，只把下载成功的连续几天记入已同步区间，
+    失败的那天留作缺口，之后 announcement_store.sync 会逐只股票补齐。
+    """
+    start = pd.Timestamp(since) + timedelta(days=1)
+    days = pd.date_range(start, date, freq='D')
+    results = fetch_engine.fetch_many(ak.stock_notice_report, [
+        dict(symbol='全部', date=day.strftime('%Y%m%d')) for day in days
+    ])
+    rows = 0
+    failed = []
+    run, frames = [], []
+
+    def flush():
+        nonlocal rows
+        if run:
+            df = pd.concat(frames, ignore_index=True) if frames else None
+            rows += announcement_store.append_days(run[0], run[-1], df, stocks)
+        run.clear()
+        frames.clear()
+
+    for day, df in zip(days, results):
+        if isinstance(df, Exception):
+            print(f"获取{day:%Y-%m-%d}的公告失败: {df}")
+            failed.append(day)
+            flush()
+            continue
+        run.append(day)
+        if df is not None and not df.empty:
+            frames.append(df)
+    flush()
+    print(f"公告: {len(days) - len(failed)}天共写入{rows}条" + (f"，{len(failed)}天失败" if failed else ""))
+
+
+def main(date=None):
+    """同步 date（默认为全市场快照对应的交易日）的数据"""
+    date = pd.Timestamp(date) if date else snapshot_date()
+    if date is None:
+        print("正在交易时段，收盘后再运行")
+        return
+    if not trade_calendar.is_trading_day(date):
+        print(f"{date:%Y-%m-%d} 不是交易日")
+        return
+    since = trade_calendar.prev_trading_day(date)
+    stocks = get_trading_stocks()
+    print(f"收盘同步 {date:%Y-%m-%d}（上一交易日 {since:%Y-%m-%d}），共{len(stocks)}只股票")
+
+    start = time.time()
+    for name, step in [('行情和总股本', sync_bars_and_shares), ('持股变动', sync_holder_changes),
+                       ('公告', sync_announcements)]:
+        try:
+            step(date, since, stocks)
+        except Exception as e:
+            print(f"同步{name}失败: {e}")
+    print(f"同步完成，耗时{time.time() - start:.1f}秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='收盘后增量同步全市场数据')
+    parser.add_argument('--date', help='同步的交易日，默认为最近一个已收盘的交易日')
+    args = parser.parse_args()
+    main(args.date)
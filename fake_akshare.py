@@ -0,0 +1,431 @@
+# 离线的假 akshare 模块
+# 为选股脚本用到的接口生成确定性的合成数据（同一只股票同一天每次返回相同的值），
+# 可以配置每次调用的延迟和出错概率，用来在不访问真实接口的情况下测试和评估性能。
+# 用法：在导入任何用到 akshare 的模块之前执行 fake_akshare.install()。
+import sys
+import time
+import zlib
+import random
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# 股票数量、每次调用的平均延迟（秒）、出错概率
+UNIVERSE_SIZE = 3000
+LATENCY = 0.0
+ERROR_RATE = 0.0
+CALENDAR_START = '2015-01-01'
+CALENDAR_END = '2026-12-31'
+
+MAIN_BOARD_PREFIXES = ['600', '601', '603', '000', '001', '002']
+
+_lock = threading.Lock()
+_calls = Counter()
+_random = random.Random(0)
+
+
+def configure(universe_size=None, latency=None, error_rate=None, seed=None):
+    """修改股票数量、延迟和出错概率"""
+    global UNIVERSE_SIZE, LATENCY, ERROR_RATE
+    if universe_size is not None:
+        UNIVERSE_SIZE = universe_size
+        _codes.cache = None
+    if latency is not None:
+        LATENCY = latency
+    if error_rate is not None:
+        ERROR_RATE = error_rate
+    if seed is not None:
+        _random.seed(seed)
+
+
+def install():
+    """把本模块注册为 akshare，之后 import akshare 得到的都是它"""
+    sys.modules['akshare'] = sys.modules[__name__]
+
+
+def call_counts():
+    """各接口被调用的次数"""
+    with _lock:
+        return dict(_calls)
+
+
+def reset_counts():
+    with _lock:
+        _calls.clear()
+
+
+def _request(endpoint):
+    """记录一次调用，模拟网络延迟和偶发错误"""
+    with _lock:
+        _calls[endpoint] += 1
+        fail = _random.random() < ERROR_RATE
+        delay = _random.expovariate(1 / LATENCY) if LATENCY > 0 else 0
+    if delay:
+        time.sleep(delay)
+    if fail:
+        raise ConnectionError(f"{endpoint}: Connection aborted (模拟错误)")
+
+
+def _seed(symbol):
+    return zlib.crc32(str(symbol)[-6:].encode())
+
+
+def _hash(a, b):
+    """确定性的伪随机数，取值在 [0, 1)，可以对数组逐元素计算"""
+    x = np.sin(np.asarray(a, dtype=np.float64) * 12.9898 + np.asarray(b, dtype=np.float64) * 78.233) * 43758.5453
+    return x - np.floor(x)
+
+
+def _codes():
+    if _codes.cache is None:
+        codes = [f"{MAIN_BOARD_PREFIXES[i % len(MAIN_BOARD_PREFIXES)]}{i // len(MAIN_BOARD_PREFIXES):03d}"
+                 for i in range(UNIVERSE_SIZE)]
+        _codes.cache = codes
+    return _codes.cache
+
+
+_codes.cache = None
+
+
+def _calendar():
+    if _calendar.cache is None:
+        _calendar.cache = pd.bdate_range(CALENDAR_START, CALENDAR_END)
+    return _calendar.cache
+
+
+_calendar.cache = None
+
+
+def _report_periods(start='2018-03-31', end='2025-12-31'):
+    return pd.date_range(start, end, freq='QE-DEC')
+
+
+def _announce_dates(periods):
+    """季报在报告期结束40天后公告，年报100天后公告"""
+    offsets = np.where(periods.month == 12, 100, 40)
+    return periods + pd.to_timedelta(offsets, unit='D')
+
+
+def _profiles(symbols):
+    """每只股票固定的规模参数（数组）：种子、股本（股）、基础股价、营收规模、大股东持股比例"""
+    seed = np.array([_seed(s) for s in symbols], dtype=np.int64)
+    u = _hash(seed[:, None], np.arange(4)[None, :])
+    shares = 5e7 * 10 ** (2.5 * u[:, 0])
+    price = 3 + 40 * u[:, 1]
+    revenue = 3e7 * 10 ** (2.5 * u[:, 2])
+    holder_ratio = 10 + 60 * u[:, 3]
+    return seed, shares, price, revenue, holder_ratio
+
+
+def _profile(symbol):
+    return tuple(v[0].item() for v in _profiles([symbol]))
+
+
+def stock_info_a_code_name():
+    _request('stock_info_a_code_name')
+    codes = _codes()
+    return pd.DataFrame({'code': codes, 'name': [f"股票{code}" for code in codes]})
+
+
+def _listing(exchange_codes, code_col, date_col):
+    dates = [pd.Timestamp('2000-01-01') + pd.Timedelta(days=int(_hash(_seed(c), 9) * 5000)) for c in exchange_codes]
+    return pd.DataFrame({code_col: exchange_codes, date_col: [d.strftime('%Y-%m-%d') for d in dates]})
+
+
+def stock_info_sh_name_code(symbol="主板A股"):
+    _request('stock_info_sh_name_code')
+    codes = [c for c in _codes() if c.startswith('6')] if symbol == "主板A股" else []
+    return _listing(codes, '证券代码', '上市日期')
+
+
+def stock_info_sz_name_code(symbol="A股列表"):
+    _request('stock_info_sz_name_code')
+    return _listing([c for c in _codes() if c.startswith('0')], 'A股代码', 'A股上市日期')
+
+
+def stock_info_bj_name_code():
+    _request('stock_info_bj_name_code')
+    return _listing([], '证券代码', '上市日期')
+
+
+def tool_trade_date_hist_sina():
+    _request('tool_trade_date_hist_sina')
+    return pd.DataFrame({'trade_date': _calendar().date})
+
+
+def _bars(seed, shares, price, n):
+    """按股票参数和日期序号（距 CALENDAR_START 的天数）生成日线，参数可以是可以广播的数组"""
+    close = price * (1 + 0.2 * np.sin(n / 30 + seed % 7)) * (1 + 0.02 * (_hash(seed, n) - 0.5))
+    open_ = close * (1 + 0.03 * (_hash(seed + 1, n) - 0.5))
+    spike = np.where(_hash(seed + 2, n) > 0.95, 10.0, 1.0)
+    volume = np.round(shares / 200 * (0.5 + _hash(seed + 3, n)) * spike / 100)
+    return {
+        '开盘': np.round(open_, 2),
+        '收盘': np.round(close, 2),
+        '最高': np.round(np.maximum(open_, close) * 1.01, 2),
+        '最低': np.round(np.minimum(open_, close) * 0.99, 2),
+        '成交量': volume,
+        '成交额': volume * 100 * close,
+        '振幅': 2.0,
+        '涨跌幅': 0.0,
+        '涨跌额': 0.0,
+        '换手率': volume * 100 / shares * 100,
+    }
+
+
+def stock_zh_a_hist(symbol="000001", period="daily", start_date="19700101", end_date="20500101", adjust=""):
+    _request('stock_zh_a_hist')
+    days = _calendar()
+    days = days[days.searchsorted(pd.to_datetime(start_date)):days.searchsorted(pd.to_datetime(end_date), 'right')]
+    if len(days) == 0:
+        return pd.DataFrame()
+    seed, shares, price, _, _ = _profile(symbol)
+    n = (days - pd.Timestamp(CALENDAR_START)).days.values
+    return pd.DataFrame({'日期': days.strftime('%Y-%m-%d'), '股票代码': symbol, **_bars(seed, shares, price, n)})
+
+
+def _last_close_day():
+    """快照对应的交易日：15点以后是当天，否则是前一个交易日"""
+    now = pd.Timestamp.now()
+    days = _calendar()
+    pos = days.searchsorted(now.normalize(), 'right') - 1
+    if days[pos] == now.normalize() and now.hour < 15:
+        pos -= 1
+    return days[pos]
+
+
+def stock_zh_a_spot_em():
+    _request('stock_zh_a_spot_em')
+    codes = _codes()
+    seed, shares, price, _, _ = _profiles(codes)
+    day = _last_close_day()
+    bars = _bars(seed, shares, price, (day - pd.Timestamp(CALENDAR_START)).days)
+    df = pd.DataFrame({'代码': codes, '名称': [f"股票{code}" for code in codes]})
+    df['最新价'] = bars['收盘']
+    df['今开'] = bars['开盘']
+    for column in ['最高', '最低', '成交量', '成交额', '振幅', '涨跌幅', '涨跌额', '换手率']:
+        df[column] = bars[column]
+    df['总市值'] = bars['收盘'] * shares
+    return df
+
+
+def _financial_history(symbol):
+    """合成的季度财报历史，报告期从新到旧"""
+    seed, _, _, revenue, _ = _profile(symbol)
+    periods = _report_periods()[::-1]
+    quarter = periods.month.values // 3
+    u = _hash(seed, np.arange(len(periods)))
+    return pd.DataFrame({
+        '日期': periods.strftime('%Y-%m-%d'),
+        '公告日期': _announce_dates(periods).strftime('%Y-%m-%d'),
+        '营业收入': revenue * quarter / 4 * (0.8 + 0.4 * u),
+        '净利润': revenue * quarter / 4 * (0.15 * u - 0.05),
+    })
+
+
+def stock_financial_report_em(symbol="600000"):
+    _request('stock_financial_report_em')
+    return _financial_history(symbol)
+
+
+def _period_index(period):
+    """报告期在 _financial_history 中的行号（从新到旧），不在合成的报告期内时为 None"""
+    hit = np.flatnonzero(_report_periods()[::-1] == pd.Timestamp(period))
+    return int(hit[0]) if len(hit) else None
+
+
+def stock_yjbb_em(date="20200331"):
+    """全市场某个报告期的业绩报表，数值与 stock_financial_report_em 的同一期相同"""
+    _request('stock_yjbb_em')
+    i = _period_index(date)
+    if i is None:
+        return pd.DataFrame()
+    codes = _codes()
+    seed, _, _, revenue, _ = _profiles(codes)
+    period = pd.Timestamp(date)
+    u = _hash(seed, i)
+    return pd.DataFrame({
+        '股票代码': codes,
+        '股票简称': [f"股票{code}" for code in codes],
+        '营业总收入-营业总收入': revenue * (period.month // 3) / 4 * (0.8 + 0.4 * u),
+        '净利润-净利润': revenue * (period.month // 3) / 4 * (0.15 * u - 0.05),
+        '最新公告日期': _announce_dates(pd.DatetimeIndex([period]))[0].strftime('%Y-%m-%d'),
+    })
+
+
+def _holder_counts(seed, shares, periods, index):
+    """股东户数和总股本（股），总股本的变化与 stock_share_change_cninfo 一致"""
+    factor = np.select([periods >= pd.Timestamp('2023-06-30'), periods >= pd.Timestamp('2020-06-30')], [1.0, 0.9], 0.8)
+    return np.round(2e4 * (0.5 + _hash(seed, np.asarray(index) + 0.5))), shares * factor
+
+
+def stock_zh_a_gdhs(symbol="20230930"):
+    """全市场某个报告期（'最新' 为已经公告的最新一期）的股东户数"""
+    _request('stock_zh_a_gdhs')
+    periods = _report_periods()
+    if symbol == '最新':
+        symbol = periods[_announce_dates(periods) <= pd.Timestamp.now()][-1]
+    i = _period_index(symbol)
+    if i is None:
+        return pd.DataFrame()
+    codes = _codes()
+    seed, shares, _, _, _ = _profiles(codes)
+    period = pd.DatetimeIndex([pd.Timestamp(symbol)])
+    counts, total = _holder_counts(seed, shares, period, i)
+    return pd.DataFrame({
+        '代码': codes,
+        '名称': [f"股票{code}" for code in codes],
+        '股东户数-本次': counts,
+        '股东户数统计截止日-本次': period[0].strftime('%Y-%m-%d'),
+        '总股本': total,
+        '公告日期': _announce_dates(period)[0].strftime('%Y-%m-%d'),
+    })
+
+
+def stock_zh_a_gdhs_detail_em(symbol="000001"):
+    """单只股票的全部股东户数历史，报告期从新到旧"""
+    _request('stock_zh_a_gdhs_detail_em')
+    seed, shares, _, _, _ = _profile(symbol)
+    periods = _report_periods()[::-1]
+    counts, total = _holder_counts(seed, shares, periods, np.arange(len(periods)))
+    return pd.DataFrame({
+        '股东户数统计截止日': periods.strftime('%Y-%m-%d'),
+        '股东户数-本次': counts,
+        '总股本': total,
+        '股东户数公告日期': _announce_dates(periods).strftime('%Y-%m-%d'),
+        '代码': symbol,
+        '名称': f"股票{symbol}",
+    })
+
+
+def _unit_string(value):
+    if abs(value) >= 1e8:
+        return f"{value / 1e8:.2f}亿"
+    if abs(value) >= 1e4:
+        return f"{value / 1e4:.2f}万"
+    return f"{value:.2f}"
+
+
+def stock_financial_abstract_ths(symbol="000063", indicator="按报告期"):
+    _request('stock_financial_abstract_ths')
+    report = _financial_history(symbol)
+    return pd.DataFrame({
+        '报告期': report['日期'],
+        '营业总收入': [_unit_string(v) for v in report['营业收入']],
+        '净利润': [_unit_string(v) for v in report['净利润']],
+        '扣非净利润': [_unit_string(v * 0.9) for v in report['净利润']],
+        '销售毛利率': [f"{20 + 10 * u:.2f}%" for u in _hash(_seed(symbol), np.arange(len(report)))],
+    })
+
+
+def stock_holder_change(symbol="600000"):
+    _request('stock_holder_change')
+    seed, _, _, _, ratio = _profile(symbol)
+    periods = _report_periods()[::-1]
+    return pd.DataFrame({
+        '变动日期': _announce_dates(periods).strftime('%Y-%m-%d'),
+        '股东名称': f"控股股东{symbol}",
+        '持股比例': [f"{ratio * (0.9 + 0.2 * u):.2f}%" for u in _hash(seed, np.arange(len(periods)))],
+    })
+
+
+def stock_gdfx_top_10_em(symbol="sh688686", date="20210630"):
+    _request('stock_gdfx_top_10_em')
+    seed, _, _, _, ratio = _profile(symbol)
+    if pd.to_datetime(date) > pd.Timestamp.now():
+        return pd.DataFrame()
+    ratios = ratio * 0.5 ** np.arange(10)
+    return pd.DataFrame({
+        '名次': np.arange(1, 11),
+        '股东名称': [f"股东{i}" for i in range(1, 11)],
+        '持股数': ratios * 1e6,
+        '占总股本持股比例': np.round(ratios, 2),
+    })
+
+
+def stock_share_change_cninfo(symbol="002594", start_date="20091227", end_date="20241021"):
+    _request('stock_share_change_cninfo')
+    seed, shares, _, _, _ = _profile(symbol)
+    dates = pd.to_datetime(['2016-06-30', '2020-06-30', '2023-06-30'])
+    return pd.DataFrame({
+        '变动日期': dates.strftime('%Y-%m-%d'),
+        '总股本': shares / 10000 * np.array([0.8, 0.9, 1.0]),
+        '变动原因': '送转股',
+    })
+
+
+
+def stock_ggcg_em(symbol="全部"):
+    _request('stock_ggcg_em')
+    codes = _codes()
+    day = _last_close_day()
+    # 每天约 1% 的股票有股东增减持公告
+    picked = [c for c in codes if _hash(_seed(c), (day - pd.Timestamp(CALENDAR_START)).days + 0.5) < 0.01]
+    return pd.DataFrame({
+        '代码': picked,
+        '股东名称': [f"控股股东{c}" for c in picked],
+        '持股变动信息-增减': '减持',
+        '公告日': day.strftime('%Y-%m-%d'),
+    })
+
+
+def stock_notice_report(symbol="全部", date="20240805"):
+    _request('stock_notice_report')
+    day = pd.to_datetime(date)
+    codes = _codes()
+    n = (day - pd.Timestamp(CALENDAR_START)).days
+    picked = [c for c in codes if _hash(_seed(c), n + 0.25) < 0.05]
+    titles = ['关于重大资产重组的进展公告' if _hash(_seed(c), n + 0.75) < 0.1 else '关于股东减持股份的公告'
+              for c in picked]
+    return pd.DataFrame({
+        '代码': picked,
+        '名称': [f"股票{c}" for c in picked],
+        '公告标题': titles,
+        '公告类型': '临时公告',
+        '公告日期': day.strftime('%Y-%m-%d'),
+        '网址': [f"https://example.com/{c}/{date}" for c in picked],
+    })
+
+
+def _index_bars(symbol, days):
+    seed = _seed(symbol)
+    n = (days - pd.Timestamp(CALENDAR_START)).days.values
+    return _bars(seed, 1e10, 3000.0 + seed % 1000, n)
+
+
+def stock_zh_index_daily(symbol="sh000300"):
+    _request('stock_zh_index_daily')
+    days = _calendar()
+    bars = _index_bars(symbol, days)
+    return pd.DataFrame({'date': days.date, 'open': bars['开盘'], 'high': bars['最高'], 'low': bars['最低'],
+                         'close': bars['收盘'], 'volume': bars['成交量'] * 100})
+
+
+def fund_etf_hist_em(symbol="159707", period="daily", start_date="19700101", end_date="20500101", adjust=""):
+    _request('fund_etf_hist_em')
+    days = _calendar()
+    days = days[days.searchsorted(pd.to_datetime(start_date)):days.searchsorted(pd.to_datetime(end_date), 'right')]
+    bars = _index_bars(symbol, days)
+    return pd.DataFrame({'日期': days.strftime('%Y-%m-%d'), **{k: bars[k] / 1000 if k in ('开盘', '收盘', '最高', '最低')
+                                                             else bars[k] for k in bars}})
+
+
+def stock_industry_clf_hist_sw():
+    _request('stock_industry_clf_hist_sw')
+    codes = _codes()
+    industries = ['110000', '220000', '270000', '340000', '370000', '410000', '430000', '480000', '710000', '730000']
+    return pd.DataFrame({
+        'symbol': codes,
+        'start_date': '2014-01-01',
+        'industry_code': [industries[_seed(c) % len(industries)] for c in codes],
+        'update_time': '2024-01-01',
+    })
+
+
+def index_stock_cons(symbol="000300"):
+    _request('index_stock_cons')
+    codes = _codes()
+    picked = [c for c in codes if _hash(_seed(c), _seed(symbol)) < 0.3]
+    return pd.DataFrame({'品种代码': picked, '品种名称': [f"股票{c}" for c in picked], '纳入日期': '2015-01-05'})
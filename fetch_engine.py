@@ -0,0 +1,305 @@
+# akshare 请求调度引擎
+# 所有接口调用都提交到这里：每个接口一个令牌桶限速，并发数按成功/失败自适应调整（加性增、乘性减），
+# 失败时带随机抖动的指数退避重试，相同参数的请求在执行中会合并为一次。
+# 接口本身是同步阻塞的，在线程池中执行；调度逻辑运行在后台线程的 asyncio 事件循环里。
+import time
+import random
+import asyncio
+import threading
+import functools
+import concurrent.futures
+
+# 每个接口每秒允许的请求数，没有列出的接口使用 DEFAULT_RATE
+RATE_LIMITS = {
+    'stock_zh_a_hist': 8.0,
+    'stock_individual_info_em': 5.0,
+    'stock_gdfx_top_10_em': 5.0,
+    'stock_holder_change': 3.0,
+    'stock_financial_report_em': 3.0,
+    'stock_financial_abstract_ths': 2.0,
+    'stock_zh_a_disclosure_report_cninfo': 2.0,
+    'stock_share_change_cninfo': 2.0,
+}
+DEFAULT_RATE = 5.0
+# 令牌桶容量（允许的突发请求数）相对于速率的倍数
+BURST_SECONDS = 2.0
+
+MAX_CONCURRENCY = 16
+MIN_CONCURRENCY = 1
+INITIAL_CONCURRENCY = 4
+
+MAX_RETRIES = 3
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+
+# 异常信息中出现这些字样时视为被限流
+THROTTLE_MARKERS = ('429', 'Too Many', '频繁', 'RemoteDisconnected', 'Connection aborted', 'Max retries exceeded')
+
+
+class FetchFailed(Exception):
+    """批量下载中有股票失败：成功的部分已经保存，failed 为 {股票: 异常}，调用方把这些股票记为出错"""
+
+    def __init__(self, failed):
+        self.failed = dict(failed)
+        symbol, error = next(iter(self.failed.items()))
+        super().__init__(f"{len(self.failed)}只股票下载失败（{symbol}: {error}）")
+
+
+def _is_throttled(error):
+    message = f"{type(error).__name__}: {error}"
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+def is_retryable(error):
+    """只重试网络错误和限流；接口返回空数据时 akshare 抛出的 KeyError/TypeError 等直接返回给调用方"""
+    return isinstance(error, OSError) or _is_throttled(error)
+
+
+class TokenBucket:
+    """令牌桶限速"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self, seconds):
+        """被限流时清空令牌并暂停一段时间"""
+        self.tokens = -seconds * self.rate
+
+
+class AdaptiveConcurrency:
+    """自适应并发上限：成功时加性增加，出错时乘性减少"""
+
+    def __init__(self, initial, minimum, maximum):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.active = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def release(self, outcome):
+        """outcome 为 'ok'、'error'、'throttled' 或 'neutral'（与服务端无关的错误，不调整并发）"""
+        async with self._condition:
+            self.active -= 1
+            if outcome == 'ok':
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome in ('error', 'throttled'):
+                factor = 0.5 if outcome == 'throttled' else 0.75
+                self.limit = max(self.minimum, self.limit * factor)
+            self._condition.notify_all()
+
+
+class EndpointStats:
+    """单个接口的计数器"""
+
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.merged = 0
+        self.busy_seconds = 0.0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class FetchEngine:
+    """请求调度引擎，submit 返回 concurrent.futures.Future，可以在任意线程中使用"""
+
+    def __init__(self, rate_limits=None, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.rate_limits = dict(RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {}
+        self._buckets = {}
+        self._limiters = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fetch-engine', daemon=True)
+        self._thread.start()
+
+    def _endpoint(self, name):
+        # 只在事件循环线程中调用
+        if name not in self._buckets:
+            rate = self.rate_limits.get(name, DEFAULT_RATE)
+            self._buckets[name] = TokenBucket(rate, max(1.0, rate * BURST_SECONDS))
+            self._limiters[name] = AdaptiveConcurrency(min(INITIAL_CONCURRENCY, self.max_concurrency),
+                                                       MIN_CONCURRENCY, self.max_concurrency)
+        return self._buckets[name], self._limiters[name]
+
+    def _stats(self, name):
+        with self._lock:
+            return self.stats.setdefault(name, EndpointStats())
+
+    async def _run(self, name, func, args, kwargs):
+        bucket, limiter = self._endpoint(name)
+        stats = self._stats(name)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await limiter.acquire()
+            stats.requests += 1
+            start = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+            except Exception as e:
+                stats.busy_seconds += time.monotonic() - start
+                stats.errors += 1
+                if not is_retryable(e):
+                    await limiter.release('neutral')
+                    raise
+                throttled = _is_throttled(e)
+                stats.throttled += throttled
+                await limiter.release('throttled' if throttled else 'error')
+                if attempt == self.max_retries:
+                    raise
+                # 带随机抖动的指数退避
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                if throttled:
+                    bucket.drain(delay)
+                stats.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                stats.busy_seconds += time.monotonic() - start
+                stats.successes += 1
+                await limiter.release('ok')
+                return result
+
+    def submit(self, func, *args, **kwargs):
+        """提交一次接口调用；参数完全相同的请求还在执行时，直接复用它的结果"""
+        name = getattr(func, '__name__', repr(func))
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+        with self._lock:
+            if key is not None and key in self._inflight:
+                self.stats.setdefault(name, EndpointStats()).merged += 1
+                return self._inflight[key]
+            future = asyncio.run_coroutine_threadsafe(self._run(name, func, args, kwargs), self._loop)
+            if key is not None:
+                self._inflight[key] = future
+        if key is not None:
+            future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def call(self, func, *args, **kwargs):
+        """同步调用，返回结果或抛出最后一次的异常"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def map(self, func, kwargs_list):
+        """并发调用同一个接口，按输入顺序返回结果，失败的位置返回异常对象"""
+        futures = [self.submit(func, **kwargs) for kwargs in kwargs_list]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def summary(self):
+        """各接口的计数器"""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """进程内共享的默认引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = FetchEngine()
+        return _engine
+
+
+def call(func, *args, **kwargs):
+    return get_engine().call(func, *args, **kwargs)
+
+
+def fetch_many(func, kwargs_list):
+    return get_engine().map(func, kwargs_list)
+
+
+def prefetch(*steps):
+    """依次执行预先下载的各个步骤，有股票下载失败（FetchFailed）时打印后继续下一步，返回是否全部成功；
+    失败的股票留到之后逐只查询时重新下载"""
+    ok = True
+    for step in steps:
+        try:
+            step()
+        except FetchFailed as e:
+            print(f"预先下载时{e}，处理时重新下载")
+            ok = False
+    return ok
+
+
+def total_requests():
+    """默认引擎到目前为止实际发出的请求总数（含重试）"""
+    return sum(stats['requests'] for stats in get_engine().summary().values())
+
+
+if __name__ == "__main__":
+    # 用本地假接口（带延迟和随机错误）对比原来的 sleep 循环和引擎的吞吐量
+    def fake_endpoint(symbol, latency=0.05, error_rate=0.05):
+        time.sleep(latency * random.uniform(0.5, 1.5))
+        if random.random() < error_rate:
+            raise ConnectionError('Connection aborted')
+        return symbol
+
+    symbols = [f"{i:06d}" for i in range(200)]
+
+    start = time.time()
+    done = 0
+    for symbol in symbols:
+        try:
+            fake_endpoint(symbol)
+            done += 1
+        except Exception:
+            pass
+        time.sleep(0.1)
+    elapsed = time.time() - start
+    print(f"sleep 循环: {done}/{len(symbols)} 成功, {done / elapsed:.1f} 次/秒")
+
+    engine = FetchEngine(rate_limits={'fake_endpoint': 50.0})
+    start = time.time()
+    results = engine.map(fake_endpoint, [{'symbol': s} for s in symbols])
+    elapsed = time.time() - start
+    done = sum(not isinstance(r, Exception) for r in results)
+    print(f"调度引擎: {done}/{len(symbols)} 成功, {done / elapsed:.1f} 次/秒")
+    print(engine.summary())
@@ -0,0 +1,153 @@
+# 同花顺财务摘要历史
+# stock_financial_abstract_ths 返回的数值都是 '1.23亿'、'-456.7万'、'12.5%'、'--' 这样的字符串。
+# 下载时对整列做向量化字符串解析，全部报告期一次转成 float64 列，按股票存成带类型的历史表，
+# 之后查询只做数组运算，不再逐个解析字符串；有新一期财报过了披露期限、本地还没有时重新下载（同 financial_index）。
+import os
+import json
+import threading
+from datetime import datetime
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+import fetch_engine
+from config import DATA_DIR
+from financial_index import estimate_announce_dates, stale_symbols, load_fetched_dates
+
+FIN_DIR = os.path.join(DATA_DIR, 'financial')
+ABSTRACT_FILE = os.path.join(FIN_DIR, 'abstract_ths.parquet')
+FETCHED_FILE = os.path.join(FIN_DIR, 'abstract_ths_symbols.json')
+
+# 数值后缀对应的倍数；百分比保留百分数本身（'12.5%' -> 12.5）
+UNIT_MULTIPLIERS = {'万亿': 1e12, '亿': 1e8, '万': 1e4, '%': 1.0, '': 1.0}
+_NUMBER_PATTERN = r'^([-+]?\d+(?:\.\d+)?)(万亿|亿|万|%)?$'
+# 表示缺失的写法
+MISSING_VALUES = ['--', '-', '', 'False', 'None', 'nan']
+# 为 True 时 update 不下载也不写文件（多进程共享时在工作进程中设置）
+READ_ONLY = False
+
+_lock = threading.RLock()
+_history = None
+_fetched = None     # {股票: 下载日期 YYYYMMDD}
+_latest = None      # {股票: 本地最新报告期}
+
+
+def parse_units(values):
+    """把一列带单位的字符串解析成 float64，解析不了的和缺失值为 NaN"""
+    text = pd.Series(values).astype(str).str.strip().str.replace(',', '', regex=False)
+    parts = text.str.extract(_NUMBER_PATTERN)
+    number = pd.to_numeric(parts[0], errors='coerce')
+    multiplier = parts[1].fillna('').map(UNIT_MULTIPLIERS)
+    return (number * multiplier).astype('float64')
+
+
+def parse_frame(df):
+    """解析一只股票的财务摘要：报告期转成日期，其余能解析成数字的列全部转成 float64"""
+    result = pd.DataFrame({'报告期': pd.to_datetime(df['报告期'], errors='coerce')})
+    for column in df.columns:
+        if column == '报告期':
+            continue
+        raw = df[column]
+        if pd.api.types.is_numeric_dtype(raw):
+            result[column] = raw.astype('float64')
+            continue
+        parsed = parse_units(raw)
+        text = raw.astype(str).str.strip()
+        # 除了缺失值之外都能解析成数字，才当作数值列
+        unparsed = parsed.isna() & ~text.isin(MISSING_VALUES) & raw.notna()
+        if not unparsed.any():
+            result[column] = parsed.values
+    return result.dropna(subset=['报告期'])
+
+
+def _load():
+    global _history, _fetched
+    if _history is None:
+        if os.path.exists(ABSTRACT_FILE):
+            _history = pd.read_parquet(ABSTRACT_FILE)
+        else:
+            _history = pd.DataFrame(columns=['股票代码', '报告期'])
+        _fetched = load_fetched_dates(FETCHED_FILE)
+
+
+def _save():
+    os.makedirs(FIN_DIR, exist_ok=True)
+    tmp = ABSTRACT_FILE + '.tmp'
+    _history.to_parquet(tmp, index=False)
+    os.replace(tmp, ABSTRACT_FILE)
+    tmp = FETCHED_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_fetched, f)
+    os.replace(tmp, FETCHED_FILE)
+
+
+def _latest_reports():
+    """每只股票本地最新的报告期"""
+    global _latest
+    if _latest is None:
+        _latest = pd.to_datetime(_history['报告期']).groupby(_history['股票代码'].values).max().to_dict()
+    return _latest
+
+
+def update(symbols, force=False):
+    """把还没有下载过的、以及有新一期财报到期的股票财务摘要补齐（force=True 时全部重新下载），返回请求数；
+    有股票下载失败时保存其余股票后抛出 fetch_engine.FetchFailed"""
+    global _history, _latest
+    today = datetime.now().strftime('%Y%m%d')
+    # 下载不占用锁（同 financial_index.update），其他线程的 as_of / history 不必等待
+    with _lock:
+        _load()
+        todo = list(symbols) if force else stale_symbols(symbols, _fetched, _latest_reports())
+    if not todo or READ_ONLY:
+        return 0
+
+    frames, fetched, failed = [], [], {}
+    results = fetch_engine.fetch_many(ak.stock_financial_abstract_ths, [
+        {'symbol': s, 'indicator': '按报告期'} for s in todo
+    ])
+    for symbol, df in zip(todo, results):
+        if isinstance(df, Exception):
+            print(f"获取股票{symbol}财务摘要失败: {df}")
+            failed[symbol] = df
+            continue
+        if df is not None and not df.empty:
+            df = parse_frame(df)
+            df.insert(0, '股票代码', symbol)
+            frames.append(df)
+        fetched.append(symbol)
+
+    with _lock:
+        if frames:
+            new = pd.concat(frames, ignore_index=True)
+            old = _history[~_history['股票代码'].isin(new['股票代码'].unique())]
+            _history = pd.concat([old, new], ignore_index=True) if not old.empty else new
+        _fetched.update(dict.fromkeys(fetched, today))
+        _save()
+        _latest = None
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return len(todo)
+
+
+def history(symbol):
+    """单只股票的全部报告期，按报告期从新到旧排列"""
+    update([symbol])
+    with _lock:
+        df = _history[_history['股票代码'] == symbol]
+    return df.sort_values('报告期', ascending=False).reset_index(drop=True)
+
+
+def as_of(date, symbols, fields):
+    """每只股票在 date 当天已经公告（按法定披露期限估算）的最新一期，返回以股票代码为索引、列为 fields 的 DataFrame"""
+    symbols = list(symbols)
+    update(symbols)
+    with _lock:
+        df = _history[_history['股票代码'].isin(symbols)]
+    df = df.reindex(columns=['股票代码', '报告期'] + list(fields))
+    if df.empty:
+        return pd.DataFrame(columns=list(fields), index=pd.Index([], name='股票代码'), dtype='float64')
+    announced = np.asarray(estimate_announce_dates(df['报告期']).values) <= np.datetime64(pd.to_datetime(date))
+    df = df[announced].sort_values(['股票代码', '报告期'])
+    latest = df.drop_duplicates('股票代码', keep='last').set_index('股票代码')
+    return latest[list(fields)].astype('float64')
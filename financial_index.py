@@ -0,0 +1,295 @@
+# 财务数据时点索引
+# 每只股票的财报历史下载后存到本地，之后只在新一期财报过了法定披露期限、本地还没有这一期时重新下载；
+# 要补的股票多时由 data_planner 改用全市场业绩报表（每个报告期一次调用），只补本地缺少的报告期；
+# 报告期和公告日期保存为排好序的 datetime64 数组，
+# 查询“某日已经公告的最新营收/净利润”时对全部股票做一次向量化 searchsorted，避免回测中的未来数据。
+# 财报里的营收和净利润是年初至报告期末的累计值，查询结果同时给出换算后的单季度值（*_q 列）。
+import os
+import json
+import threading
+from datetime import datetime
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+import data_planner
+import fetch_engine
+from config import DATA_DIR
+
+FIN_DIR = os.path.join(DATA_DIR, 'financial')
+REPORT_FILE = os.path.join(FIN_DIR, 'report_em.parquet')
+FETCHED_FILE = os.path.join(FIN_DIR, 'report_em_symbols.json')
+
+# 组合键中每只股票占用的天数跨度，足够容纳任何日期
+_SPAN = np.int64(1 << 20)
+# 为 True 时 update 不下载也不写文件，只读本地已有的财报历史（多进程共享时在工作进程中设置）
+READ_ONLY = False
+
+_lock = threading.RLock()
+_history = None
+_fetched = None     # {股票: 下载日期 YYYYMMDD}
+_latest = None      # {股票: 本地最新报告期}
+_index = None
+
+
+def estimate_announce_dates(report_dates):
+    """按法定披露期限估算公告日：一季报4月30日，半年报8月31日，三季报10月31日，年报次年4月30日"""
+    report_dates = pd.DatetimeIndex(pd.to_datetime(report_dates))
+    year = report_dates.year.values
+    month = report_dates.month.values
+    deadline_year = np.where(month == 12, year + 1, year)
+    deadline_month = np.select([month <= 3, month <= 6, month <= 9], [4, 8, 10], 4)
+    deadline_day = np.where(deadline_month == 4, 30, 31)
+    return pd.to_datetime(pd.DataFrame({'year': deadline_year, 'month': deadline_month, 'day': deadline_day}))
+
+
+def latest_due_period(today=None):
+    """按法定披露期限到 today 应该已经公告的最新报告期，返回 (报告期, 披露期限)"""
+    today = pd.Timestamp(today or datetime.now()).normalize()
+    periods = pd.DatetimeIndex([pd.Timestamp(year, month, 1) + pd.offsets.MonthEnd(0)
+                                for year in (today.year - 1, today.year) for month in (3, 6, 9, 12)])
+    deadlines = pd.DatetimeIndex(estimate_announce_dates(periods))
+    due = np.flatnonzero(deadlines < today)[-1]
+    return periods[due], deadlines[due]
+
+
+def stale_symbols(symbols, fetched, latest, today=None):
+    """需要（重新）下载财报历史的股票：没下载过的，以及最新一期已过披露期限、
+    本地还没有这一期且上次下载不晚于披露期限的。fetched 为 {股票: 下载日期}，latest 为 {股票: 本地最新报告期}"""
+    period, deadline = latest_due_period(today)
+    deadline = deadline.strftime('%Y%m%d')
+    return [s for s in symbols
+            if s not in fetched or (fetched[s] <= deadline and not latest.get(s, pd.NaT) >= period)]
+
+
+def load_fetched_dates(path):
+    """读取 {股票: 下载日期}，旧版本只记了下载过的股票列表，下载日期按未知处理"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        fetched = json.load(f)
+    return dict.fromkeys(fetched, '') if isinstance(fetched, list) else fetched
+
+
+def _latest_reports():
+    """每只股票本地最新的报告期"""
+    global _latest
+    if _latest is None:
+        _latest = pd.to_datetime(_history['报告日期']).groupby(_history['股票代码'].values).max().to_dict()
+    return _latest
+
+
+def _load():
+    global _history, _fetched
+    if _history is None:
+        if os.path.exists(REPORT_FILE):
+            _history = pd.read_parquet(REPORT_FILE)
+        else:
+            _history = pd.DataFrame(columns=['股票代码', '报告日期', '公告日期', 'revenue', 'net_profit'])
+        _fetched = load_fetched_dates(FETCHED_FILE)
+
+
+def _save():
+    os.makedirs(FIN_DIR, exist_ok=True)
+    tmp = REPORT_FILE + '.tmp'
+    _history.to_parquet(tmp, index=False)
+    os.replace(tmp, REPORT_FILE)
+    tmp = FETCHED_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_fetched, f)
+    os.replace(tmp, FETCHED_FILE)
+
+
+def _parse_history(symbol, df):
+    """整理一只股票的全部财报历史"""
+    if df is None or df.empty:
+        return None
+    report_dates = pd.to_datetime(df['日期'])
+    if '公告日期' in df.columns:
+        announce_dates = pd.to_datetime(df['公告日期'], errors='coerce')
+        announce_dates = announce_dates.fillna(pd.Series(estimate_announce_dates(report_dates), index=df.index))
+    else:
+        announce_dates = estimate_announce_dates(report_dates)
+    return pd.DataFrame({
+        '股票代码': symbol,
+        '报告日期': report_dates.values,
+        '公告日期': np.asarray(announce_dates, dtype='datetime64[ns]'),
+        'revenue': pd.to_numeric(df['营业收入'], errors='coerce').values,
+        'net_profit': pd.to_numeric(df['净利润'], errors='coerce').values,
+    })
+
+
+def _parse_bulk(df):
+    """把 data_planner 批量取到的业绩报表整理成与 _parse_history 相同的列，缺失的公告日期按披露期限估算"""
+    report_dates = pd.to_datetime(df['报告期'])
+    announce_dates = pd.Series(pd.to_datetime(df['公告日期']).values, index=df.index)
+    announce_dates = announce_dates.fillna(pd.Series(estimate_announce_dates(report_dates), index=df.index))
+    return pd.DataFrame({
+        '股票代码': df['股票代码'].values,
+        '报告日期': report_dates.values,
+        '公告日期': np.asarray(announce_dates, dtype='datetime64[ns]'),
+        'revenue': df['营业收入'].values,
+        'net_profit': df['净利润'].values,
+    })
+
+
+def _report_keys(history):
+    """(股票代码, 报告日期) 组合键"""
+    return pd.MultiIndex.from_arrays([history['股票代码'].astype(str),
+                                      pd.to_datetime(history['报告日期']).astype('datetime64[ns]')])
+
+
+def _single_quarter(history):
+    """给财报历史加上单季度值 revenue_q、net_profit_q：一季报就是单季度值，
+    其余报告期减去同一年上一季度的累计值，上一季度缺失时为 NaN"""
+    history = history.sort_values(['股票代码', '报告日期'])
+    codes = history['股票代码'].values
+    report = pd.DatetimeIndex(pd.to_datetime(history['报告日期']))
+    prev_report = pd.DatetimeIndex(pd.Series(report, index=history.index).groupby(codes).shift(1))
+    first_quarter = report.month == 3
+    contiguous = (prev_report.year == report.year) & (prev_report.month == report.month - 3)
+    quarters = {}
+    for column in ('revenue', 'net_profit'):
+        values = history[column].astype('float64')
+        prev = values.groupby(codes).shift(1).values
+        quarters[column + '_q'] = np.where(first_quarter, values.values,
+                                           np.where(contiguous, values.values - prev, np.nan))
+    return history.assign(**quarters)
+
+
+def update(symbols, force=False):
+    """把还没有下载过的、以及有新一期财报到期的股票财报历史补齐（force=True 时全部重新下载），返回接口调用次数
+
+    data_planner 按股票数和要补的报告期数选择接口：逐只股票下载全部历史，或按报告期批量下载全市场业绩报表
+    （本地没有历史的股票从 data_planner.HISTORY_START 补起）。有股票下载失败时保存其余数据后抛出 fetch_engine.FetchFailed。
+    """
+    global _history, _index, _latest
+    today = datetime.now().strftime('%Y%m%d')
+    # 只在判断要下载哪些股票和合并写入时持锁，下载不占用锁，其他线程的查询不必等待
+    with _lock:
+        _load()
+        latest = _latest_reports()
+        todo = list(symbols) if force else stale_symbols(symbols, _fetched, latest)
+    if not todo or READ_ONLY:
+        return 0
+
+    periods = data_planner.periods_to_fetch(latest, todo, latest_due_period()[0], force)
+    source = data_planner.plan(['营业收入', '净利润'], len(todo), len(periods))
+    if source.bulk:
+        df, failed = source.fetch(periods, todo)
+        new = None if df is None else _parse_bulk(df)
+        fetched = [s for s in todo if s not in failed]
+        requests = len(periods)
+    else:
+        frames, fetched, failed = [], [], {}
+        results = fetch_engine.fetch_many(ak.stock_financial_report_em, [{'symbol': s} for s in todo])
+        for symbol, df in zip(todo, results):
+            if isinstance(df, Exception):
+                print(f"获取股票{symbol}财务数据失败: {df}")
+                failed[symbol] = df
+                continue
+            df = _parse_history(symbol, df)
+            if df is not None:
+                frames.append(df)
+            fetched.append(symbol)
+        new = pd.concat(frames, ignore_index=True) if frames else None
+        requests = len(todo)
+
+    with _lock:
+        if new is not None:
+            if source.bulk:
+                # 批量下载的只有部分报告期，按 (股票, 报告期) 替换
+                stale = _report_keys(_history).isin(_report_keys(new))
+            else:
+                # 逐只下载的是完整历史，整只股票替换
+                stale = _history['股票代码'].isin(new['股票代码'].unique())
+            old = _history[~stale]
+            _history = pd.concat([old, new], ignore_index=True) if not old.empty else new
+        _fetched.update(dict.fromkeys(fetched, today))
+        _save()
+        _index = None
+        _latest = None
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return requests
+
+
+def _build_index():
+    """按 (股票, 日期) 排序并生成组合键，供 searchsorted 使用"""
+    global _index
+    if _index is not None:
+        return _index
+    history = _single_quarter(_history.dropna(subset=['报告日期']))
+    codes = np.asarray(sorted(history['股票代码'].unique()), dtype=object)
+    code_pos = pd.Series(np.arange(len(codes), dtype=np.int64), index=codes)
+    sym = code_pos.reindex(history['股票代码'].values).values
+    report = pd.to_datetime(history['报告日期']).values.astype('datetime64[D]')
+    announce = pd.to_datetime(history['公告日期']).values.astype('datetime64[D]')
+    _index = {'codes': code_pos}
+    for by, dates in (('report', report), ('announce', announce)):
+        # 公告日相同时报告期更晚的排在后面，查询时取最后一条
+        order = np.lexsort((report, dates, sym))
+        _index[by] = {
+            'keys': sym[order] * _SPAN + dates[order].astype(np.int64),
+            'sym': sym[order],
+            'report_dates': report[order],
+            'announce_dates': announce[order],
+            'revenue': history['revenue'].values[order],
+            'net_profit': history['net_profit'].values[order],
+            'revenue_q': history['revenue_q'].values[order],
+            'net_profit_q': history['net_profit_q'].values[order],
+        }
+    return _index
+
+
+def as_of(date, symbols, by='announce'):
+    """返回每只股票在 date 当天已知的最新营收和净利润
+
+    by='announce' 按公告日期判断（回测不含未来数据），by='report' 按报告期判断。
+    返回以股票代码为索引的 DataFrame，列为 report_date, revenue, net_profit, revenue_q, net_profit_q。
+    """
+    symbols = list(symbols)
+    update(symbols)
+    with _lock:
+        index = _build_index()
+    table = index[by]
+    sym = index['codes'].reindex(symbols).values
+    known = ~np.isnan(sym)
+    sym = np.where(known, sym, -1).astype(np.int64)
+    day = np.datetime64(pd.to_datetime(date).date(), 'D').astype(np.int64)
+    pos = np.searchsorted(table['keys'], sym * _SPAN + day, side='right') - 1
+    found = known & (pos >= 0)
+    found[found] = table['sym'][pos[found]] == sym[found]
+    hit = pos[found]
+    return pd.DataFrame({
+        'report_date': table['report_dates'][hit].astype('datetime64[ns]'),
+        'revenue': table['revenue'][hit],
+        'net_profit': table['net_profit'][hit],
+        'revenue_q': table['revenue_q'][hit],
+        'net_profit_q': table['net_profit_q'][hit],
+    }, index=pd.Index(np.asarray(symbols, dtype=object)[found], name='股票代码'))
+
+
+def reports(symbols, report_dates, announced_by=None):
+    """每只股票指定报告期的财报，announced_by 不为 None 时只取当天已经公告的（回测不含未来数据）
+
+    返回列为 股票代码, report_date, revenue, net_profit, revenue_q, net_profit_q 的 DataFrame，
+    按股票代码和报告期排序，没有的报告期不出现在结果中。
+    """
+    symbols = list(symbols)
+    update(symbols)
+    with _lock:
+        history = _history[_history['股票代码'].isin(symbols)].dropna(subset=['报告日期'])
+    history = _single_quarter(history)
+    history = history[pd.to_datetime(history['报告日期']).isin(pd.to_datetime(report_dates))]
+    if announced_by is not None:
+        history = history[pd.to_datetime(history['公告日期']) <= pd.to_datetime(announced_by)]
+    return pd.DataFrame({
+        '股票代码': history['股票代码'].values,
+        'report_date': pd.to_datetime(history['报告日期']).values,
+        'revenue': history['revenue'].values,
+        'net_profit': history['net_profit'].values,
+        'revenue_q': history['revenue_q'].values,
+        'net_profit_q': history['net_profit_q'].values,
+    })
@@ -0,0 +1,431 @@
+# 股东数据本地库
+# 十大股东只在季度报告期末（0331/0630/0930/1231）才有数据，只对这些日期请求接口，
+# 结果按 (股票, 报告期) 缓存到本地，按日期查询时对已缓存的报告期做二分查找。
+# 股东持股变动（stock_holder_change）每只股票的全部历史只下载一次存成本地表，
+# 所有交易日的时点持股比例用一次 merge_asof 算出（交易日×股票 面板），逐日筛选只是查表。
+# 股东户数和总股本按报告期存成本地表，由 data_planner 选择逐只股票接口或全市场批量接口补齐。
+import os
+import json
+import atexit
+import bisect
+import threading
+from datetime import datetime
+
+import akshare as ak
+import pandas as pd
+
+import data_planner
+import fetch_engine
+import trade_calendar
+from config import DATA_DIR
+from financial_index import estimate_announce_dates, latest_due_period, load_fetched_dates, stale_symbols
+from symbol_master import format_symbol
+
+HOLDER_DIR = os.path.join(DATA_DIR, 'holders')
+TOP10_FILE = os.path.join(HOLDER_DIR, 'top10_first_ratio.json')
+CHANGE_FILE = os.path.join(HOLDER_DIR, 'holder_change.parquet')
+CHANGE_FETCHED_FILE = os.path.join(HOLDER_DIR, 'holder_change_symbols.json')
+COUNT_FILE = os.path.join(HOLDER_DIR, 'holder_count.parquet')
+COUNT_FETCHED_FILE = os.path.join(HOLDER_DIR, 'holder_count_symbols.json')
+
+# 每新增这么多条缓存（或下载这么多只股票的持股变动历史）就落盘一次
+SAVE_EVERY = 50
+# 为 True 时 update_changes / update_counts 不下载也不写文件，只读本地已有的历史（多进程共享时在工作进程中设置）
+READ_ONLY = False
+
+_lock = threading.RLock()
+_top10 = None       # {股票: {报告期: 第一大股东持股比例 或 None}}
+_periods = {}       # {股票: 已缓存报告期的有序列表}
+_unsaved = 0
+_changes = None         # 持股变动历史：股票代码, 变动日期, 持股比例
+_changes_fetched = None  # {股票: 下载日期 YYYYMMDD}
+_changes_unsaved = 0     # 上次落盘之后新下载的股票数
+_change_panel = None
+_change_panel_symbols = set()
+_counts = None          # 股东户数历史：股票代码, 报告期, 公告日期, 总股本, 股东户数
+_counts_fetched = None  # {股票: 下载日期 YYYYMMDD}
+
+
+def report_periods(start_date, end_date):
+    """[start_date, end_date] 内的季度报告期末，按时间从后往前排列"""
+    return data_planner.quarter_ends(start_date, end_date)[::-1]
+
+
+def _load():
+    global _top10
+    if _top10 is None:
+        if os.path.exists(TOP10_FILE):
+            with open(TOP10_FILE, 'r', encoding='utf-8') as f:
+                _top10 = json.load(f)
+        else:
+            _top10 = {}
+        for symbol, ratios in _top10.items():
+            _periods[symbol] = sorted(ratios)
+    return _top10
+
+
+def save():
+    """把缓存写回磁盘"""
+    global _unsaved
+    with _lock:
+        if _top10 is None or not _unsaved:
+            return
+        os.makedirs(HOLDER_DIR, exist_ok=True)
+        tmp = TOP10_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_top10, f)
+        os.replace(tmp, TOP10_FILE)
+        _unsaved = 0
+
+
+atexit.register(save)
+
+
+def _store(symbol, period, ratio):
+    global _unsaved
+    ratios = _top10.setdefault(symbol, {})
+    if period not in ratios:
+        bisect.insort(_periods.setdefault(symbol, []), period)
+    ratios[period] = ratio
+    _unsaved += 1
+    if _unsaved >= SAVE_EVERY:
+        save()
+
+
+def _fetch_first_ratio(symbol, period):
+    """请求一个报告期的十大股东，返回第一大股东持股比例；该期没有数据时返回 None
+
+    网络错误和限流（重试之后仍然失败）照常抛出，不能当成“没有数据”缓存下来。
+    """
+    try:
+        holders = fetch_engine.call(ak.stock_gdfx_top_10_em, symbol=symbol, date=period)
+    except Exception as e:
+        if fetch_engine.is_retryable(e):
+            raise
+        # 该期没有数据时 akshare 解析空响应抛出的 KeyError/TypeError 等
+        return None
+    if holders is None or holders.empty or '占总股本持股比例' not in holders.columns:
+        return None
+    return float(holders.iloc[0]['占总股本持股比例'])
+
+
+def _is_settled(period):
+    """报告期的法定披露期限已过，没有数据就是真的没有，可以缓存空结果"""
+    deadline = estimate_announce_dates([period])[0]
+    return pd.Timestamp.now().normalize() > deadline
+
+
+def first_holder_ratio(stock_code, target_date, max_lookback_days=100):
+    """第一大股东持股比例：取 target_date 往前 max_lookback_days 天内最近一个有数据的报告期，下载出错时抛出异常"""
+    symbol = format_symbol(stock_code)
+    if symbol is None:
+        print(f"无效的股票代码: {stock_code}")
+        return None
+
+    target = pd.to_datetime(target_date)
+    earliest = (target - pd.Timedelta(days=max_lookback_days - 1)).strftime('%Y%m%d')
+    with _lock:
+        ratios = _load().get(symbol, {})
+        # 已缓存的报告期中，二分查找 target_date 之前最近的一个
+        cached = _periods.get(symbol, [])
+        i = bisect.bisect_right(cached, target.strftime('%Y%m%d'))
+        while i > 0 and cached[i - 1] >= earliest:
+            i -= 1
+            if ratios[cached[i]] is not None:
+                latest_cached = cached[i]
+                break
+        else:
+            latest_cached = None
+
+    for period in report_periods(earliest, target):
+        if latest_cached is not None and period <= latest_cached:
+            return ratios[latest_cached]
+        if period in ratios:
+            continue
+        ratio = _fetch_first_ratio(symbol, period)
+        with _lock:
+            if ratio is not None or _is_settled(period):
+                _store(symbol, period, ratio)
+        if ratio is not None:
+            return ratio
+    if latest_cached is not None:
+        return ratios[latest_cached]
+
+    print(f"未能找到股票{symbol}的股东数据")
+    return None
+
+
+def _load_changes():
+    global _changes, _changes_fetched
+    if _changes is None:
+        if os.path.exists(CHANGE_FILE):
+            _changes = pd.read_parquet(CHANGE_FILE)
+        else:
+            _changes = pd.DataFrame({'股票代码': pd.Series(dtype=object),
+                                     '变动日期': pd.Series(dtype='datetime64[ns]'),
+                                     '持股比例': pd.Series(dtype=float)})
+        if os.path.exists(CHANGE_FETCHED_FILE):
+            with open(CHANGE_FETCHED_FILE, 'r', encoding='utf-8') as f:
+                _changes_fetched = json.load(f)
+        else:
+            _changes_fetched = {}
+
+
+def _save_changes():
+    global _changes_unsaved
+    os.makedirs(HOLDER_DIR, exist_ok=True)
+    tmp = CHANGE_FILE + '.tmp'
+    _changes.to_parquet(tmp, index=False)
+    os.replace(tmp, CHANGE_FILE)
+    tmp = CHANGE_FETCHED_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_changes_fetched, f)
+    os.replace(tmp, CHANGE_FETCHED_FILE)
+    _changes_unsaved = 0
+
+
+def save_changes():
+    """把还没落盘的持股变动历史写回磁盘"""
+    with _lock:
+        if _changes is not None and _changes_unsaved:
+            _save_changes()
+
+
+atexit.register(save_changes)
+
+
+def _parse_changes(symbol, df):
+    """整理一只股票的持股变动历史：持股比例 '35.2%' -> 35.2，保留接口返回的先后顺序"""
+    if df is None or df.empty:
+        return None
+    ratio = df['持股比例'].astype(str).str.replace('%', '', regex=False).str.strip()
+    return pd.DataFrame({
+        '股票代码': symbol,
+        '变动日期': pd.to_datetime(df['变动日期'], errors='coerce').values,
+        '持股比例': pd.to_numeric(ratio, errors='coerce').values,
+    }).dropna(subset=['变动日期'])
+
+
+def update_changes(symbols, end_date=None, force=False):
+    """补齐持股变动历史：没下载过、或下载日期早于 end_date 的股票重新下载，返回请求数
+
+    下载不占用锁，多个线程逐只查询时不会互相等待；每下载 SAVE_EVERY 只股票落盘一次（退出时写入剩余的），
+    逐只查询时不会每只股票都把整张表重写一遍。有股票下载失败时合并其余股票后抛出 fetch_engine.FetchFailed。
+    """
+    global _changes, _changes_unsaved
+    needed = pd.to_datetime(end_date or datetime.now()).strftime('%Y%m%d')
+    today = datetime.now().strftime('%Y%m%d')
+    with _lock:
+        _load_changes()
+        todo = [s for s in dict.fromkeys(symbols) if force or _changes_fetched.get(s, '') < min(needed, today)]
+    if not todo or READ_ONLY:
+        return 0
+
+    frames, fetched, failed = [], [], {}
+    results = fetch_engine.fetch_many(ak.stock_holder_change, [dict(symbol=s) for s in todo])
+    for symbol, df in zip(todo, results):
+        if isinstance(df, Exception):
+            print(f"获取股票{symbol}股东持股变动失败: {df}")
+            failed[symbol] = df
+            continue
+        df = _parse_changes(symbol, df)
+        if df is not None:
+            frames.append(df)
+        fetched.append(symbol)
+
+    if fetched:
+        with _lock:
+            if frames:
+                new = pd.concat(frames, ignore_index=True)
+                old = _changes[~_changes['股票代码'].isin(new['股票代码'].unique())]
+                _changes = pd.concat([old, new], ignore_index=True) if not old.empty else new
+            _changes_fetched.update(dict.fromkeys(fetched, today))
+            _changes_unsaved += len(fetched)
+            if _changes_unsaved >= SAVE_EVERY:
+                _save_changes()
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return len(todo)
+
+
+def mark_changes_fetched(symbols, date, since):
+    """批量接口确认 (since, date] 内没有新的持股变动的股票，把历史已经下载到 since 的记为在 date 下载，
+    返回记录的股票数；下载日期早于 since 的中间有缺口，保持不变，下次查询时重新下载"""
+    day = pd.to_datetime(date).strftime('%Y%m%d')
+    prev = pd.to_datetime(since).strftime('%Y%m%d')
+    if READ_ONLY:
+        return 0
+    with _lock:
+        _load_changes()
+        known = [s for s in symbols if _changes_fetched.get(s, '') >= prev]
+        for symbol in known:
+            _changes_fetched[symbol] = max(_changes_fetched[symbol], day)
+        if known:
+            _save_changes()
+    return len(known)
+
+
+def change_panel(dates, symbols):
+    """交易日×股票 的大股东持股比例矩阵：每个交易日取当天及之前最近一次变动的持股比例
+
+    同一天有多条变动时取接口返回顺序中的第一条，与逐只股票取 iloc[0] 一致。
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates)).unique().sort_values()
+    symbols = list(symbols)
+    with _lock:
+        _load_changes()
+        history = _changes[_changes['股票代码'].isin(symbols)]
+    if history.empty or dates.empty:
+        return pd.DataFrame(index=dates, columns=symbols, dtype=float)
+    history = history.drop_duplicates(['股票代码', '变动日期'], keep='first').sort_values('变动日期')
+    history = history.astype({'变动日期': 'datetime64[ns]'})
+    grid = pd.MultiIndex.from_product([dates, symbols], names=['日期', '股票代码']).to_frame(index=False)
+    grid = grid.astype({'日期': 'datetime64[ns]'})
+    merged = pd.merge_asof(grid, history, left_on='日期', right_on='变动日期', by='股票代码',
+                           direction='backward')
+    return merged.pivot(index='日期', columns='股票代码', values='持股比例').reindex(index=dates, columns=symbols)
+
+
+def load_change_panel(start_date, end_date, symbols):
+    """预先下载并算好一段区间所有交易日的持股比例矩阵，之后 change_ratio_on() 在区间内直接查表
+
+    下载完立即落盘：之后启动的只读工作进程从文件读取持股变动历史，不能等到攒够 SAVE_EVERY 只或进程退出。
+    """
+    global _change_panel, _change_panel_symbols
+    symbols = list(symbols)
+    try:
+        update_changes(symbols, end_date)
+    finally:
+        save_changes()
+    result = change_panel(trade_calendar.trading_range(start_date, end_date), symbols)
+    with _lock:
+        _change_panel, _change_panel_symbols = result, set(symbols)
+    return result
+
+
+def change_ratio_on(date, symbols):
+    """一批股票在 date 当天的大股东持股比例，返回以股票代码为索引的 Series，没有变动记录的为 NaN"""
+    day = pd.Timestamp(pd.to_datetime(date).date())
+    symbols = list(symbols)
+    with _lock:
+        cached, cached_symbols = _change_panel, _change_panel_symbols
+    if cached is not None and day in cached.index and cached_symbols.issuperset(symbols):
+        values = cached.loc[day]
+    else:
+        update_changes(symbols, day)
+        values = change_panel([day], symbols).iloc[0]
+    return values.reindex(symbols).rename('持股比例')
+
+
+def _load_counts():
+    global _counts, _counts_fetched
+    if _counts is None:
+        if os.path.exists(COUNT_FILE):
+            _counts = pd.read_parquet(COUNT_FILE)
+        else:
+            _counts = pd.DataFrame({'股票代码': pd.Series(dtype=object),
+                                    '报告期': pd.Series(dtype='datetime64[ns]'),
+                                    '公告日期': pd.Series(dtype='datetime64[ns]'),
+                                    '总股本': pd.Series(dtype=float),
+                                    '股东户数': pd.Series(dtype=float)})
+        _counts_fetched = load_fetched_dates(COUNT_FETCHED_FILE)
+
+
+def _save_counts():
+    os.makedirs(HOLDER_DIR, exist_ok=True)
+    tmp = COUNT_FILE + '.tmp'
+    _counts.to_parquet(tmp, index=False)
+    os.replace(tmp, COUNT_FILE)
+    tmp = COUNT_FETCHED_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_counts_fetched, f)
+    os.replace(tmp, COUNT_FETCHED_FILE)
+
+
+def _parse_counts(symbol, df):
+    """整理一只股票的股东户数历史（stock_zh_a_gdhs_detail_em），报告期为股东户数统计截止日"""
+    if df is None or df.empty:
+        return None
+    return pd.DataFrame({
+        '股票代码': symbol,
+        '报告期': pd.to_datetime(df['股东户数统计截止日'], errors='coerce').values,
+        '公告日期': pd.to_datetime(df['股东户数公告日期'], errors='coerce').values,
+        '总股本': pd.to_numeric(df['总股本'], errors='coerce').values,
+        '股东户数': pd.to_numeric(df['股东户数-本次'], errors='coerce').values,
+    }).dropna(subset=['报告期'])
+
+
+def _count_keys(counts):
+    """(股票代码, 报告期) 组合键"""
+    return pd.MultiIndex.from_arrays([counts['股票代码'].astype(str),
+                                      pd.to_datetime(counts['报告期']).astype('datetime64[ns]')])
+
+
+def update_counts(symbols, force=False):
+    """补齐股东户数和总股本历史，哪些股票需要下载的规则同 financial_index.update，返回接口调用次数
+
+    data_planner 按股票数和要补的报告期数选择逐只股票下载全部历史（stock_zh_a_gdhs_detail_em），
+    或按报告期批量下载全市场（stock_zh_a_gdhs）。有股票下载失败时保存其余数据后抛出 fetch_engine.FetchFailed。
+    """
+    global _counts
+    today = datetime.now().strftime('%Y%m%d')
+    with _lock:
+        _load_counts()
+        latest = pd.to_datetime(_counts['报告期']).groupby(_counts['股票代码'].values).max().to_dict()
+        symbols = list(dict.fromkeys(symbols))
+        todo = symbols if force else stale_symbols(symbols, _counts_fetched, latest)
+    if not todo or READ_ONLY:
+        return 0
+
+    periods = data_planner.periods_to_fetch(latest, todo, latest_due_period()[0], force)
+    source = data_planner.plan(['总股本', '股东户数'], len(todo), len(periods))
+    if source.bulk:
+        new, failed = source.fetch(periods, todo)
+        fetched = [s for s in todo if s not in failed]
+        requests = len(periods)
+    else:
+        frames, fetched, failed = [], [], {}
+        results = fetch_engine.fetch_many(ak.stock_zh_a_gdhs_detail_em, [dict(symbol=s) for s in todo])
+        for symbol, df in zip(todo, results):
+            if isinstance(df, Exception):
+                print(f"获取股票{symbol}股东户数失败: {df}")
+                failed[symbol] = df
+                continue
+            df = _parse_counts(symbol, df)
+            if df is not None:
+                frames.append(df)
+            fetched.append(symbol)
+        new = pd.concat(frames, ignore_index=True) if frames else None
+        requests = len(todo)
+
+    with _lock:
+        if new is not None:
+            if source.bulk:
+                # 批量下载的只有部分报告期，按 (股票, 报告期) 替换
+                stale = _count_keys(_counts).isin(_count_keys(new))
+            else:
+                # 逐只下载的是完整历史，整只股票替换
+                stale = _counts['股票代码'].isin(new['股票代码'].unique())
+            old = _counts[~stale]
+            _counts = pd.concat([old, new], ignore_index=True) if not old.empty else new
+        _counts_fetched.update(dict.fromkeys(fetched, today))
+        _save_counts()
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return requests
+
+
+def holder_counts(date, symbols):
+    """一批股票在 date 当天已经公告的最新一期股东户数和总股本（回测不含未来数据）
+
+    返回以股票代码为索引、列为 报告期, 总股本, 股东户数 的 DataFrame，没有数据的股票不出现在结果中。
+    """
+    symbols = list(symbols)
+    update_counts(symbols)
+    day = pd.Timestamp(pd.to_datetime(date).date())
+    with _lock:
+        history = _counts[_counts['股票代码'].isin(symbols)]
+    history = history[pd.to_datetime(history['公告日期']) <= day]
+    latest = history.sort_values(['报告期', '公告日期']).drop_duplicates('股票代码', keep='last')
+    latest = latest.set_index('股票代码')[['报告期', '总股本', '股东户数']]
+    return latest.reindex([s for s in symbols if s in latest.index])
@@ -0,0 +1,129 @@
+# 常用技术指标
+# 输入为单只证券的一维序列，或 交易日×证券 的矩阵（最后一行为最近一天），用闭式 NumPy 公式对整批证券一次算出：
+#   rolling_slope  滚动最小二乘斜率（slope 只取最后一天）
+#   ma             移动平均
+#   amplitude      最近 window 天的 最高/最低 - 1
+#   streaks        末尾连续满足条件的天数
+# 策略里用 daily() 取截至上一交易日的日线指标，结果按 (证券, 窗口, 交易日) 缓存，
+# 日线指标一天只变一次，盘中每分钟调用也只在当天第一次取数计算。
+# 在聚宽上使用时把本文件放到研究环境根目录，策略里 import indicators。
+import warnings
+
+import numpy as np
+import pandas as pd
+
+_cache = {}
+_cache_day = None
+
+
+def _rolling_sum(values, window):
+    """沿第0维的滚动和，前 window-1 行和窗口内有 NaN 的位置为 NaN（与 pandas 的 rolling(window).sum() 相同）
+    NaN 按0累加，另外累计 NaN 的个数，窗口移过 NaN 之后又恢复成有效值"""
+    missing = np.isnan(values)
+    csum = np.cumsum(np.where(missing, 0.0, values), axis=0)
+    ccount = np.cumsum(missing, axis=0)
+    result = np.full(values.shape, np.nan)
+    result[window - 1:] = csum[window - 1:]
+    result[window:] -= csum[:-window]
+    gaps = np.zeros(values.shape, dtype=np.int64)
+    gaps[window - 1:] = ccount[window - 1:]
+    gaps[window:] -= ccount[:-window]
+    result[gaps > 0] = np.nan
+    return result
+
+
+def _column_means(values):
+    """每列的均值（全为 NaN 的列为 0），累加前先减去，避免价格较大时累加和相减损失精度"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(values, axis=0)
+    return np.nan_to_num(means)
+
+
+def rolling_slope(values, window):
+    # type: (np.ndarray, int) -> np.ndarray
+    """每一天以前 window 天（含当天）对 0,1,...,window-1 的最小二乘斜率：
+    slope = (n·Σxy - Σx·Σy) / (n·Σx² - (Σx)²)，窗口内的 Σxy 由全局序号的 Σ(i·y) 减去窗口起点乘 Σy 得到"""
+    values = np.asarray(values, dtype=np.float64)
+    values = values - _column_means(values)
+    n = window
+    index = np.arange(len(values), dtype=np.float64).reshape((-1,) + (1,) * (values.ndim - 1))
+    sum_y = _rolling_sum(values, n)
+    sum_iy = _rolling_sum(index * values, n)
+    start = index - (n - 1)
+    sum_xy = sum_iy - start * sum_y
+    sum_x = n * (n - 1) / 2.0
+    sum_xx = (n - 1) * n * (2 * n - 1) / 6.0
+    denominator = n * sum_xx - sum_x ** 2
+    if denominator == 0:
+        return np.full(values.shape, np.nan)
+    return (n * sum_xy - sum_x * sum_y) / denominator
+
+
+def slope(values, window=None):
+    """最近 window 天（默认全部）的最小二乘斜率，一维输入返回一个数，矩阵返回每列一个"""
+    values = np.asarray(values, dtype=np.float64)
+    window = window or len(values)
+    if len(values) < window:
+        return np.nan if values.ndim == 1 else np.full(values.shape[1:], np.nan)
+    return rolling_slope(values[-window:], window)[-1]
+
+
+def ma(values, window):
+    # type: (np.ndarray, int) -> np.ndarray
+    """移动平均，前 window-1 天和窗口内有 NaN 的位置为 NaN（与 pandas 的 rolling(window).mean() 相同）"""
+    values = np.asarray(values, dtype=np.float64)
+    means = _column_means(values)
+    return _rolling_sum(values - means, window) / window + means
+
+
+def amplitude(values, window=None):
+    """最近 window 天（默认全部）的 最高/最低 - 1，NaN 不参与计算"""
+    values = np.asarray(values, dtype=np.float64)
+    if window:
+        values = values[-window:]
+    missing = np.isnan(values)
+    high = np.where(missing, -np.inf, values).max(axis=0)
+    low = np.where(missing, np.inf, values).min(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(np.isinf(high), np.nan, high / low - 1)
+
+
+def streaks(mask):
+    """mask 为布尔序列或 交易日×证券 的布尔矩阵，返回截至最后一天连续为 True 的天数：
+    从最后一天往前累乘，第一次为 False 之后全为0，求和即为连续天数"""
+    mask = np.asarray(mask, dtype=bool)
+    return np.cumprod(mask[::-1], axis=0).sum(axis=0)
+
+
+# daily() 支持的指标：名称 -> 用 window 天收盘价算出最后一天取值的函数
+DAILY_INDICATORS = {
+    'slope': lambda closes, window: slope(closes, window),
+    'ma': lambda closes, window: ma(closes, window)[-1],
+    'amplitude': lambda closes, window: amplitude(closes, window),
+}
+
+
+def daily(kind, securities, window, context):
+    """securities 截至上一交易日、最近 window 天收盘价（前复权，不跳过停牌）的日线指标，
+    kind 为 DAILY_INDICATORS 中的名称；传入一只证券返回一个数，传入列表返回以证券为索引的 Series。
+    结果按 (指标, 证券, 窗口) 缓存到当天结束，只对还没算过的证券取一次数"""
+    global _cache_day
+    # 聚宽在策略导入的模块里通过 kuanke.user_space_api 使用 API，每次调用时再导入以使用当前回测的接口
+    from kuanke.user_space_api import get_price
+
+    day = context.previous_date
+    if day != _cache_day:
+        _cache.clear()
+        _cache_day = day
+    single = isinstance(securities, str)
+    codes = [securities] if single else list(securities)
+    missing = [code for code in codes if (kind, code, window) not in _cache]
+    if missing:
+        df = get_price(missing, end_date=day, frequency='daily', fields=['close'], count=window,
+                       skip_paused=False, fq='pre', panel=False)
+        closes = df.pivot(index='time', columns='code', values='close').reindex(columns=missing).values
+        values = DAILY_INDICATORS[kind](closes, window)
+        _cache.update(((kind, code, window), value) for code, value in zip(missing, values))
+    result = pd.Series([_cache[(kind, code, window)] for code in codes], index=codes)
+    return result.iloc[0] if single else result
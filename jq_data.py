@@ -0,0 +1,502 @@
+# 聚宽接口的本地数据
+# 把本地行情库、股票基础信息表、股本和财报索引整理成聚宽风格的数据：
+# 证券代码写成 '600000.XSHG'，日线存成 交易日×证券 的 float64 矩阵（DailyPanel），
+# 涨跌停价、停牌、前收盘价由矩阵向量化算出；get_fundamentals 用的 query 表达式在本地表上求值。
+# 财务数据只有 valuation（市值）和 income（利润表，单季度值）两张表，聚宽的 finance 库本地没有数据源。
+# 行情是不复权的真实价格（相当于 use_real_price），分红送转不做处理。
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import financial_index
+import market_cap
+import symbol_master
+import trade_calendar
+from ak_cache import ak
+
+EXCHANGE_SUFFIX = {'sh': 'XSHG', 'sz': 'XSHE', 'bj': 'BJSE'}
+SUFFIX_EXCHANGE = {suffix: exchange for exchange, suffix in EXCHANGE_SUFFIX.items()}
+
+# 本地日线的列名 -> 聚宽字段名
+BAR_COLUMNS = {'开盘': 'open', '收盘': 'close', '最高': 'high', '最低': 'low',
+               '成交量': 'volume', '成交额': 'money', '换手率': 'turnover'}
+BASE_FIELDS = list(BAR_COLUMNS.values())
+DERIVED_FIELDS = ['avg', 'pre_close', 'high_limit', 'low_limit', 'paused']
+PRICE_FIELDS = ['open', 'close', 'high', 'low', 'avg', 'pre_close', 'high_limit', 'low_limit']
+DEFAULT_FIELDS = ['open', 'close', 'high', 'low', 'volume', 'money']
+
+# 创业板涨跌幅限制从 10% 改为 20% 的日期
+CHINEXT_REFORM_DATE = pd.Timestamp('2020-08-24')
+# 上市日期未知时使用的日期
+UNKNOWN_START_DATE = date(1990, 12, 19)
+
+_securities = None
+
+# 聚宽一级行业（HY001~HY011）由申万行业代码的前两位映射而来（2014 版和 2021 版申万一级行业）
+SW_TO_JQ_L1 = {
+    '21': 'HY001', '74': 'HY001', '75': 'HY001',
+    '22': 'HY002', '23': 'HY002', '24': 'HY002', '61': 'HY002',
+    '42': 'HY003', '51': 'HY003', '62': 'HY003', '63': 'HY003', '64': 'HY003', '65': 'HY003', '76': 'HY003',
+    '28': 'HY004', '33': 'HY004', '35': 'HY004', '36': 'HY004', '45': 'HY004', '46': 'HY004', '72': 'HY004',
+    '11': 'HY005', '34': 'HY005', '77': 'HY005',
+    '37': 'HY006',
+    '48': 'HY007', '49': 'HY007',
+    '27': 'HY008', '71': 'HY008',
+    '73': 'HY009',
+    '41': 'HY010',
+    '43': 'HY011',
+}
+
+
+def to_jq(code):
+    """'600000' -> '600000.XSHG'"""
+    return f"{code}.{EXCHANGE_SUFFIX[symbol_master.exchange_of(code)]}"
+
+
+def from_jq(security):
+    """'600000.XSHG' -> '600000'"""
+    return security.split('.')[0]
+
+
+def security_type(security):
+    """按代码判断证券类型：stock、index 或 etf"""
+    code, _, suffix = security.partition('.')
+    if (suffix == 'XSHG' and code.startswith('000')) or (suffix == 'XSHE' and code.startswith('399')):
+        return 'index'
+    if (suffix == 'XSHG' and code.startswith('5')) or (suffix == 'XSHE' and code.startswith('1')):
+        return 'etf'
+    return 'stock'
+
+
+def round_price(values):
+    """按四舍五入保留两位小数（交易所计算涨跌停价的规则）"""
+    return np.floor(np.asarray(values, dtype=np.float64) * 100 + 0.5 + 1e-6) / 100
+
+
+def securities(on_date=None):
+    """全部A股，返回聚宽 get_all_securities 格式的 DataFrame；指定 on_date 时只保留当时已经上市的"""
+    global _securities
+    if _securities is None:
+        _securities = _build_securities()
+    if on_date is None:
+        return _securities.copy()
+    return _securities[_securities['start_date'] <= pd.to_datetime(on_date)]
+
+
+def _build_securities():
+    table = symbol_master.load()
+    start = pd.to_datetime(table['list_date'])
+    df = pd.DataFrame({
+        'display_name': table['name'].values,
+        'name': table['name'].values,
+        'start_date': start.fillna(pd.Timestamp(UNKNOWN_START_DATE)).values,
+        'end_date': pd.Timestamp('2200-01-01'),
+        'type': 'stock',
+    }, index=pd.Index([to_jq(c) for c in table['code']]))
+    return df[df.index.str.endswith(tuple(EXCHANGE_SUFFIX.values()))]
+
+
+def _extra_bars(security):
+    """指数和 ETF 的全部日线，列为聚宽字段名，以日期为索引"""
+    code = from_jq(security)
+    if security_type(security) == 'index':
+        prefix = 'sh' if security.endswith('XSHG') else 'sz'
+        df = ak.stock_zh_index_daily(symbol=prefix + code)
+        df = df.rename(columns={'date': 'time'})
+        df['money'] = np.nan
+    else:
+        df = ak.fund_etf_hist_em(symbol=code, period='daily', start_date='19700101', end_date='20500101', adjust='')
+        df = df.rename(columns={'日期': 'time', **BAR_COLUMNS})
+        df['volume'] = pd.to_numeric(df['volume'], errors='coerce') * 100
+    df['time'] = pd.to_datetime(df['time'])
+    return df.set_index('time').reindex(columns=BASE_FIELDS).apply(pd.to_numeric, errors='coerce')
+
+
+class DailyPanel:
+    """一段区间内一批证券的日线矩阵（交易日×证券），行按交易日、列按证券
+
+    涨跌停价、前收盘价、均价、停牌这些派生字段在取数时按行切片向量化计算，不额外占用整张矩阵。
+    """
+
+    def __init__(self, days, securities_list):
+        self.days = pd.DatetimeIndex(days)
+        self.securities = list(securities_list)
+        self.columns = {s: i for i, s in enumerate(self.securities)}
+        shape = (len(self.days), len(self.securities))
+        self.arrays = {field: np.full(shape, np.nan) for field in BASE_FIELDS}
+        self._names = [''] * len(self.securities)
+        self._close_ffill = None
+
+    @classmethod
+    def load(cls, start_date, end_date, securities_list, sync=True):
+        """从本地行情库读出 [start_date, end_date] 内的全部股票日线；sync=True 时先增量同步缺失的部分"""
+        days = trade_calendar.trading_range(start_date, end_date)
+        panel = cls(days, securities_list)
+        codes = [from_jq(s) for s in panel.securities]
+        if sync and len(days):
+            bar_store.sync(codes, days[0], days[-1])
+        column_of = pd.Series(np.arange(len(codes)), index=codes)
+        for row, day in enumerate(days):
+            df = bar_store.read_date(day)
+            if df.empty:
+                continue
+            cols = column_of.reindex(df['股票代码'].astype(str).values).values
+            found = ~np.isnan(cols)
+            cols = cols[found].astype(np.int64)
+            for column, field in BAR_COLUMNS.items():
+                if column in df.columns:
+                    panel.arrays[field][row, cols] = pd.to_numeric(df[column], errors='coerce').values[found]
+        # 本地行情的成交量单位是手，聚宽是股
+        panel.arrays['volume'] *= 100
+        names = symbol_master.load().set_index('code')['name']
+        panel._names = [str(n) for n in names.reindex(codes).fillna('').values]
+        return panel
+
+    def add(self, security):
+        """把一个指数或 ETF 加到矩阵最后一列，返回列号"""
+        if security in self.columns:
+            return self.columns[security]
+        bars = _extra_bars(security).reindex(self.days)
+        for field in BASE_FIELDS:
+            self.arrays[field] = np.column_stack([self.arrays[field], bars[field].values.astype(np.float64)])
+        self.columns[security] = len(self.securities)
+        self.securities.append(security)
+        self._names.append('')
+        self._close_ffill = None
+        return self.columns[security]
+
+    def column(self, security):
+        """证券所在的列号，指数和 ETF 第一次用到时才加载"""
+        col = self.columns.get(security)
+        if col is None:
+            if security_type(security) == 'stock':
+                raise KeyError(f"本地没有 {security} 的行情")
+            col = self.add(security)
+        return col
+
+    def row(self, day):
+        """不晚于 day 的最后一个交易日所在的行号，早于区间时返回 -1"""
+        return int(self.days.searchsorted(pd.Timestamp(day).normalize(), side='right')) - 1
+
+    def name(self, col):
+        return self._names[col]
+
+    def is_st(self, cols):
+        return np.array(['ST' in self._names[c] for c in cols], dtype=bool)
+
+    def limit_rates(self, rows, cols):
+        """涨跌幅限制：主板10%，ST 5%，科创板20%，创业板改革后20%，北交所30%，指数没有限制"""
+        rates = np.empty((len(rows), len(cols)))
+        days = self.days[rows]
+        for j, col in enumerate(cols):
+            security = self.securities[col]
+            code = from_jq(security)
+            kind = security_type(security)
+            if kind == 'index':
+                rates[:, j] = np.nan
+            elif code.startswith('688'):
+                rates[:, j] = 0.2
+            elif code.startswith(('300', '301')):
+                rates[:, j] = np.where(days >= CHINEXT_REFORM_DATE, 0.2, 0.1)
+            elif security.endswith('BJSE'):
+                rates[:, j] = 0.3
+            elif kind == 'stock' and 'ST' in self._names[col]:
+                rates[:, j] = 0.05
+            else:
+                rates[:, j] = 0.1
+        return rates
+
+    def _pre_close(self, rows, cols):
+        if self._close_ffill is None:
+            self._close_ffill = pd.DataFrame(self.arrays['close']).ffill().values
+        prev = np.asarray(rows) - 1
+        result = np.full((len(rows), len(cols)), np.nan)
+        valid = prev >= 0
+        result[valid] = self._close_ffill[np.ix_(prev[valid], cols)]
+        return result
+
+    def values(self, field, rows, cols):
+        """取 rows×cols 的某个字段，rows 和 cols 为行号和列号数组"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if field in self.arrays:
+            return self.arrays[field][np.ix_(rows, cols)]
+        if field == 'paused':
+            return np.isnan(self.arrays['close'][np.ix_(rows, cols)]).astype(np.float64)
+        if field == 'avg':
+            volume = self.arrays['volume'][np.ix_(rows, cols)]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                avg = self.arrays['money'][np.ix_(rows, cols)] / volume
+            return np.where(volume > 0, round_price(avg), self.arrays['close'][np.ix_(rows, cols)])
+        pre_close = self._pre_close(rows, cols)
+        if field == 'pre_close':
+            return pre_close
+        rates = self.limit_rates(rows, cols)
+        if field == 'high_limit':
+            return round_price(pre_close * (1 + rates))
+        if field == 'low_limit':
+            return round_price(pre_close * (1 - rates))
+        raise KeyError(f"不支持的字段: {field}")
+
+    def filled(self, field, rows, cols):
+        """停牌日价格字段用前一个收盘价填充、成交量和成交额填 0（聚宽的 fill_paused=True）"""
+        values = self.values(field, rows, cols)
+        if field in ('open', 'close', 'high', 'low', 'avg'):
+            paused = np.isnan(values)
+            if paused.any():
+                values = np.where(paused, self._pre_close(rows, cols), values)
+        elif field in ('volume', 'money', 'turnover'):
+            values = np.nan_to_num(values)
+        return values
+
+
+def index_stocks(index_symbol, on_date=None):
+    """指数成分股（当前成分，按纳入日期去掉 on_date 之后才纳入的）"""
+    df = ak.index_stock_cons(symbol=from_jq(index_symbol))
+    codes = df['品种代码'].astype(str).str.zfill(6)
+    if on_date is not None and '纳入日期' in df.columns:
+        codes = codes[pd.to_datetime(df['纳入日期'], errors='coerce').fillna(pd.Timestamp.min) <= pd.to_datetime(on_date)]
+    return [to_jq(c) for c in codes.drop_duplicates()]
+
+
+def industry_stocks(industry_code, on_date=None):
+    """聚宽一级行业成分股：每只股票取 on_date 当时生效的申万行业分类，再映射到聚宽一级行业"""
+    if industry_code not in SW_TO_JQ_L1.values():
+        raise ValueError(f"本地只支持聚宽一级行业 HY001~HY011，不支持 {industry_code}")
+    df = ak.stock_industry_clf_hist_sw()
+    df = df.assign(start_date=pd.to_datetime(df['start_date'], errors='coerce'),
+                   symbol=df['symbol'].astype(str).str.zfill(6))
+    if on_date is not None:
+        df = df[df['start_date'] <= pd.to_datetime(on_date)]
+    current = df.sort_values('start_date').drop_duplicates('symbol', keep='last')
+    industry = current['industry_code'].astype(str).str[:2].map(SW_TO_JQ_L1)
+    codes = current.loc[industry == industry_code, 'symbol']
+    return [to_jq(c) for c in codes if symbol_master.exchange_of(c) in EXCHANGE_SUFFIX]
+
+
+class Field:
+    """查询表达式中的一个字段，比较运算得到筛选条件"""
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    __hash__ = object.__hash__
+
+    def _condition(self, test):
+        return Condition(lambda df: test(df[self.name]), [self])
+
+    def __lt__(self, other):
+        return self._condition(lambda s: s < other)
+
+    def __le__(self, other):
+        return self._condition(lambda s: s <= other)
+
+    def __gt__(self, other):
+        return self._condition(lambda s: s > other)
+
+    def __ge__(self, other):
+        return self._condition(lambda s: s >= other)
+
+    def __eq__(self, other):
+        return self._condition(lambda s: s == other)
+
+    def __ne__(self, other):
+        return self._condition(lambda s: s != other)
+
+    def in_(self, values):
+        values = list(values)
+        condition = self._condition(lambda s: s.isin(values))
+        if self.name == 'code':
+            condition.codes = values
+        return condition
+
+    def between(self, low, high):
+        return self._condition(lambda s: (s >= low) & (s <= high))
+
+    def asc(self):
+        return self, True
+
+    def desc(self):
+        return self, False
+
+
+class Condition:
+    """筛选条件：对查询结果表求值得到布尔掩码；code.in_ 条件同时记下股票范围"""
+
+    def __init__(self, test, fields):
+        self.test = test
+        self.fields = fields
+        self.codes = None
+
+
+class Table:
+    """财务数据表，属性访问得到字段；provider(codes, day, panel) 返回以证券代码为索引、各字段为列的 DataFrame"""
+
+    def __init__(self, name, fields, provider):
+        self._name = name
+        self._fields = list(fields)
+        self._provider = provider
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Field(self, name)
+
+
+class Query:
+    """聚宽 query(...).filter(...).order_by(...).limit(n) 的本地实现"""
+
+    def __init__(self, entities):
+        self.entities = list(entities)
+        self.conditions = []
+        self.orders = []
+        self.limit_count = None
+
+    def _copy(self):
+        q = Query(self.entities)
+        q.conditions, q.orders, q.limit_count = list(self.conditions), list(self.orders), self.limit_count
+        return q
+
+    def filter(self, *conditions):
+        q = self._copy()
+        q.conditions.extend(conditions)
+        return q
+
+    def order_by(self, *orders):
+        q = self._copy()
+        q.orders.extend(order if isinstance(order, tuple) else (order, True) for order in orders)
+        return q
+
+    def limit(self, n):
+        q = self._copy()
+        q.limit_count = n
+        return q
+
+    def selected_fields(self):
+        fields = []
+        for entity in self.entities:
+            if isinstance(entity, Table):
+                fields.extend(Field(entity, name) for name in entity._fields)
+            else:
+                fields.append(entity)
+        return fields
+
+
+def query(*entities):
+    return Query(entities)
+
+
+def _valuation(codes, day, panel):
+    """市值表：总市值和流通市值单位为亿元，股本单位为万股；流通股本由当天成交量和换手率反推"""
+    row = panel.row(day)
+    cols = [panel.columns[c] for c in codes]
+    close = panel.values('close', [row], cols)[0]
+    volume = panel.values('volume', [row], cols)[0]
+    turnover = panel.values('turnover', [row], cols)[0]
+    local = [from_jq(c) for c in codes]
+    market_cap.update(local, day)
+    shares = market_cap.shares_panel([panel.days[row]], local).iloc[0].values.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        float_shares = np.where(turnover > 0, volume / (turnover / 100), np.nan)
+    return pd.DataFrame({
+        'market_cap': close * shares / 1e8,
+        'circulating_market_cap': close * float_shares / 1e8,
+        'capitalization': shares / 1e4,
+        'circulating_cap': float_shares / 1e4,
+        'turnover_ratio': turnover,
+    }, index=codes)
+
+
+# 利润表字段 -> 财报历史中的列（本地只有营收和净利润，归母净利润用净利润代替）
+INCOME_COLUMNS = {'operating_revenue': 'revenue', 'total_operating_revenue': 'revenue',
+                  'net_profit': 'net_profit', 'np_parent_company_owners': 'net_profit'}
+
+
+def _income(codes, day, panel):
+    """利润表：取当天已经公告的最新一期财报，财报中的累计值换算成单季度值（与聚宽相同）"""
+    latest = financial_index.as_of(day, [from_jq(c) for c in codes])
+    latest.index = [to_jq(c) for c in latest.index]
+    latest = latest.reindex(codes)
+    return pd.DataFrame({field: latest[column + '_q'] for field, column in INCOME_COLUMNS.items()}, index=codes)
+
+
+valuation = Table('valuation', ['code', 'market_cap', 'circulating_market_cap', 'capitalization',
+                                'circulating_cap', 'turnover_ratio'], _valuation)
+income = Table('income', ['code'] + list(INCOME_COLUMNS), _income)
+
+
+def fundamentals(q, day, panel):
+    """在本地数据上执行查询，返回与聚宽 get_fundamentals 相同格式的 DataFrame"""
+    day = panel.days[panel.row(day)]
+    codes = [s for s in panel.securities if security_type(s) == 'stock']
+    for condition in q.conditions:
+        if condition.codes is not None:
+            allowed = set(condition.codes)
+            codes = [c for c in codes if c in allowed]
+    fields = q.selected_fields() + [f for c in q.conditions for f in c.fields] + [f for f, _ in q.orders]
+    tables = {}
+    for field in fields:
+        tables.setdefault(field.table._name, field.table)
+    df = pd.DataFrame(index=pd.Index(codes))
+    for table in tables.values():
+        df = df.join(table._provider(codes, day, panel))
+    df.insert(0, 'code', df.index)
+    for field in fields:
+        if field.name not in df.columns:
+            raise KeyError(f"本地没有 {field.table._name}.{field.name} 字段")
+    for condition in q.conditions:
+        df = df[condition.test(df).fillna(False).astype(bool)]
+    if q.orders:
+        df = df.sort_values([f.name for f, _ in q.orders], ascending=[asc for _, asc in q.orders])
+    if q.limit_count is not None:
+        df = df.head(q.limit_count)
+    columns = list(dict.fromkeys(f.name for f in q.selected_fields()))
+    return df[columns].reset_index(drop=True)
+
+
+def _stat_period(stat_date):
+    """'2023' -> 2023-12-31，'2023q1' -> 2023-03-31"""
+    year, _, quarter = str(stat_date).lower().partition('q')
+    return pd.Timestamp(int(year), int(quarter or 4) * 3, 1) + pd.offsets.MonthEnd(0)
+
+
+def history_fundamentals(securities, fields, watch_date, stat_date=None, count=1, interval='1q',
+                         stat_by_year=False):
+    """聚宽 get_history_fundamentals 的本地实现，只支持 income 表的字段
+
+    从 stat_date 所在报告期往前按 interval（'1q' 或 '1y'）取 count 期，只用 watch_date 当天已经公告的财报；
+    stat_date 为空时取 watch_date 当天按法定披露期限已经公告完的最新一期。
+    stat_by_year=True 时取报告期的全年累计值（stat_date 只写年份即为年报），否则取单季度值。
+    返回列为 code、statDate 和各字段的 DataFrame，按证券和报告期排序。
+    """
+    names = []
+    for field in fields:
+        if isinstance(field, str):
+            table, _, name = field.rpartition('.')
+        else:
+            table, name = field.table._name, field.name
+        if table not in ('', 'income') or name not in INCOME_COLUMNS:
+            raise KeyError(f"本地的 get_history_fundamentals 只支持 income 表的字段，不支持 {field}")
+        names.append(name)
+    if stat_date is None:
+        watch = pd.Timestamp(watch_date)
+        ends = pd.DatetimeIndex([_stat_period(f"{year}q{quarter}")
+                                 for year in (watch.year - 2, watch.year - 1, watch.year) for quarter in range(1, 5)])
+        published = np.asarray(financial_index.estimate_announce_dates(ends)) <= np.datetime64(watch)
+        last = ends[published][-1]
+    else:
+        last = _stat_period(stat_date)
+    step = 12 if interval == '1y' else 3
+    periods = [last - pd.offsets.MonthEnd(step * i) for i in range(count)][::-1]
+    df = financial_index.reports([from_jq(s) for s in securities], periods, announced_by=watch_date)
+    suffix = '' if stat_by_year else '_q'
+    result = pd.DataFrame({
+        'code': [to_jq(c) for c in df['股票代码']],
+        'statDate': pd.to_datetime(df['report_date']).dt.strftime('%Y-%m-%d').values,
+    })
+    for name in names:
+        result[name] = df[INCOME_COLUMNS[name] + suffix].values
+    return result
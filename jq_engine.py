@@ -0,0 +1,910 @@
+# 本地聚宽回测引擎
+# 在本地数据（jq_data）上提供聚宽 API 的一个子集，聚宽平台上的策略文件不用修改就能在本地逐日回测：
+#   数据    get_price、history、attribute_history、get_bars、get_current_data、get_fundamentals/query、
+#           get_history_fundamentals、get_all_securities、get_security_info、get_index_stocks、
+#           get_industry_stocks、get_trade_days
+#   调度    run_daily、run_weekly、run_monthly，以及 before_trading_start、handle_data、after_trading_end
+#   交易    order、order_target、order_value、order_target_value，g、context.portfolio、log、record
+# 按天回测：盘前（9:30 之前）价格为前收盘价，盘中为开盘价，15:00 之后为收盘价；
+# 本地没有分钟数据，分钟级接口返回由这些价格构成的平坦分钟线。
+# 策略文件（以及 myFunc.py 这样的函数库）在注入了上述接口的命名空间里执行，
+# `from jqdata import *`、`from jqfactor import *`、`from jqlib.alpha101 import *` 都指向本地实现。
+# 财务数据只有 valuation 和 income 两张表；finance 库（审计意见、资产负债表、分红等）本地没有数据源，
+# 不提供 finance，用到它的策略（如 lirunbenpao.py）在加载时报错，不能在本地回测。
+#
+# 用法：python jq_engine.py niushi.py --start 2023-01-01 --end 2023-12-31 [--capital 1000000]
+#                          [--library myFunc.py] [--offline] [--workers 4]
+import os
+import ast
+import sys
+import types
+import argparse
+import datetime
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import fetch_engine
+import financial_index
+import holder_store
+import jq_data
+import market_cap
+import trade_calendar
+
+# 回测开始前额外加载的交易日数（策略常用 300 日历史）
+LOOKBACK_DAYS = 320
+DEFAULT_CAPITAL = 1000000
+BEFORE_OPEN = '09:00'
+MARKET_OPEN = '09:30'
+MARKET_CLOSE = '15:00'
+AFTER_CLOSE = '15:30'
+TIME_ALIASES = {'before_open': BEFORE_OPEN, 'open': MARKET_OPEN, 'every_bar': MARKET_OPEN,
+                'close': MARKET_CLOSE, 'after_close': AFTER_CLOSE}
+# 聚宽上有、本地没有数据源的接口：策略用到时加载阶段就报错，而不是回测到一半才失败
+UNSUPPORTED = {'finance': 'finance 库（审计意见、资产负债表、分红等）'}
+# 策略里可以导入聚宽接口的模块
+JQ_MODULES = ('jqdata', 'kuanke.user_space_api')
+# 一个交易日的分钟线时间（聚宽的分钟线以结束时间标记）
+TRADING_MINUTES = [f"{h:02d}:{m:02d}" for h, m in
+                   [(9 + (30 + i) // 60, (30 + i) % 60) for i in range(1, 121)] +
+                   [(13 + i // 60, i % 60) for i in range(1, 121)]]
+
+
+class OrderStatus:
+    open = 'open'
+    filled = 'filled'
+    canceled = 'canceled'
+    rejected = 'rejected'
+    held = 'held'
+
+
+class OrderCost:
+    """交易费用：税率、佣金率和最低佣金"""
+
+    def __init__(self, open_tax=0, close_tax=0.001, open_commission=0.0003, close_commission=0.0003,
+                 close_today_commission=0, min_commission=5):
+        self.open_tax = open_tax
+        self.close_tax = close_tax
+        self.open_commission = open_commission
+        self.close_commission = close_commission
+        self.close_today_commission = close_today_commission
+        self.min_commission = min_commission
+
+    def fee(self, value, is_buy):
+        commission = max(value * (self.open_commission if is_buy else self.close_commission), self.min_commission)
+        return commission + value * (self.open_tax if is_buy else self.close_tax)
+
+
+class FixedSlippage:
+    """固定滑点：买卖价格各偏离一半"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def apply(self, price, is_buy):
+        return price + self.value / 2 if is_buy else price - self.value / 2
+
+
+class PriceRelatedSlippage:
+    """按价格比例的滑点"""
+
+    def __init__(self, ratio=0.00246):
+        self.ratio = ratio
+
+    def apply(self, price, is_buy):
+        return price * (1 + self.ratio / 2) if is_buy else price * (1 - self.ratio / 2)
+
+
+class GlobalVars:
+    """策略的全局变量 g"""
+
+
+class Log:
+    """聚宽的 log：按级别输出，带当前回测时间"""
+
+    LEVELS = {'debug': 10, 'info': 20, 'warn': 30, 'warning': 30, 'error': 40}
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._levels = {}
+
+    def set_level(self, source, level):
+        self._levels[source] = self.LEVELS.get(level, 20)
+
+    def _write(self, level, args):
+        if self.LEVELS[level] >= self._levels.get('strategy', 10):
+            message = ' '.join(str(a) for a in args)
+            print(f"{self._engine.context.current_dt:%Y-%m-%d %H:%M:%S} - {level.upper()} - {message}")
+
+    def debug(self, *args):
+        self._write('debug', args)
+
+    def info(self, *args):
+        self._write('info', args)
+
+    def warn(self, *args):
+        self._write('warn', args)
+
+    warning = warn
+
+    def error(self, *args):
+        self._write('error', args)
+
+    def order(self, *args):
+        if self._levels.get('order', 20) <= self.LEVELS['warn']:
+            self._write('warn', args)
+
+
+class Position:
+    """持仓：数量、可卖数量、成本，价格按当前回测时间计算"""
+
+    def __init__(self, engine, security):
+        self._engine = engine
+        self.security = security
+        self.total_amount = 0
+        self.closeable_amount = 0
+        self.avg_cost = 0.0
+        self.acc_avg_cost = 0.0
+        self.init_time = engine.context.current_dt
+
+    @property
+    def price(self):
+        return self._engine.price(self.security)
+
+    @property
+    def value(self):
+        return self.total_amount * self.price
+
+    @property
+    def hold_cost(self):
+        return self.avg_cost
+
+
+class Positions(dict):
+    """持仓字典：取不存在的股票时返回空持仓（不加入字典）"""
+
+    def __init__(self, engine):
+        super().__init__()
+        self._engine = engine
+
+    def __missing__(self, security):
+        return Position(self._engine, security)
+
+
+class Portfolio:
+    def __init__(self, engine, capital):
+        self.starting_cash = capital
+        self.cash = capital
+        self.positions = Positions(engine)
+
+    @property
+    def available_cash(self):
+        return self.cash
+
+    @property
+    def positions_value(self):
+        return sum(p.value for p in self.positions.values())
+
+    @property
+    def total_value(self):
+        return self.cash + self.positions_value
+
+    @property
+    def returns(self):
+        return self.total_value / self.starting_cash - 1
+
+
+class Context:
+    def __init__(self, engine, capital, start, end):
+        self.portfolio = Portfolio(engine, capital)
+        self.current_dt = datetime.datetime.combine(start, datetime.time(9, 0))
+        self.previous_date = None
+        self.universe = []
+        self.run_params = types.SimpleNamespace(start_date=start, end_date=end, type='simple_backtest',
+                                                frequency='day')
+
+    @property
+    def subportfolios(self):
+        return [self.portfolio]
+
+
+class Order:
+    _next_id = 1
+
+    def __init__(self, security, amount, price, commission, add_time):
+        self.order_id = Order._next_id
+        Order._next_id += 1
+        self.security = security
+        self.is_buy = amount > 0
+        self.amount = abs(amount)
+        self.filled = abs(amount)
+        self.price = price
+        self.commission = commission
+        self.add_time = add_time
+        self.status = OrderStatus.held
+
+    def __repr__(self):
+        side = '买入' if self.is_buy else '卖出'
+        return f"Order({side} {self.security} {self.filled}股 @ {self.price:.3f})"
+
+
+class SecurityInfo:
+    def __init__(self, code, display_name, start_date, end_date, type):
+        self.code = code
+        self.display_name = display_name
+        self.name = display_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.type = type
+
+
+class _Snapshot:
+    """某只证券在某个时刻的数据（get_current_data 和 handle_data 的 data 中的元素）"""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+class _LazyDict(dict):
+    """按需计算元素的字典"""
+
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def __missing__(self, security):
+        value = self._factory(security)
+        self[security] = value
+        return value
+
+
+class _Task:
+    def __init__(self, func, time, kind='daily', day=None, force=True):
+        self.func = func
+        self.time = TIME_ALIASES.get(time, time)
+        if len(self.time) == 4:
+            self.time = '0' + self.time
+        self.kind = kind
+        self.day = day
+        self.force = force
+
+    def matches(self, position, count):
+        """position 为当天是本周/本月的第几个交易日（从0开始），count 为本周/本月的交易日数"""
+        if self.kind == 'daily':
+            return True
+        target = self.day - 1 if self.day > 0 else count + self.day
+        if 0 <= target < count:
+            return position == target
+        return self.force and position == (count - 1 if target >= count else 0)
+
+
+def _as_list(securities):
+    if isinstance(securities, str):
+        return [securities]
+    return list(securities)
+
+
+def unsupported_names(source, path='<strategy>'):
+    """策略源码中用到的 UNSUPPORTED 接口名：从聚宽模块导入的，或没有自己赋值就直接使用的"""
+    tree = ast.parse(source, path)
+    imported, loaded, stored = set(), set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module in JQ_MODULES:
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else stored).add(node.id)
+    return sorted(name for name in UNSUPPORTED if name in imported or (name in loaded and name not in stored))
+
+
+def _to_datetime(value):
+    return pd.Timestamp(value).to_pydatetime()
+
+
+class Engine:
+    """按天回测一个聚宽策略文件"""
+
+    def __init__(self, strategy_path, start_date, end_date, capital=DEFAULT_CAPITAL, libraries=(), sync=True,
+                 panel=None):
+        self.strategy_path = strategy_path
+        self.libraries = list(libraries)
+        self.days = trade_calendar.trading_range(start_date, end_date)
+        if not len(self.days):
+            raise ValueError(f"{start_date} 到 {end_date} 之间没有交易日")
+        self.start, self.end = self.days[0].date(), self.days[-1].date()
+        self.sync = sync
+        self.panel = panel
+        self.capital = capital
+        self.context = Context(self, capital, self.start, self.end)
+        self.g = GlobalVars()
+        self.log = Log(self)
+        self.options = {}
+        self.benchmark = '000300.XSHG'
+        self.order_cost = OrderCost()
+        self.slippage = PriceRelatedSlippage()
+        self.tasks = []
+        self.records = []
+        self.recorded = {}
+        self.orders = []
+        self.namespace = None
+
+    # ---------- 数据 ----------
+
+    def load_panel(self):
+        if self.panel is None:
+            start = trade_calendar.shift(self.start, -LOOKBACK_DAYS)
+            securities = list(jq_data.securities().index)
+            self.panel = jq_data.DailyPanel.load(start, self.end, securities, sync=self.sync)
+        return self.panel
+
+    def _today_row(self):
+        return self.panel.row(self.context.current_dt)
+
+    def _clock(self):
+        return self.context.current_dt.strftime('%H:%M')
+
+    def price(self, security):
+        """当前时刻的价格：开盘前为前收盘价，盘中为开盘价，收盘后为收盘价，停牌时为最近的收盘价"""
+        col = self.panel.column(security)
+        row = self._today_row()
+        clock = self._clock()
+        field = 'pre_close' if clock < MARKET_OPEN else 'open' if clock < MARKET_CLOSE else 'close'
+        value = self.panel.values(field, [row], [col])[0, 0]
+        if np.isnan(value):
+            value = self.panel.filled('close', [row], [col])[0, 0] if field != 'pre_close' else value
+        return float(value)
+
+    def _available(self, field):
+        """当天的日线字段在当前时刻是否已经可知（避免未来数据）"""
+        if field in ('pre_close', 'high_limit', 'low_limit', 'paused'):
+            return True
+        clock = self._clock()
+        if field == 'open':
+            return clock >= MARKET_OPEN
+        return clock >= MARKET_CLOSE
+
+    def daily_matrix(self, securities, fields, end, count=None, start=None, fill_paused=True):
+        """日线矩阵：返回 (交易日, {字段: 交易日×证券 数组})，end 当天的数据只保留当前时刻已知的字段"""
+        end = min(pd.Timestamp(end), pd.Timestamp(self.context.current_dt))
+        last = self.panel.row(end)
+        first = max(last - count + 1, 0) if count is not None else max(self.panel.row(start - pd.Timedelta(days=1)) + 1, 0)
+        rows = np.arange(first, last + 1)
+        cols = [self.panel.column(s) for s in securities]
+        today = self._today_row()
+        result = {}
+        for field in fields:
+            values = self.panel.filled(field, rows, cols) if fill_paused else self.panel.values(field, rows, cols)
+            if len(rows) and rows[-1] == today and not self._available(field):
+                values = values.copy()
+                values[-1] = np.nan
+            result[field] = values
+        return self.panel.days[rows], result
+
+    def minute_matrix(self, securities, fields, end, count=None, start=None):
+        """平坦分钟线：每分钟的价格为当天开盘价（15:00 为收盘价），成交量为 0"""
+        end = min(pd.Timestamp(end), pd.Timestamp(self.context.current_dt))
+        stamps = []
+        row = self.panel.row(end)
+        while row >= 0:
+            day = self.panel.days[row]
+            minutes = [pd.Timestamp(f"{day:%Y-%m-%d} {m}") for m in TRADING_MINUTES]
+            minutes = [m for m in minutes if m <= end and (start is None or m >= pd.Timestamp(start))]
+            stamps = [(row, m) for m in minutes] + stamps
+            if (count is not None and len(stamps) >= count) or (start is not None and day <= pd.Timestamp(start)):
+                break
+            if count is None and start is None:
+                break
+            row -= 1
+        if count is not None:
+            stamps = stamps[-count:]
+        cols = [self.panel.column(s) for s in securities]
+        index = pd.DatetimeIndex([m for _, m in stamps])
+        # 每分钟对应的日线行号在 days 中的位置，以及是否为 15:00 那一分钟
+        days, position = np.unique(np.array([r for r, _ in stamps], dtype=np.int64), return_inverse=True)
+        at_close = index.strftime('%H:%M') >= MARKET_CLOSE
+        result = {}
+        for field in fields:
+            if field in ('volume', 'money'):
+                result[field] = np.zeros((len(stamps), len(cols)))
+            elif field in ('high_limit', 'low_limit', 'pre_close', 'paused'):
+                result[field] = self.panel.values(field, days, cols)[position]
+            else:
+                opens = self.panel.filled('open', days, cols)[position]
+                closes = self.panel.filled('close', days, cols)[position]
+                result[field] = np.where(at_close[:, None], closes, opens)
+        return index, result
+
+    # ---------- 交易 ----------
+
+    def _limits(self, security):
+        col = self.panel.column(security)
+        row = self._today_row()
+        high, low = (self.panel.values(f, [row], [col])[0, 0] for f in ('high_limit', 'low_limit'))
+        paused = bool(self.panel.values('paused', [row], [col])[0, 0])
+        return high, low, paused
+
+    def order(self, security, amount):
+        """按数量下单（正数买入，负数卖出），立即按当前价格加滑点成交，失败返回 None"""
+        if amount == 0:
+            return None
+        high_limit, low_limit, paused = self._limits(security)
+        if paused:
+            self.log.order(f"{security} 停牌，不能交易")
+            return None
+        price = self.price(security)
+        is_buy = amount > 0
+        if is_buy and price >= high_limit:
+            self.log.order(f"{security} 涨停，不能买入")
+            return None
+        if not is_buy and price <= low_limit:
+            self.log.order(f"{security} 跌停，不能卖出")
+            return None
+        portfolio = self.context.portfolio
+        position = portfolio.positions[security]
+        fill_price = self.slippage.apply(price, is_buy)
+        if is_buy:
+            amount = int(amount // 100 * 100)
+            while amount > 0 and amount * fill_price + self.order_cost.fee(amount * fill_price, True) > portfolio.cash:
+                amount -= 100
+        else:
+            amount = -min(-amount, position.closeable_amount)
+            if -amount < position.closeable_amount:
+                amount = -int(-amount // 100 * 100)
+        if amount == 0:
+            return None
+
+        value = abs(amount) * fill_price
+        fee = self.order_cost.fee(value, is_buy)
+        if is_buy:
+            portfolio.cash -= value + fee
+            total = position.total_amount + amount
+            position.avg_cost = (position.avg_cost * position.total_amount + value) / total
+            position.acc_avg_cost = position.avg_cost
+            position.total_amount = total
+            portfolio.positions[security] = position
+        else:
+            portfolio.cash += value - fee
+            position.total_amount += amount
+            position.closeable_amount += amount
+            if position.total_amount == 0:
+                del portfolio.positions[security]
+        order = Order(security, amount, fill_price, fee, self.context.current_dt)
+        self.orders.append(order)
+        return order
+
+    def order_target(self, security, amount):
+        return self.order(security, amount - self.context.portfolio.positions[security].total_amount)
+
+    def order_value(self, security, value):
+        price = self.price(security)
+        if not price > 0:
+            return None
+        return self.order(security, int(value / price))
+
+    def order_target_value(self, security, value):
+        price = self.price(security)
+        if not price > 0:
+            return None
+        if value == 0:
+            return self.order_target(security, 0)
+        return self.order_target(security, int(value / price // 100 * 100))
+
+    # ---------- 调度 ----------
+
+    def _positions_in_period(self, key):
+        """每个回测交易日是所在周期（周或月）的第几个交易日，以及该周期的交易日数"""
+        days = trade_calendar.trading_range(self.start - datetime.timedelta(days=40), self.end + datetime.timedelta(days=40))
+        periods = pd.Series(days.to_period(key).astype(str), index=days)
+        position = periods.groupby(periods).cumcount()
+        count = periods.map(periods.value_counts())
+        return position, count
+
+    def _events(self, day, week, month):
+        """当天要运行的 (时间, 顺序, 函数) 列表"""
+        ns = self.namespace
+        events = []
+        if 'before_trading_start' in ns:
+            events.append((BEFORE_OPEN, -1, ns['before_trading_start']))
+        if 'handle_data' in ns:
+            events.append((MARKET_OPEN, len(self.tasks), lambda context: ns['handle_data'](context, self.bar_data())))
+        if 'after_trading_end' in ns:
+            events.append((AFTER_CLOSE, len(self.tasks) + 1, ns['after_trading_end']))
+        for i, task in enumerate(self.tasks):
+            if task.kind == 'weekly':
+                hit = task.matches(week[0][day], week[1][day])
+            elif task.kind == 'monthly':
+                hit = task.matches(month[0][day], month[1][day])
+            else:
+                hit = True
+            if hit:
+                events.append((task.time, i, task.func))
+        return sorted(events, key=lambda e: (e[0], e[1]))
+
+    def bar_data(self):
+        """handle_data 的 data：按天回测时是前一个交易日的日线"""
+        row = self._today_row() - 1
+
+        def snapshot(security):
+            col = self.panel.column(security)
+            values = {f: float(self.panel.filled(f, [row], [col])[0, 0])
+                      for f in ['open', 'close', 'high', 'low', 'volume', 'money', 'avg',
+                                'pre_close', 'high_limit', 'low_limit']}
+            return _Snapshot(security=security, paused=bool(self.panel.values('paused', [row], [col])[0, 0]),
+                             factor=1.0, **values)
+        return _LazyDict(snapshot)
+
+    def current_data(self):
+        """get_current_data：当前时刻的价格、当天涨跌停价、停牌、ST、名称"""
+        row = self._today_row()
+
+        def snapshot(security):
+            col = self.panel.column(security)
+            day_open = self.panel.values('open', [row], [col])[0, 0] if self._clock() >= MARKET_OPEN else np.nan
+            return _Snapshot(
+                security=security, name=self.panel.name(col) or security, last_price=self.price(security),
+                day_open=float(day_open),
+                high_limit=float(self.panel.values('high_limit', [row], [col])[0, 0]),
+                low_limit=float(self.panel.values('low_limit', [row], [col])[0, 0]),
+                paused=bool(self.panel.values('paused', [row], [col])[0, 0]),
+                is_st=bool(self.panel.is_st([col])[0]), factor=1.0,
+            )
+        return _LazyDict(snapshot)
+
+    # ---------- 运行 ----------
+
+    def load_strategy(self):
+        """在注入了聚宽接口的命名空间里依次执行函数库和策略文件；用到本地不支持的接口时抛出 ImportError"""
+        api = Api(self)
+        install(api)
+        namespace = api.exports()
+        namespace.update(__name__='__jq_strategy__', __builtins__=__builtins__)
+        for path in self.libraries + [self.strategy_path]:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            missing = unsupported_names(source, path)
+            if missing:
+                raise ImportError(f"{path} 用到了本地没有数据源的聚宽接口 "
+                                  f"{'、'.join(UNSUPPORTED[name] for name in missing)}，不能在本地回测")
+            namespace['__file__'] = path
+            exec(compile(source, path, 'exec'), namespace)
+        self.namespace = namespace
+        return namespace
+
+    def run(self):
+        """运行回测，返回每个交易日收盘后的账户净值表"""
+        self.load_panel()
+        self.load_strategy()
+        ns = self.namespace
+        self.context.previous_date = trade_calendar.prev_trading_day(self.start).date()
+        ns['initialize'](self.context)
+        if 'process_initialize' in ns:
+            ns['process_initialize'](self.context)
+        week = self._positions_in_period('W')
+        month = self._positions_in_period('M')
+        benchmark = self.panel.column(self.benchmark)
+
+        for day in self.days:
+            self.context.previous_date = trade_calendar.prev_trading_day(day).date()
+            for position in self.context.portfolio.positions.values():
+                position.closeable_amount = position.total_amount
+            for clock, _, func in self._events(day, week, month):
+                self.context.current_dt = _to_datetime(f"{day:%Y-%m-%d} {clock}")
+                func(self.context)
+            self.context.current_dt = _to_datetime(f"{day:%Y-%m-%d} {AFTER_CLOSE}")
+            row = self._today_row()
+            portfolio = self.context.portfolio
+            self.records.append({
+                'date': day, 'total_value': portfolio.total_value, 'cash': portfolio.cash,
+                'positions': len(portfolio.positions),
+                'benchmark': float(self.panel.values('close', [row], [benchmark])[0, 0]),
+                **self.recorded,
+            })
+        return self.results()
+
+    def results(self):
+        df = pd.DataFrame(self.records).set_index('date')
+        df['returns'] = df['total_value'] / self.capital - 1
+        df['benchmark_returns'] = df['benchmark'] / df['benchmark'].iloc[0] - 1
+        return df
+
+
+def summary(results):
+    """总收益、年化收益、最大回撤、基准收益"""
+    value = results['total_value']
+    years = max(len(value) / 244, 1 / 244)
+    drawdown = 1 - value / value.cummax()
+    return {
+        '总收益': value.iloc[-1] / value.iloc[0] - 1 if len(value) else 0.0,
+        '年化收益': (value.iloc[-1] / value.iloc[0]) ** (1 / years) - 1 if len(value) else 0.0,
+        '最大回撤': drawdown.max() if len(value) else 0.0,
+        '基准收益': results['benchmark_returns'].iloc[-1] if len(value) else 0.0,
+    }
+
+
+class Api:
+    """绑定到一次回测的聚宽接口"""
+
+    NAMES = [
+        'g', 'log', 'set_option', 'set_benchmark', 'set_order_cost', 'set_slippage', 'set_commission',
+        'set_universe', 'OrderCost', 'FixedSlippage', 'PriceRelatedSlippage', 'OrderStatus',
+        'run_daily', 'run_weekly', 'run_monthly', 'unschedule_all', 'record',
+        'order', 'order_target', 'order_value', 'order_target_value',
+        'get_price', 'history', 'attribute_history', 'get_bars', 'get_current_data',
+        'get_all_securities', 'get_security_info', 'get_index_stocks', 'get_industry_stocks',
+        'get_trade_days', 'get_all_trade_days', 'get_fundamentals', 'get_history_fundamentals', 'query',
+        'valuation', 'income', 'datetime', 'np', 'pd',
+    ]
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.g = engine.g
+        self.log = engine.log
+        self.OrderCost = OrderCost
+        self.FixedSlippage = FixedSlippage
+        self.PriceRelatedSlippage = PriceRelatedSlippage
+        self.OrderStatus = OrderStatus
+        self.query = jq_data.query
+        self.valuation = jq_data.valuation
+        self.income = jq_data.income
+        self.datetime = datetime
+        self.np = np
+        self.pd = pd
+
+    def exports(self):
+        return {name: getattr(self, name) for name in self.NAMES}
+
+    # 设置
+    def set_option(self, key, value):
+        self._engine.options[key] = value
+
+    def set_benchmark(self, security):
+        self._engine.benchmark = security
+
+    def set_order_cost(self, cost, type='stock', ref=None):
+        self._engine.order_cost = cost
+
+    def set_slippage(self, slippage, type=None, ref=None):
+        self._engine.slippage = slippage
+
+    def set_commission(self, *args, **kwargs):
+        pass
+
+    def set_universe(self, securities):
+        self._engine.context.universe = _as_list(securities)
+
+    # 调度
+    def run_daily(self, func, time='9:30', reference_security=None):
+        self._engine.tasks.append(_Task(func, time))
+
+    def run_weekly(self, func, weekday, time='9:30', reference_security=None, force=True):
+        self._engine.tasks.append(_Task(func, time, 'weekly', weekday, force))
+
+    def run_monthly(self, func, monthday, time='9:30', reference_security=None, force=True):
+        self._engine.tasks.append(_Task(func, time, 'monthly', monthday, force))
+
+    def unschedule_all(self):
+        self._engine.tasks.clear()
+
+    def record(self, **values):
+        """记录的值写入当天收盘后的那一行，之后没有再记录时沿用最后一次的值"""
+        self._engine.recorded.update(values)
+
+    # 交易
+    def order(self, security, amount, style=None, side='long'):
+        return self._engine.order(security, amount)
+
+    def order_target(self, security, amount, style=None, side='long'):
+        return self._engine.order_target(security, amount)
+
+    def order_value(self, security, value, style=None, side='long'):
+        return self._engine.order_value(security, value)
+
+    def order_target_value(self, security, value, style=None, side='long'):
+        return self._engine.order_target_value(security, value)
+
+    # 行情
+    def _frames(self, securities, fields, frequency, start_date, end_date, count, fill_paused=True):
+        engine = self._engine
+        end = engine.context.current_dt if end_date is None else pd.Timestamp(end_date)
+        if frequency in ('daily', '1d'):
+            if isinstance(end_date, datetime.date) and not isinstance(end_date, datetime.datetime):
+                end = pd.Timestamp(end_date) + pd.Timedelta(hours=23)
+            elif isinstance(end_date, str) and len(end_date) <= 10:
+                end = pd.Timestamp(end_date) + pd.Timedelta(hours=23)
+            start = None if count is not None else pd.Timestamp(start_date)
+            return engine.daily_matrix(securities, fields, end, count, start, fill_paused)
+        if frequency in ('minute', '1m'):
+            start = None if count is not None else pd.Timestamp(start_date)
+            return engine.minute_matrix(securities, fields, end, count, start)
+        raise ValueError(f"不支持的频率: {frequency}，本地只有日线（daily/1d）和由日线构成的分钟线（minute/1m）")
+
+    def get_price(self, security, start_date=None, end_date=None, frequency='daily', fields=None,
+                  skip_paused=False, fq='pre', count=None, panel=True, fill_paused=True):
+        securities = _as_list(security)
+        fields = _as_list(fields) if fields is not None else list(jq_data.DEFAULT_FIELDS)
+        index, values = self._frames(securities, fields, frequency, start_date, end_date, count, fill_paused)
+        if isinstance(security, str):
+            df = pd.DataFrame({f: values[f][:, 0] for f in fields}, index=index)
+            return df[df['paused'] == 0] if skip_paused and 'paused' in df else df
+        if panel:
+            return pd.concat({f: pd.DataFrame(values[f], index=index, columns=securities) for f in fields}, axis=1)
+        n, m = len(index), len(securities)
+        df = pd.DataFrame({'time': np.repeat(index.values, m), 'code': np.tile(np.asarray(securities, dtype=object), n)})
+        for f in fields:
+            df[f] = values[f].reshape(-1)
+        if skip_paused:
+            paused = self._frames(securities, ['paused'], frequency, start_date, end_date, count, False)[1]['paused']
+            df = df[paused.reshape(-1) == 0].reset_index(drop=True)
+        return df
+
+    def _history_end(self, unit):
+        """history 的截止时间：日线不含当天，分钟线截止到当前时刻"""
+        engine = self._engine
+        if unit in ('1d', 'daily'):
+            return pd.Timestamp(engine.context.previous_date) + pd.Timedelta(hours=23)
+        return engine.context.current_dt
+
+    def history(self, count, unit='1d', field='avg', security_list=None, df=True, skip_paused=False, fq='pre'):
+        securities = _as_list(security_list) if security_list is not None else list(self._engine.context.universe)
+        index, values = self._frames(securities, [field], unit, None, self._history_end(unit), count)
+        if df:
+            return pd.DataFrame(values[field], index=index, columns=securities)
+        return {s: values[field][:, i] for i, s in enumerate(securities)}
+
+    def attribute_history(self, security, count, unit='1d', fields=('open', 'close', 'high', 'low', 'volume', 'money'),
+                          skip_paused=True, df=True, fq='pre'):
+        fields = _as_list(fields)
+        index, values = self._frames([security], fields, unit, None, self._history_end(unit), count)
+        data = {f: values[f][:, 0] for f in fields}
+        return pd.DataFrame(data, index=index) if df else data
+
+    def get_bars(self, security, count, unit='1d', fields=('date', 'open', 'high', 'low', 'close'),
+                 include_now=False, end_dt=None, fq_ref_date=None, df=False):
+        engine = self._engine
+        securities = _as_list(security)
+        fields = _as_list(fields)
+        value_fields = [f for f in fields if f != 'date']
+        end = pd.Timestamp(end_dt) if end_dt is not None else pd.Timestamp(engine.context.current_dt)
+        if unit in ('1d', 'daily'):
+            end = end if include_now else end.normalize() - pd.Timedelta(seconds=1)
+        elif not include_now:
+            end = end - pd.Timedelta(minutes=1)
+        index, values = self._frames(securities, value_fields, unit, None, end, count)
+        result = {}
+        for i, s in enumerate(securities):
+            columns = {'date': index.to_pydatetime() if unit not in ('1d', 'daily') else index.date}
+            columns.update({f: values[f][:, i] for f in value_fields})
+            frame = pd.DataFrame({f: columns[f] for f in fields})
+            result[s] = frame if df else frame.to_records(index=False)
+        return result[security] if isinstance(security, str) else result
+
+    def get_current_data(self):
+        return self._engine.current_data()
+
+    # 证券信息
+    def get_all_securities(self, types=(), date=None):
+        types = _as_list(types)
+        if types and 'stock' not in types:
+            return pd.DataFrame(columns=['display_name', 'name', 'start_date', 'end_date', 'type'])
+        return jq_data.securities(date)
+
+    def get_security_info(self, code, date=None):
+        info = jq_data.securities()
+        if code in info.index:
+            row = info.loc[code]
+            return SecurityInfo(code, row['display_name'], row['start_date'].date(), row['end_date'].date(), 'stock')
+        return SecurityInfo(code, code, jq_data.UNKNOWN_START_DATE, datetime.date(2200, 1, 1),
+                            jq_data.security_type(code))
+
+    def get_index_stocks(self, index_symbol, date=None):
+        return jq_data.index_stocks(index_symbol, date or self._engine.context.current_dt)
+
+    def get_industry_stocks(self, industry_code, date=None):
+        return jq_data.industry_stocks(industry_code, date or self._engine.context.current_dt)
+
+    def get_trade_days(self, start_date=None, end_date=None, count=None):
+        end = end_date or self._engine.end
+        if count is not None:
+            days = trade_calendar.trading_range(trade_calendar.shift(end, 1 - count), end)
+        else:
+            days = trade_calendar.trading_range(start_date, end)
+        return np.array([d.date() for d in days])
+
+    def get_all_trade_days(self):
+        return np.array([d.date() for d in trade_calendar.trading_range('2005-01-01', datetime.date.today())])
+
+    # 财务数据
+    def get_fundamentals(self, query_object, date=None, statDate=None):
+        if statDate is not None:
+            raise ValueError("本地只支持按 date 查询财务数据，不支持 statDate；按报告期查询请用 get_history_fundamentals")
+        day = date or self._engine.context.previous_date
+        return jq_data.fundamentals(query_object, day, self._engine.panel)
+
+    def get_history_fundamentals(self, security, fields, watch_date=None, stat_date=None, count=1, interval='1q',
+                                 stat_by_year=False):
+        # 不指定 watch_date 时也只用回测当天之前已经公告的财报
+        day = watch_date or self._engine.context.previous_date
+        return jq_data.history_fundamentals(_as_list(security), fields, day, stat_date, count, interval, stat_by_year)
+
+
+def install(api):
+    """把 jqdata、jqfactor、jqlib.alpha101、kuanke.user_space_api 注册为指向本地实现的模块"""
+    exports = api.exports()
+    jqdata = types.ModuleType('jqdata')
+    jqdata.__dict__.update(exports)
+    jqdata.__all__ = list(exports)
+    user_space = types.ModuleType('kuanke.user_space_api')
+    user_space.__dict__.update(exports)
+    user_space.__all__ = list(exports)
+    sys.modules['jqdata'] = jqdata
+    sys.modules['kuanke'] = types.ModuleType('kuanke')
+    sys.modules['kuanke.user_space_api'] = user_space
+    # 因子库和 alpha101 目前没有本地实现，只保证导入不出错
+    for name in ('jqfactor', 'jqlib', 'jqlib.alpha101'):
+        module = types.ModuleType(name)
+        module.__all__ = []
+        sys.modules[name] = module
+    sys.modules['jqlib'].alpha101 = sys.modules['jqlib.alpha101']
+
+
+def _init_worker(workers):
+    """工作进程初始化：只读共享主进程已经同步好的本地数据，限速额度按进程数平分"""
+    bar_store.READ_ONLY = True
+    financial_index.READ_ONLY = True
+    market_cap.READ_ONLY = True
+    holder_store.READ_ONLY = True
+    for name in fetch_engine.RATE_LIMITS:
+        fetch_engine.RATE_LIMITS[name] /= workers
+    fetch_engine.DEFAULT_RATE /= workers
+
+
+def run_backtest(strategy_path, start_date, end_date, capital=DEFAULT_CAPITAL, libraries=(), sync=True):
+    """回测一个策略文件，返回每日净值表"""
+    return Engine(strategy_path, start_date, end_date, capital, libraries, sync).run()
+
+
+def run_backtests(strategies, start_date, end_date, capital=DEFAULT_CAPITAL, libraries=(), sync=True, workers=1):
+    """回测多个策略文件：主进程先同步好行情，再把策略分给多个进程并行回测，返回 {策略: 净值表}"""
+    if sync:
+        start = trade_calendar.shift(start_date, -LOOKBACK_DAYS)
+        bar_store.sync([jq_data.from_jq(s) for s in jq_data.securities().index], start, end_date)
+    if workers <= 1 or len(strategies) <= 1:
+        return {path: run_backtest(path, start_date, end_date, capital, libraries, False) for path in strategies}
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                initializer=_init_worker, initargs=(workers,)) as executor:
+        futures = {executor.submit(run_backtest, path, start_date, end_date, capital, libraries, False): path
+                   for path in strategies}
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"回测 {path} 时发生错误: {e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地聚宽回测')
+    parser.add_argument('strategies', nargs='+', help='策略文件')
+    parser.add_argument('--start', required=True, help='开始日期')
+    parser.add_argument('--end', required=True, help='结束日期')
+    parser.add_argument('--capital', type=float, default=DEFAULT_CAPITAL, help='初始资金')
+    parser.add_argument('--library', action='append', default=[], help='先于策略执行的函数库文件，如 myFunc.py')
+    parser.add_argument('--offline', action='store_true', help='只用本地已有数据，不联网同步')
+    parser.add_argument('--workers', type=int, default=1, help='并行回测的进程数')
+    args = parser.parse_args()
+
+    results = run_backtests(args.strategies, args.start, args.end, args.capital, args.library,
+                            not args.offline, args.workers)
+    for path, df in results.items():
+        print(f"\n{os.path.basename(path)}:")
+        for key, value in summary(df).items():
+            print(f"    {key}: {value:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# 历史市值面板
+# 每只股票的股本变动历史只下载一次并存到本地，按变动日期做时点查询，得到任意交易日当时的总股本。
+# 总股本面板（交易日×股票）与本地行情库的收盘价面板逐元素相乘，一次算出整段区间的市值矩阵，
+# 之后按日期筛选市值只是数组查找，回测中用的是当时的股本而不是今天的股本。
+import os
+import json
+import threading
+from datetime import datetime
+
+import akshare as ak
+import pandas as pd
+
+import bar_store
+import fetch_engine
+from config import DATA_DIR
+
+CAP_DIR = os.path.join(DATA_DIR, 'market_cap')
+SHARES_FILE = os.path.join(CAP_DIR, 'share_changes.parquet')
+FETCHED_FILE = os.path.join(CAP_DIR, 'share_changes_symbols.json')
+
+# stock_share_change_cninfo 的股本单位是万股
+SHARE_UNIT = 10000
+# 批量行情里的总市值/股价反推出的总股本与已知股本相差超过这个比例才记为一次变动（排除四舍五入误差）
+SHARE_TOLERANCE = 1e-3
+# 为 True 时 update 不下载也不写文件，只读本地已有的股本历史（多进程共享时在工作进程中设置）
+READ_ONLY = False
+
+_lock = threading.RLock()
+_history = None
+_fetched = None     # {股票: 下载日期 YYYYMMDD}
+_panel = None
+_panel_symbols = set()
+
+
+def _load():
+    global _history, _fetched
+    if _history is None:
+        if os.path.exists(SHARES_FILE):
+            _history = pd.read_parquet(SHARES_FILE)
+        else:
+            _history = pd.DataFrame(columns=['股票代码', '变动日期', '总股本'])
+        if os.path.exists(FETCHED_FILE):
+            with open(FETCHED_FILE, 'r', encoding='utf-8') as f:
+                _fetched = json.load(f)
+        else:
+            _fetched = {}
+
+
+def _save():
+    os.makedirs(CAP_DIR, exist_ok=True)
+    tmp = SHARES_FILE + '.tmp'
+    _history.to_parquet(tmp, index=False)
+    os.replace(tmp, SHARES_FILE)
+    tmp = FETCHED_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_fetched, f)
+    os.replace(tmp, FETCHED_FILE)
+
+
+def _parse_history(symbol, df):
+    """整理一只股票的股本变动历史"""
+    if df is None or df.empty:
+        return None
+    return pd.DataFrame({
+        '股票代码': symbol,
+        '变动日期': pd.to_datetime(df['变动日期'], errors='coerce').values,
+        '总股本': pd.to_numeric(df['总股本'], errors='coerce').values * SHARE_UNIT,
+    }).dropna()
+
+
+def update(symbols, end_date=None, force=False):
+    """补齐股本变动历史：没下载过、或下载日期早于 end_date 的股票重新下载，返回请求数；
+    有股票下载失败时保存其余股票后抛出 fetch_engine.FetchFailed"""
+    global _history
+    needed = pd.to_datetime(end_date or datetime.now()).strftime('%Y%m%d')
+    today = datetime.now().strftime('%Y%m%d')
+    with _lock:
+        _load()
+        todo = [s for s in symbols if force or _fetched.get(s, '') < min(needed, today)]
+        if not todo or READ_ONLY:
+            return 0
+        frames, failed = [], {}
+        results = fetch_engine.fetch_many(ak.stock_share_change_cninfo, [
+            dict(symbol=s, start_date='19900101', end_date=today) for s in todo
+        ])
+        for symbol, df in zip(todo, results):
+            if isinstance(df, Exception):
+                print(f"获取股票{symbol}股本变动失败: {df}")
+                failed[symbol] = df
+                continue
+            df = _parse_history(symbol, df)
+            if df is not None:
+                frames.append(df)
+            _fetched[symbol] = today
+        if frames:
+            new = pd.concat(frames, ignore_index=True)
+            old = _history[~_history['股票代码'].isin(new['股票代码'].unique())]
+            _history = pd.concat([old, new], ignore_index=True) if not old.empty else new
+        _save()
+    if failed:
+        raise fetch_engine.FetchFailed(failed)
+    return len(todo)
+
+
+def append_shares(date, shares, since):
+    """用批量接口某个交易日的总股本（Series，股票代码 -> 股）补进历史已经下载到 since（上一个交易日）的股票，
+    返回新增的变动条数
+
+    与最近一次变动相比变化超过 SHARE_TOLERANCE 的记为 date 当天的一次变动；
+    这些股票的下载日期记为 date，之后截止到 date 的查询不会再重新下载整段历史。
+    下载日期早于 since 的股票中间有缺口，变动日期无法确定，不做处理，下次查询时重新下载整段历史。
+    """
+    global _history, _panel
+    day = pd.to_datetime(date)
+    prev = pd.to_datetime(since).strftime('%Y%m%d')
+    if READ_ONLY:
+        return 0
+    with _lock:
+        _load()
+        shares = shares.dropna()
+        current = [s for s, fetched in _fetched.items() if fetched >= prev]
+        shares = shares[shares.index.isin(current) & (shares > 0)]
+        if shares.empty:
+            return 0
+        latest = _history.sort_values('变动日期').drop_duplicates('股票代码', keep='last')
+        latest = latest.set_index('股票代码')['总股本'].reindex(shares.index)
+        changed = shares[~((shares - latest).abs() <= latest * SHARE_TOLERANCE)]
+        if not changed.empty:
+            new = pd.DataFrame({'股票代码': changed.index, '变动日期': day, '总股本': changed.values})
+            _history = pd.concat([_history, new], ignore_index=True) if not _history.empty else new
+        for symbol in shares.index:
+            _fetched[symbol] = max(_fetched[symbol], day.strftime('%Y%m%d'))
+        _save()
+        _panel = None
+        return len(changed)
+
+
+def shares_panel(dates, symbols):
+    """交易日×股票 的总股本矩阵：每个交易日取当天及之前最近一次变动后的总股本"""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    symbols = list(symbols)
+    with _lock:
+        _load()
+        history = _history[_history['股票代码'].isin(symbols)]
+    if history.empty:
+        return pd.DataFrame(index=dates, columns=symbols, dtype=float)
+    history = history.sort_values('变动日期').drop_duplicates(['股票代码', '变动日期'], keep='last')
+    changes = history.pivot(index='变动日期', columns='股票代码', values='总股本')
+    return changes.reindex(changes.index.union(dates)).ffill().reindex(index=dates, columns=symbols)
+
+
+def panel(start_date, end_date, symbols):
+    """交易日×股票 的市值矩阵 = 收盘价面板 × 总股本面板"""
+    symbols = list(symbols)
+    update(symbols, end_date)
+    bar_store.sync(symbols, start_date, end_date)
+    bars = bar_store.read_window(start_date, end_date, symbols)
+    if bars.empty:
+        return pd.DataFrame(columns=symbols, dtype=float)
+    close = bars.pivot(index='日期', columns='股票代码', values='收盘').reindex(columns=symbols)
+    close.index = pd.to_datetime(close.index)
+    return close * shares_panel(close.index, symbols)
+
+
+def load_panel(start_date, end_date, symbols):
+    """预先算好一段区间的市值矩阵，之后 on() 在区间内直接查表"""
+    global _panel, _panel_symbols
+    result = panel(start_date, end_date, symbols)
+    with _lock:
+        _panel, _panel_symbols = result, set(symbols)
+    return result
+
+
+def on(date, symbols):
+    """一批股票在 date 当天的市值，返回以股票代码为索引的 Series，没有行情的为 NaN"""
+    day = pd.Timestamp(pd.to_datetime(date).date())
+    symbols = list(symbols)
+    with _lock:
+        cached, cached_symbols = _panel, _panel_symbols
+    if cached is not None and day in cached.index and cached_symbols.issuperset(symbols):
+        values = cached.loc[day]
+    else:
+        values = panel(day, day, symbols).reindex([day]).iloc[0]
+    return values.reindex(symbols).rename('总市值')
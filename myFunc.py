@@ -1,4 +1,8 @@
 # 这是我的聚宽量化的常用函数库
+import re
+
+import numpy as np
+import pandas as pd
 
 # 获取今日全部股票
 def get_all_stocks(context):
@@ -59,51 +63,89 @@ def filter_stocks_by_fundamentals(context, stock_list):
     )['code'].tolist()
     return stock_list
 
+# 统计概念热度时要过滤掉的概念（概念名称包含其中任何一个词即过滤，类似SQL的LIKE）
+CONCEPT_FILTER_KEYWORDS = ['融资融券', '深股通', '国企改革', '转融券标的', '创投',
+                           '独角兽', '上海国资改革', '沪股通', '预增']
+CONCEPT_FILTER_PATTERN = re.compile('|'.join(map(re.escape, CONCEPT_FILTER_KEYWORDS)))
+# 股票的概念成分很少变化，距离上次查询超过这么多天才重新查询
+CONCEPT_REFRESH_DAYS = 7
+
+
+class ConceptStore:
+    """概念成分表：记录每只股票所属的概念（股票、概念代码、概念名称、查询日期），
+    以及 概念代码 -> 成分股 的倒排索引。概念用整数编号，统计热度时直接对编号计数。"""
+
+    def __init__(self):
+        self.concept_codes = []       # 编号 -> 概念代码
+        self.concept_names = []       # 编号 -> 概念名称
+        self.excluded = []            # 编号 -> 是否被关键词过滤
+        self._concept_ids = {}        # 概念代码 -> 编号
+        self.stock_concepts = {}      # 股票 -> 所属概念编号数组
+        self.fetched_on = {}          # 股票 -> 查询日期
+        self.members = {}             # 概念代码 -> 成分股集合
+
+    def _concept_id(self, code, name):
+        concept_id = self._concept_ids.get(code)
+        if concept_id is None:
+            concept_id = len(self.concept_codes)
+            self._concept_ids[code] = concept_id
+            self.concept_codes.append(code)
+            self.concept_names.append(name)
+            # 每个概念名称只在第一次出现时用预编译的正则判断一次
+            self.excluded.append(bool(CONCEPT_FILTER_PATTERN.search(name)))
+        return concept_id
+
+    def update(self, stock_list, date):
+        """只查询从没查过、或者距离上次查询超过 CONCEPT_REFRESH_DAYS 天的股票"""
+        date = pd.Timestamp(date).normalize()
+        stale = [stock for stock in stock_list
+                 if stock not in self.fetched_on
+                 or (date - self.fetched_on[stock]).days >= CONCEPT_REFRESH_DAYS]
+        if not stale:
+            return 0
+        concepts_data = get_concept(stale, date)
+        for stock in stale:
+            concepts = concepts_data.get(stock, {}).get('jq_concept', [])
+            ids = np.array([self._concept_id(c['concept_code'], c['concept_name']) for c in concepts], dtype=np.int64)
+            for concept_id in self.stock_concepts.get(stock, []):
+                self.members[self.concept_codes[concept_id]].discard(stock)
+            for concept_id in ids:
+                self.members.setdefault(self.concept_codes[concept_id], set()).add(stock)
+            self.stock_concepts[stock] = ids
+            self.fetched_on[stock] = date
+        return len(stale)
+
+    def table(self):
+        """概念成分表：股票、概念代码、概念名称、查询日期"""
+        rows = [(stock, self.concept_codes[i], self.concept_names[i], self.fetched_on[stock])
+                for stock, ids in self.stock_concepts.items() for i in ids]
+        return pd.DataFrame(rows, columns=['stock', 'concept_code', 'concept_name', 'date'])
+
+    def heat(self, stock_list):
+        """stock_list 中每个概念（过滤后）出现的次数，按次数从多到少排列"""
+        ids = [self.stock_concepts[stock] for stock in stock_list if stock in self.stock_concepts]
+        if not ids:
+            return pd.DataFrame(columns=['concept_code', 'concept_name', 'count'])
+        counts = np.bincount(np.concatenate(ids), minlength=len(self.concept_codes))
+        counts[np.asarray(self.excluded, dtype=bool)] = 0
+        hit = np.flatnonzero(counts)
+        if len(hit) == 0:
+            return pd.DataFrame(columns=['concept_code', 'concept_name', 'count'])
+        hit = hit[np.argsort(-counts[hit], kind='stable')]
+        return pd.DataFrame({
+            'concept_code': np.asarray(self.concept_codes, dtype=object)[hit],
+            'concept_name': np.asarray(self.concept_names, dtype=object)[hit],
+            'count': counts[hit],
+        })
+
+
+concept_store = ConceptStore()
+
 # 获取股票列表的概念。每个股票有多个概念，每个概念出现一次则计数+1，统计概念出现的次数，最终得到一组数据，列分别是概念名称和出现次数
 def get_concepts(context, stock_list):
-    # 预定义要过滤的关键词（列表）
-    filter_keywords = ['融资融券', '深股通', '国企改革', '转融券标的', '创投', 
-                      '独角兽', '上海国资改革', '沪股通', '预增']
-    
-    # 获取所有股票的概念数据
-    concepts_data = get_concept(stock_list, context.current_dt)
-    
-    # 创建字典来存储概念计数
-    concept_dict = {}
-    
-    # 遍历每个股票的概念
-    for stock in concepts_data:
-        for concept in concepts_data[stock]['jq_concept']:
-            concept_name = concept['concept_name']
-            
-            # 检查概念名称是否包含任何过滤关键词
-            should_filter = False
-            for keyword in filter_keywords:
-                if keyword in concept_name:  # 模糊匹配，类似SQL的LIKE
-                    should_filter = True
-                    break
-            
-            if should_filter:
-                continue
-                
-            concept_code = concept['concept_code']
-            
-            # 使用字典更新计数
-            if concept_code in concept_dict:
-                concept_dict[concept_code]['count'] += 1
-            else:
-                concept_dict[concept_code] = {
-                    'concept_code': concept_code,
-                    'concept_name': concept_name,
-                    'count': 1
-                }
-    
-    # 将字典转换为DataFrame并排序
-    if not concept_dict:
-        return pd.DataFrame(columns=['concept_code', 'concept_name', 'count'])
-        
-    df = pd.DataFrame(list(concept_dict.values()))
-    df = df.sort_values('count', ascending=False)
+    # 成分没变的股票不再重复查询，计数是对概念编号的一次 bincount
+    concept_store.update(stock_list, context.current_dt)
+    df = concept_store.heat(stock_list)
     print(df)
     
-    return df
\ No newline at end of file
+    return df
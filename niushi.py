@@ -14,10 +14,21 @@
 # 标题：首版突破、一进二
 # 作者：klaus5
 
+from collections import deque
 from datetime import timedelta
 
+import numpy as np
+import pandas as pd
 from jqdata import *
 
+# pick_high_limit 用到的收盘价窗口长度：{窗口: 是否需要最小值（算振幅）}
+WINDOWS = {300: True, 50: False, 10: True}
+
+# 增量计算用的状态放在模块变量里而不是 g 里：g 会被序列化保存，自定义类的实例在策略代码修改后可能无法还原。
+# 模块变量在模拟盘重启后为空，缺少的股票会重新取数建立，结果不变。
+_windows = {}  # dict：{股票代码：RollingWindow}，只在 g.window_date 为上一个交易日时有效
+_intraday = {}  # dict：{股票代码：IntradayState}，持仓股当天的分钟线累计，按 state.day 判断是否有效
+
 
 def initialize(context):
     # 开启防未来函数
@@ -31,6 +42,9 @@ def initialize(context):
 
     g.help_stock = {}  # dict：{股票代码：今日涨停价}
     g.max_stock_num = 2  # 持仓20只
+    # 增量维护每只股票的滚动最大/最小值，每天只加入前一天的收盘价；False 时每天重新取300天收盘价计算
+    g.incremental_window = True
+    g.window_date = None  # 滚动窗口已经加入到的交易日
 
     run_daily(before_market_open, time='before_open', reference_security='000300.XSHG')
     # run_daily(market_run, time='every_bar', reference_security='000300.XSHG')
@@ -61,38 +75,27 @@ def market_run(context):
     if not holdings:
         return
 
-    # 昨日数据
-    df_pre = get_price(holdings, count=1, end_date=context.previous_date, frequency='daily',
-                       fields=['close', 'high_limit'], panel=False).set_index('code')
-
-    # 今天数据
-    today_start = context.current_dt.replace(hour=9, minute=31, second=0)
-    df_all_day = get_price(holdings, start_date=today_start, end_date=context.current_dt,
-                           frequency='1m', fields=['high', 'close', 'high_limit'], panel=False)
-    # 今日目前最高价
-    s_high_today = df_all_day.groupby('code')['high'].max()
-    # 今日目前涨停的分钟数
-    s_count_limit_all_day = df_all_day.groupby('code').apply(lambda x: (x.close == x.high_limit).sum())
-    # 今天前10分钟涨停的分钟数
-    s_count_limit_first_10m = df_all_day.groupby('code').apply(lambda x: (x.close == x.high_limit)[:10].sum())
+    # 昨日收盘价、涨停价，今日开盘价，以及截至当前分钟的最高价和涨停分钟数
+    states = update_intraday(context, holdings)
 
     curr_data = get_current_data()
     for stock in holdings:
+        state = states[stock]
         current_price = curr_data[stock].last_price
-        day_open_price = curr_data[stock].day_open
+        day_open_price = state.day_open
         day_high_limit = curr_data[stock].high_limit
         day_low_limit = curr_data[stock].low_limit
         if current_price <= day_low_limit:  # 已经跌停，卖不掉了
             continue
 
         # 昨日收盘价，昨日涨停价
-        pre_close = df_pre['close'][stock]
-        pre_high_limit = df_pre['high_limit'][stock]
+        pre_close = state.pre_close
+        pre_high_limit = state.pre_high_limit
 
         # 今日数据
-        high_all_day = s_high_today[stock]  # 今天最高价
-        count_limit_all_day = s_count_limit_all_day[stock]
-        count_limit_before10 = s_count_limit_first_10m[stock]
+        high_all_day = state.high  # 今天最高价
+        count_limit_all_day = state.count_limit  # 今日目前涨停的分钟数
+        count_limit_before10 = state.count_limit_first_10m  # 今天前10分钟涨停的分钟数
         # 成本数据
         cost = context.portfolio.positions[stock].avg_cost
         if current_price >= cost * 2:
@@ -121,6 +124,66 @@ def market_run(context):
             order_target(stock, 0)
 
 
+class IntradayState(object):
+    """一只持仓股当天的分钟线累计：最高价、涨停分钟数、前10分钟涨停分钟数，以及当天不变的开盘价和昨日收盘价、涨停价"""
+
+    def __init__(self, day, pre_close, pre_high_limit, day_open):
+        self.day = day
+        self.pre_close = pre_close
+        self.pre_high_limit = pre_high_limit
+        self.day_open = day_open
+        self.high = np.nan
+        self.count_limit = 0
+        self.count_limit_first_10m = 0
+        self.minutes = 0  # 已经加入的分钟数
+        self.last_dt = None  # 已经加入到的时间
+
+    def update(self, highs, closes, high_limits):
+        for high, close, high_limit in zip(highs, closes, high_limits):
+            self.high = np.fmax(self.high, high)
+            if close == high_limit:
+                self.count_limit += 1
+                if self.minutes < 10:
+                    self.count_limit_first_10m += 1
+            self.minutes += 1
+
+
+def update_intraday(context, holdings):
+    # type: (Context, list) -> dict
+    """把 holdings 上次更新之后的新分钟线加入 _intraday，返回 {股票代码：IntradayState}
+
+    每分钟一般只取一根新的分钟线；当天第一次遇到的持仓从 9:31 开始补齐。
+    """
+    global _intraday
+    today = context.current_dt.date()
+    states = {code: state for code, state in _intraday.items() if code in holdings and state.day == today}
+    new_stocks = [code for code in holdings if code not in states]
+    if new_stocks:
+        df_pre = get_price(new_stocks, count=1, end_date=context.previous_date, frequency='daily',
+                           fields=['close', 'high_limit'], panel=False).set_index('code')
+        curr_data = get_current_data()
+        for code in new_stocks:
+            states[code] = IntradayState(today, df_pre['close'][code], df_pre['high_limit'][code],
+                                         curr_data[code].day_open)
+
+    # 按上次更新到的时间分组，通常所有持仓都停在上一分钟，只需一次查询
+    today_start = context.current_dt.replace(hour=9, minute=31, second=0)
+    groups = {}
+    for code, state in states.items():
+        start = state.last_dt + timedelta(minutes=1) if state.last_dt else today_start
+        if start <= context.current_dt:
+            groups.setdefault(start, []).append(code)
+    for start, codes in groups.items():
+        df_bars = get_price(codes, start_date=start, end_date=context.current_dt,
+                            frequency='1m', fields=['high', 'close', 'high_limit'], panel=False)
+        for code, bars in df_bars.groupby('code'):
+            states[code].update(bars['high'].values, bars['close'].values, bars['high_limit'].values)
+        for code in codes:
+            states[code].last_dt = context.current_dt
+    _intraday = states
+    return states
+
+
 def function_buy(context, stock):
     # type: (Context, str) -> None
     open_cash = 0
@@ -167,26 +230,23 @@ def pick_high_limit(context, stocks):
     # type: (Context, list) -> dict
     end_date = context.previous_date
     df_pre = get_price(stocks, end_date=end_date, frequency='daily',
-                       fields=['close', 'high_limit'], count=1, panel=False
-                       ).query('close < high_limit').set_index('code')  # 昨日未涨停
+                       fields=['close', 'high_limit'], count=1, panel=False).set_index('code')
+    if g.incremental_window:
+        df_window = update_windows(context, stocks, df_pre['close'])
+    df_pre = df_pre.query('close < high_limit')  # 昨日未涨停
     s_pre_close = df_pre['close']
     stock_list = df_pre.index.tolist()
 
-    df_day_300 = get_price(stock_list, end_date=end_date, frequency='daily',
-                           fields=['close'], count=300, panel=False)
-    s_high_300 = df_day_300.groupby('code')['close'].apply(lambda x: x.max())  # 过去300个交易日close的最大值
-    # 过去300个交易日close的振幅
-    s_rate_300 = df_day_300.groupby('code')['close'].apply(lambda x: x.max() / x.min() - 1)
-
-    s_high_50 = df_day_300.groupby('code')['close'].apply(lambda x: x[-50:].max())  # 过去50个交易日close的最大值
-
-    s_high_10 = df_day_300.groupby('code')['close'].apply(lambda x: x[-10:].max())  # 过去10个交易日close的最大值
-    # 过去10个交易日close的振幅
-    s_rate_10 = df_day_300.groupby('code')['close'].apply(lambda x: x[-10:].max() / x[-10:].min() - 1)
+    if not g.incremental_window:
+        df_day_300 = get_price(stock_list, end_date=end_date, frequency='daily',
+                               fields=['close'], count=300, panel=False)
+        closes = df_day_300.pivot(index='code', columns='time', values='close')
+        df_window = window_stats(closes.values, closes.index)
 
+    # 过去300/50/10个交易日close的最大值，过去300/10个交易日close的振幅
     target_list = pd.DataFrame(
-        {'pre_close': s_pre_close, 'high_300': s_high_300, 'rate_300': s_rate_300,
-         'high_50': s_high_50, 'high_10': s_high_10, 'rate_10': s_rate_10
+        {'pre_close': s_pre_close, 'high_300': df_window['high_300'], 'rate_300': df_window['rate_300'],
+         'high_50': df_window['high_50'], 'high_10': df_window['high_10'], 'rate_10': df_window['rate_10']
          }
     ).dropna().query(
         'pre_close * 1.2 > high_300 and pre_close * 1.2 > high_50 and pre_close * 1.1 > high_10 and '
@@ -197,3 +257,107 @@ def pick_high_limit(context, stocks):
     dict_high_limit = get_price(target_list, end_date=context.current_dt, fields=['high_limit'],
                                 count=1, panel=False).set_index('code')['high_limit'].to_dict()
     return dict_high_limit
+
+
+def window_stats(closes, codes):
+    # type: (np.ndarray, list) -> pd.DataFrame
+    """closes 为 股票×交易日 的收盘价矩阵（最后一列为最近一天），一次算出各窗口的最大值和振幅，NaN 不参与计算"""
+    missing = np.isnan(closes)
+    highs = np.where(missing, -np.inf, closes)
+    lows = np.where(missing, np.inf, closes)
+    result = {}
+    for window, need_min in WINDOWS.items():
+        high = highs[:, -window:].max(axis=1)
+        high[np.isinf(high)] = np.nan
+        result['high_%d' % window] = high
+        if need_min:
+            low = lows[:, -window:].min(axis=1)
+            low[np.isinf(low)] = np.nan
+            result['rate_%d' % window] = high / low - 1
+    return pd.DataFrame(result, index=codes)
+
+
+class RollingWindow(object):
+    """一只股票收盘价在各窗口上的滚动最大/最小值，用单调队列维护，每加入一天均摊 O(1)"""
+
+    def __init__(self):
+        self.n = 0  # 已经加入的天数
+        self.max_queues = {window: deque() for window in WINDOWS}
+        self.min_queues = {window: deque() for window, need_min in WINDOWS.items() if need_min}
+
+    @classmethod
+    def from_closes(cls, values):
+        # type: (np.ndarray) -> RollingWindow
+        """用一段历史收盘价直接建立队列，结果与逐个 push 相同"""
+        rolling = cls()
+        rolling.n = len(values)
+        for window, q in rolling.max_queues.items():
+            q.extend(_monotonic_queue(values, window, 1))
+        for window, q in rolling.min_queues.items():
+            q.extend(_monotonic_queue(values, window, -1))
+        return rolling
+
+    def push(self, value):
+        t = self.n
+        self.n += 1
+        if value == value:  # NaN（未上市）不进队列
+            for q in self.max_queues.values():
+                while q and q[-1][1] <= value:
+                    q.pop()
+                q.append((t, value))
+            for q in self.min_queues.values():
+                while q and q[-1][1] >= value:
+                    q.pop()
+                q.append((t, value))
+        for queues in (self.max_queues, self.min_queues):
+            for window, q in queues.items():
+                while q and q[0][0] <= t - window:
+                    q.popleft()
+
+    def stats(self):
+        result = {}
+        for window in WINDOWS:
+            q = self.max_queues[window]
+            high = q[0][1] if q else np.nan
+            result['high_%d' % window] = high
+            if window in self.min_queues:
+                q = self.min_queues[window]
+                result['rate_%d' % window] = high / q[0][1] - 1 if q else np.nan
+        return result
+
+
+def _monotonic_queue(values, window, sign):
+    # type: (np.ndarray, int, int) -> list
+    """单调队列的内容：最后 window 天中严格大于（sign=1）或严格小于（sign=-1）其后所有值的 (序号, 值)"""
+    start = max(len(values) - window, 0)
+    tail = values[start:] * sign
+    tail = np.where(np.isnan(tail), -np.inf, tail)
+    later = np.append(np.maximum.accumulate(tail[::-1])[::-1][1:], -np.inf)
+    return [(start + i, values[start + i]) for i in np.flatnonzero(tail > later)]
+
+
+def update_windows(context, stocks, s_close):
+    # type: (Context, list, pd.Series) -> pd.DataFrame
+    """把前一个交易日的收盘价 s_close 加入 _windows，返回 stocks 的各窗口统计
+
+    只保留今天 stocks 里的股票；新出现的股票（或中间漏了交易日、重启后全部股票）用过去300天收盘价重新建立队列。
+    """
+    global _windows
+    end_date = context.previous_date
+    last_date = get_trade_days(end_date=end_date, count=2)[0]
+    if g.window_date != last_date:
+        _windows = {}
+    _windows = {code: _windows[code] for code in stocks if code in _windows}
+    for code, window in _windows.items():
+        window.push(s_close.get(code, np.nan))
+
+    new_stocks = [code for code in stocks if code not in _windows]
+    if new_stocks:
+        df_day_300 = get_price(new_stocks, end_date=end_date, frequency='daily',
+                               fields=['close'], count=max(WINDOWS), panel=False)
+        closes = df_day_300.pivot(index='code', columns='time', values='close')
+        for code, values in zip(closes.index, closes.values):
+            _windows[code] = RollingWindow.from_closes(values)
+    g.window_date = end_date
+    df_window = pd.DataFrame.from_dict({code: window.stats() for code, window in _windows.items()}, orient='index')
+    return df_window.sort_index()
@@ -0,0 +1,179 @@
+# 声明式分阶段筛选
+# 每个数据源声明单只股票的估计请求成本，每个筛选阶段声明依赖哪些数据源和判断条件。
+# 运行时每一步都挑“单位成本淘汰股票最多”的阶段先执行，只为上一步的幸存者批量取数，
+# 并记录每个阶段的输入/输出数量、耗时和实际请求数，通过率会在多次运行之间不断修正。
+# 取数或判断出错的股票既不算入选也不算淘汰，单独列出，续跑时重新处理；
+# 批量数据源里下载失败的股票由 batch_source 标记为出错，不会当成缺数据淘汰。
+import time
+import concurrent.futures
+
+import fetch_engine
+
+
+class FetchError:
+    """某只股票取数失败的标记：这只股票不再参与后面的判断，也不算处理完成"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def __repr__(self):
+        return f"FetchError({self.error!r})"
+
+
+class DataSource:
+    """数据源：fetch(codes, date) 返回 {股票: 数据}，cost 为单只股票的估计请求数"""
+
+    def __init__(self, name, fetch, cost):
+        self.name = name
+        self.fetch = fetch
+        self.cost = cost
+
+
+def per_stock_source(name, func, cost):
+    """把逐只股票的取数函数 func(stock, date) 包装成并发批量取数的数据源"""
+    def safe(code, date):
+        try:
+            return func(code, date)
+        except Exception as e:
+            return FetchError(e)
+
+    def fetch(codes, date):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_engine.MAX_CONCURRENCY) as executor:
+            return dict(zip(codes, executor.map(lambda code: safe(code, date), codes)))
+    return DataSource(name, fetch, cost)
+
+
+def batch_source(name, func, cost):
+    """把批量取数函数 func(stocks, date) -> {股票: 数据} 包装成数据源：部分股票下载失败（fetch_engine.FetchFailed）时
+    这些股票记为 FetchError，其余股票再取一次（已经下载保存的不会重复请求）"""
+    def fetch(codes, date):
+        try:
+            return func(codes, date)
+        except fetch_engine.FetchFailed as e:
+            failed = {code: FetchError(e.failed[code]) for code in codes if code in e.failed}
+            if not failed:
+                raise
+            rest = [code for code in codes if code not in failed]
+            result = fetch(rest, date) if rest else {}
+            result.update(failed)
+            return result
+    return DataSource(name, fetch, cost)
+
+
+class Stage:
+    """筛选阶段：predicate 接收 {数据源名: 数据}，返回是否保留；pass_rate 为通过率的初始估计"""
+
+    def __init__(self, name, deps, predicate, pass_rate=0.5):
+        self.name = name
+        self.deps = list(deps)
+        self.predicate = predicate
+        self.pass_rate = pass_rate
+
+
+class StageStats:
+    """单个阶段的累计计数"""
+
+    def __init__(self):
+        self.runs = 0
+        self.stocks_in = 0
+        self.stocks_out = 0
+        self.seconds = 0.0
+        self.requests = 0
+
+
+class Pipeline:
+    def __init__(self, sources, stages, learning_rate=0.5):
+        self.sources = {source.name: source for source in sources}
+        self.stages = list(stages)
+        self.learning_rate = learning_rate
+        self.stats = {stage.name: StageStats() for stage in self.stages}
+        self.last_run = []
+        self.last_failed = {}
+
+    def _marginal_cost(self, stage, fetched):
+        return sum(self.sources[dep].cost for dep in stage.deps if dep not in fetched)
+
+    def _next_stage(self, remaining, fetched):
+        """单位成本淘汰率最高的阶段优先：(1 - 通过率) / 尚未取数的依赖成本"""
+        def score(stage):
+            cost = max(self._marginal_cost(stage, fetched), 1e-6)
+            return (1 - stage.pass_rate) / cost
+        return max(remaining, key=score)
+
+    def order(self):
+        """按当前的通过率估计给出的执行顺序"""
+        remaining, fetched, order = list(self.stages), set(), []
+        while remaining:
+            stage = self._next_stage(remaining, fetched)
+            remaining.remove(stage)
+            fetched.update(stage.deps)
+            order.append(stage.name)
+        return order
+
+    def run(self, codes, date, on_done=None):
+        """依次执行各阶段，返回 (入选股票列表, {股票: {数据源名: 数据}})
+
+        第二项包含全部输入股票，每只股票只有它被淘汰之前取到的数据源。
+        传入 on_done(股票, 是否入选, 数据) 时，每只股票一有结论（被淘汰或通过全部阶段）就回调一次；
+        取数或判断出错的股票不回调，记在 last_failed {股票: 错误} 中。
+        """
+        survivors = list(codes)
+        values = {code: {} for code in survivors}
+        remaining, fetched = list(self.stages), set()
+        self.last_run = []
+        self.last_failed = {}
+        while remaining and survivors:
+            stage = self._next_stage(remaining, fetched)
+            remaining.remove(stage)
+            start = time.time()
+            requests_before = fetch_engine.total_requests()
+            for dep in stage.deps:
+                if dep in fetched:
+                    continue
+                data = self.sources[dep].fetch(survivors, date)
+                for code in survivors:
+                    values[code][dep] = data.get(code)
+            fetched.update(stage.deps)
+
+            kept = []
+            for code in survivors:
+                errors = [values[code][dep] for dep in stage.deps if isinstance(values[code][dep], FetchError)]
+                if errors:
+                    print(f"阶段 {stage.name} 获取股票 {code} 数据失败: {errors[0].error}")
+                    self.last_failed[code] = errors[0].error
+                    continue
+                try:
+                    passed = stage.predicate(values[code])
+                except Exception as e:
+                    print(f"阶段 {stage.name} 判断股票 {code} 时发生错误: {e}")
+                    self.last_failed[code] = e
+                    continue
+                if passed:
+                    kept.append(code)
+                elif on_done is not None:
+                    on_done(code, False, values[code])
+
+            elapsed = time.time() - start
+            requests = fetch_engine.total_requests() - requests_before
+            stats = self.stats[stage.name]
+            stats.runs += 1
+            stats.stocks_in += len(survivors)
+            stats.stocks_out += len(kept)
+            stats.seconds += elapsed
+            stats.requests += requests
+            self.last_run.append((stage.name, len(survivors), len(kept), elapsed, requests))
+            # 用本次观察到的通过率修正估计，供下次排序使用
+            observed = len(kept) / len(survivors)
+            stage.pass_rate += self.learning_rate * (observed - stage.pass_rate)
+            survivors = kept
+        if on_done is not None:
+            for code in survivors:
+                on_done(code, True, values[code])
+        return survivors, values
+
+    def print_report(self):
+        """打印最近一次运行各阶段的输入/输出数量、耗时和请求数"""
+        for name, stocks_in, stocks_out, elapsed, requests in self.last_run:
+            print(f"    阶段 {name}: 输入{stocks_in} 输出{stocks_out} 耗时{elapsed:.2f}秒 请求{requests}次")
+        if self.last_failed:
+            print(f"    出错{len(self.last_failed)}只股票，未记为处理完成")
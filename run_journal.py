@@ -0,0 +1,120 @@
+# 选股运行日志
+# 每只股票处理完、每个交易日处理完都立即追加一行 JSON 到日志文件并落盘，
+# 程序中断后用 resume=True 重新打开，已完成的交易日和股票直接跳过，最后再汇总成选股结果 CSV。
+import os
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from config import DATA_DIR
+
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journal')
+# 每追加这么多条股票记录强制同步一次磁盘，交易日完成时总是同步
+FSYNC_EVERY = 100
+
+
+_SKIP = object()
+
+
+def _jsonable(value):
+    """把 numpy 标量等转换成可以写入 JSON 的值，DataFrame 之类的大对象不记录"""
+    if isinstance(value, dict):
+        items = ((k, _jsonable(v)) for k, v in value.items())
+        return {k: v for k, v in items if v is not _SKIP}
+    if isinstance(value, (list, tuple)):
+        return [v for v in map(_jsonable, value) if v is not _SKIP]
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return _SKIP
+
+
+class RunJournal:
+    def __init__(self, name, resume=False):
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self.path = os.path.join(JOURNAL_DIR, f"{name}.jsonl")
+        self._lock = threading.Lock()
+        self._stocks = {}     # {日期: {股票: 记录}}
+        self._dates = {}      # {日期: 入选股票列表}
+        self._pending = 0
+        if os.path.exists(self.path):
+            if resume:
+                self._load()
+            else:
+                # 不续跑时保留旧日志，重新开始
+                stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                os.replace(self.path, self.path[:-len('.jsonl')] + f"_{stamp}.jsonl")
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            # 中断时写了一半的最后一行直接截掉，避免后续追加的记录接在它后面
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                f.truncate(end)
+        for line in data[:end].decode('utf-8').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['type'] == 'stock':
+                self._stocks.setdefault(record['date'], {})[record['stock']] = record
+            elif record['type'] == 'date':
+                self._dates[record['date']] = record['selected']
+
+    def _append(self, record, sync):
+        line = json.dumps(_jsonable(record), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            self._pending += 1
+            if sync or self._pending >= FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+
+    def is_date_done(self, date):
+        return date in self._dates
+
+    def done_stocks(self, date):
+        """某个交易日已经处理完的股票 {股票: 记录}"""
+        return dict(self._stocks.get(date, {}))
+
+    def record_stock(self, date, stock, selected, values=None):
+        """记录一只股票的处理结果和中间数据"""
+        record = {'type': 'stock', 'date': date, 'stock': stock, 'selected': bool(selected), 'values': values or {}}
+        self._stocks.setdefault(date, {})[stock] = record
+        self._append(record, sync=False)
+
+    def finish_date(self, date, selected):
+        """记录一个交易日处理完成"""
+        self._dates[date] = list(selected)
+        self._append({'type': 'date', 'date': date, 'selected': list(selected)}, sync=True)
+
+    def results(self):
+        """已完成交易日的结果 {日期: 入选股票列表}，按日期排序"""
+        return {date: self._dates[date] for date in sorted(self._dates)}
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+class RecordBuffer:
+    """与 RunJournal 接口相同的内存缓冲，在子进程里收集记录，由主进程写入运行日志"""
+
+    def __init__(self, done=None):
+        self._done = dict(done or {})
+        self.records = []
+
+    def done_stocks(self, date):
+        return dict(self._done)
+
+    def record_stock(self, date, stock, selected, values=None):
+        self.records.append((date, stock, bool(selected), _jsonable(values or {})))
@@ -0,0 +1,152 @@
+# 选股日志
+# 筛选线程只把 (股票, 日期, 原因, 数据) 放进无锁队列就返回，不再抢 print 锁和终端输出；
+# 后台写线程批量取出记录追加到 JSONL 日志文件，并定时在控制台打印一行进度汇总。
+# 日志可以用 load() 读成 DataFrame，事后查询每只股票被淘汰的原因。
+import os
+import json
+import glob
+import time
+import queue
+import atexit
+import threading
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+from config import DATA_DIR
+
+LOG_DIR = os.path.join(DATA_DIR, 'screen_log')
+# 每次最多批量写入的记录数
+BATCH_SIZE = 1000
+# 控制台进度汇总的间隔（秒）
+PROGRESS_SECONDS = 5.0
+SELECTED = '入选'
+ERROR = '错误'
+
+_queue = queue.SimpleQueue()
+_start_lock = threading.Lock()
+_writer = None
+_path = None
+_counts = {}         # {日期: Counter(原因)}，只由写线程修改
+_dirty = set()       # 上次汇总之后有新记录的日期
+
+
+def log(stock, date, reason, **values):
+    """记录一只股票的筛选结果，reason 为淘汰原因或 SELECTED"""
+    _ensure_writer()
+    _queue.put((time.time(), stock, date, reason, values))
+
+
+def error(stock, date, message):
+    """记录取数等过程中的错误（不计入已处理股票数）"""
+    log(stock, date, ERROR, error=str(message))
+
+
+def _ensure_writer():
+    global _writer, _path
+    if _writer is not None:
+        return
+    with _start_lock:
+        if _writer is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            _path = os.path.join(LOG_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+            _writer = threading.Thread(target=_run, name='screen-log-writer', daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+
+def _jsonable(value):
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value if isinstance(value, (bool, int, float, str, type(None))) else str(value)
+
+
+def _write(batch, f):
+    lines = []
+    for ts, stock, date, reason, values in batch:
+        record = {'time': ts, 'stock': stock, 'date': date, 'reason': reason}
+        record.update({key: _jsonable(value) for key, value in values.items()})
+        lines.append(json.dumps(record, ensure_ascii=False))
+        _counts.setdefault(date, Counter())[reason] += 1
+        _dirty.add(date)
+    f.write('\n'.join(lines) + '\n')
+    f.flush()
+
+
+def _format(date):
+    counts = _counts.get(date, Counter())
+    total = sum(counts.values()) - counts[ERROR]
+    rejected = ', '.join(f"{reason}{n}" for reason, n in counts.most_common() if reason not in (SELECTED, ERROR))
+    line = f"[进度] {date}: 已处理{total}只, 入选{counts[SELECTED]}只"
+    if rejected:
+        line += f", 淘汰 {rejected}"
+    if counts[ERROR]:
+        line += f", 错误{counts[ERROR]}次"
+    return line
+
+
+def _run():
+    last_report = time.time()
+    with open(_path, 'a', encoding='utf-8') as f:
+        while True:
+            batch, waiters = [], []
+            try:
+                item = _queue.get(timeout=PROGRESS_SECONDS)
+                while True:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+                    if len(batch) >= BATCH_SIZE:
+                        break
+                    item = _queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                _write(batch, f)
+            if _dirty and time.time() - last_report >= PROGRESS_SECONDS:
+                for date in sorted(_dirty):
+                    print(_format(date))
+                _dirty.clear()
+                last_report = time.time()
+            for event in waiters:
+                event.set()
+
+
+def flush(timeout=30):
+    """等待队列里已有的记录全部写入文件"""
+    if _writer is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+def summary(date):
+    """写完已有记录后返回某个交易日的汇总：{原因: 股票数}"""
+    flush()
+    return dict(_counts.get(date, Counter()))
+
+
+def print_summary(date):
+    """写完已有记录后在控制台打印某个交易日的汇总"""
+    flush()
+    print(_format(date))
+    _dirty.discard(date)
+
+
+def load(path=None):
+    """读取日志为 DataFrame；不指定 path 时读取日志目录下的全部日志文件"""
+    paths = [path] if path else sorted(glob.glob(os.path.join(LOG_DIR, '*.jsonl')))
+    records = []
+    for p in paths:
+        with open(p, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return pd.DataFrame.from_records(records)
@@ -1,4 +1,4 @@
-import akshare as ak
+import market_cap
 
 # stock_individual_info_em_df = ak.stock_individual_info_em(symbol="000001")
 # print(stock_individual_info_em_df)
@@ -10,23 +10,19 @@ import akshare as ak
 
 def market_value(stock_code, target_date):
     try:
-        # 获取股票的总股本信息
-        stock_info_df = ak.stock_individual_info_em(symbol=stock_code)
-        total_shares = stock_info_df.iloc[2, 1]
-
-        # 获取指定日期的收盘价
-        hangqing = ak.stock_zh_a_hist(symbol=stock_code, period="daily", start_date=target_date, end_date=target_date, adjust="")
+        # 按股本变动历史取 target_date 当时的总股本，乘以当日收盘价
+        market_value = market_cap.on(target_date, [stock_code]).iloc[0]
         print(target_date)
-        closing_price = hangqing["收盘"].iloc[0]
-
-        # 计算市值
-        market_value = total_shares * closing_price
 
         return market_value
 
     except Exception as e:
         print(f"计算股票 {stock_code} 在 {target_date} 的市值时出现错误: {e}")
         return None
+
+def market_values(stock_codes, target_date):
+    """批量计算一批股票在 target_date 的市值，返回以股票代码为索引的 Series"""
+    return market_cap.on(target_date, stock_codes)
     
 a=market_value("000001", "20241129")
 print(a)
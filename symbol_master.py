@@ -0,0 +1,122 @@
+# 股票基础信息表
+# 代码、名称、交易所前缀（sh/sz/bj）、板块、上市日期，每个进程只加载一次，跨天自动刷新。
+# 按代码查询走字典，O(1)。
+import threading
+from datetime import date
+
+import pandas as pd
+
+from ak_cache import ak
+
+# 主板A股代码前缀（与原来 get_trading_stocks 的筛选规则一致）
+MAIN_BOARD_PATTERN = '^(600|601|603|000|001|002)'
+
+_lock = threading.Lock()
+_table = None
+_positions = {}
+_loaded_on = None
+
+
+def exchange_of(code):
+    """按代码判断交易所：上交所以6开头，深交所以0或3开头，北交所以4、8、9开头"""
+    if code.startswith('6'):
+        return 'sh'
+    if code.startswith(('0', '3')):
+        return 'sz'
+    if code.startswith(('4', '8', '9')):
+        return 'bj'
+    return None
+
+
+def board_of(code):
+    """按代码判断板块"""
+    if code.startswith('688'):
+        return '科创板'
+    if code.startswith('30'):
+        return '创业板'
+    if code.startswith(('4', '8', '92')):
+        return '北交所'
+    return '主板'
+
+
+def _listing_dates():
+    """沪深北三个交易所的上市日期，某个接口失败时跳过"""
+    sources = [
+        (lambda: ak.stock_info_sh_name_code(symbol="主板A股"), '证券代码', '上市日期'),
+        (lambda: ak.stock_info_sh_name_code(symbol="科创板"), '证券代码', '上市日期'),
+        (lambda: ak.stock_info_sz_name_code(symbol="A股列表"), 'A股代码', 'A股上市日期'),
+        (lambda: ak.stock_info_bj_name_code(), '证券代码', '上市日期'),
+    ]
+    frames = []
+    for fetch, code_col, date_col in sources:
+        try:
+            df = fetch()
+            frames.append(pd.DataFrame({
+                'code': df[code_col].astype(str).str.zfill(6),
+                'list_date': pd.to_datetime(df[date_col], errors='coerce'),
+            }))
+        except Exception as e:
+            print(f"获取上市日期失败: {e}")
+    if not frames:
+        return pd.Series(dtype='datetime64[ns]')
+    dates = pd.concat(frames, ignore_index=True).drop_duplicates('code', keep='last')
+    return dates.set_index('code')['list_date']
+
+
+def _build():
+    stock_info = ak.stock_info_a_code_name()
+    codes = stock_info['code'].astype(str).str.zfill(6)
+    table = pd.DataFrame({
+        'code': codes.values,
+        'name': stock_info['name'].values,
+        'exchange': [exchange_of(c) for c in codes],
+        'board': [board_of(c) for c in codes],
+    })
+    table['list_date'] = _listing_dates().reindex(table['code']).values
+    table['exchange'] = table['exchange'].astype('category')
+    table['board'] = table['board'].astype('category')
+    return table
+
+
+def load():
+    """返回股票基础信息表，当天已经加载过就直接返回"""
+    global _table, _positions, _loaded_on
+    with _lock:
+        if _table is None or _loaded_on != date.today():
+            _table = _build()
+            _positions = {code: i for i, code in enumerate(_table['code'])}
+            _loaded_on = date.today()
+        return _table
+
+
+def lookup(code):
+    """按代码查询一行，返回 dict；不存在时返回 None"""
+    table = load()
+    pos = _positions.get(code)
+    if pos is None:
+        return None
+    return table.iloc[pos].to_dict()
+
+
+def name(code, default="未知"):
+    """股票名称"""
+    table = load()
+    pos = _positions.get(code)
+    return default if pos is None else table['name'].iat[pos]
+
+
+def format_symbol(stock_code):
+    """给股票代码加上交易所前缀，如 '600001' -> 'sh600001'；已带前缀的原样返回，无效代码返回 None"""
+    if stock_code.startswith(('sh', 'sz', 'bj')):
+        return stock_code
+    exchange = exchange_of(stock_code)
+    if exchange in ('sh', 'sz'):
+        return exchange + stock_code
+    return None
+
+
+def main_board_codes():
+    """主板A股代码列表"""
+    table = load()
+    return table.loc[table['code'].str.match(MAIN_BOARD_PATTERN), 'code'].tolist()
+
@@ -1,6 +1,8 @@
-import akshare as ak
+from ak_cache import ak
 import datetime
 
+import announcement_store
+
 # 获取当前日期
 today = datetime.datetime.now().strftime('%Y%m%d')
 
@@ -14,25 +16,13 @@ df_stocks = ak.stock_info_a_code_name()
 #         print(f"股票代码: {row['code']}, 股票名称: {row['name']}")
 
 
+# 同步公告到本地公告库（已经同步过的日期区间不会重复下载）
+announcement_store.sync(df_stocks['code'].tolist(), "20240919", "20241119")
+
 # 存储公告的列表
-announcements = []
-for index, row in df_stocks.iterrows():
-    stock_code = row['code']
-    try:
-        # 获取该股票的公告数据
-        # bug修复: 将接口名更正为正确的名称
-        df_announcement = ak.stock_zh_a_disclosure_report_cninfo(symbol=stock_code, market="沪深京", category="公司治理", start_date="20240919", end_date="20241119")
-
-
-        for _, ann_row in df_announcement.iterrows():
-            announcements.append({
-                '股票代码': stock_code,
-                '公告标题': ann_row['announcement_title'],
-                '公告时间': ann_row['announcement_time'],
-                '公告链接': ann_row['announcement_url']
-            })
-    except Exception as e:
-        print(f"获取股票 {stock_code} 公告失败: {e}")
+table = announcement_store.table()
+table = table[(table['公告时间'] >= '2024-09-19') & (table['公告时间'] < '2024-11-20')]
+announcements = table.to_dict(orient='records')
 
 # 打印公告信息
 for ann in announcements:
@@ -1,17 +1,14 @@
-import akshare as ak
-import pandas as pd
+import announcement_store
 
 
-stock_zh_a_disclosure_report_cninfo_df = ak.stock_zh_a_disclosure_report_cninfo(symbol="603007", market="沪深京",start_date="20240101", end_date="20241122")
+announcement_store.sync(["603007"], "20240101", "20241122")
+stock_zh_a_disclosure_report_cninfo_df = announcement_store.match(['重整'], "20240101", "20241122", symbols=["603007"])
 
 print(type(stock_zh_a_disclosure_report_cninfo_df))
 # print(stock_zh_a_disclosure_report_cninfo_df)
 print(stock_zh_a_disclosure_report_cninfo_df.iloc[0:5])
 
-# 判断'公告标题'列是否包含'重整'字眼，并生成布尔掩码
-mask = stock_zh_a_disclosure_report_cninfo_df['公告标题'].str.contains('重整')
+# 全市场一次匹配多个关键词：找出标题包含'重整'、'重组'、'破产'等字眼的公告
+result_df = announcement_store.match(announcement_store.RESTRUCTURING_KEYWORDS, "20240101", "20241122")
 
-# 根据布尔掩码提取满足条件的行
-result_df = stock_zh_a_disclosure_report_cninfo_df[mask]
-
-print(result_df)
\ No newline at end of file
+print(result_df)
@@ -1,5 +1,5 @@
 import time
-import akshare as ak
+from ak_cache import ak
 import datetime
 import pandas as pd
 
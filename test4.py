@@ -1,6 +1,10 @@
-import akshare as ak
+from ak_cache import ak
 
-stock_zh_a_gdhs_df = ak.stock_zh_a_gdhs(symbol="最新").loc[:, ['代码', '总股本']]
+import holder_store
+import symbol_master
+
+# 股东户数和总股本：股票多时 data_planner 选择全市场批量接口 stock_zh_a_gdhs，每个报告期一次调用
+stock_zh_a_gdhs_df = holder_store.holder_counts("20241101", symbol_master.main_board_codes())[['总股本']]
 # print(stock_zh_a_gdhs_df)
 
 stock_hsgt_stock_statistics_em_df = ak.stock_hsgt_stock_statistics_em(symbol="北向持股", start_date="20241101", end_date="20241101")
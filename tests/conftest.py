@@ -0,0 +1,129 @@
+# 测试公共设置：数据目录指向临时目录，用离线的假 akshare 代替真实接口，请求不限速
+# 各模块在导入时就根据 DATA_DIR 算好了文件路径，所以必须在导入任何业务模块之前完成设置。
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ['STOCKS_DATA_DIR'] = tempfile.mkdtemp(prefix='stocks_test_')
+
+import fake_akshare  # noqa: E402
+
+fake_akshare.configure(universe_size=20, seed=0)
+fake_akshare.install()
+
+import fetch_engine  # noqa: E402
+
+fetch_engine.RATE_LIMITS.clear()
+fetch_engine.DEFAULT_RATE = 1e6
+
+
+@pytest.fixture
+def bar_store(tmp_path, monkeypatch):
+    """文件写到 tmp_path 下、缓存清空的 bar_store"""
+    import bar_store
+    monkeypatch.setattr(bar_store, 'BAR_DIR', str(tmp_path / 'bars'))
+    monkeypatch.setattr(bar_store, 'COVERAGE_FILE', str(tmp_path / 'bars' / '_coverage.json'))
+    monkeypatch.setattr(bar_store, '_coverage', None)
+    bar_store._partition_cache.clear()
+    yield bar_store
+    bar_store._partition_cache.clear()
+
+
+@pytest.fixture
+def announcement_store(tmp_path, monkeypatch):
+    """文件写到 tmp_path 下、缓存清空的 announcement_store"""
+    import announcement_store
+    monkeypatch.setattr(announcement_store, 'ANN_DIR', str(tmp_path / 'announcements'))
+    monkeypatch.setattr(announcement_store, 'TABLE_FILE', str(tmp_path / 'announcements' / 'announcements.parquet'))
+    monkeypatch.setattr(announcement_store, 'COVERAGE_FILE', str(tmp_path / 'announcements' / '_coverage.json'))
+    monkeypatch.setattr(announcement_store, '_table', None)
+    monkeypatch.setattr(announcement_store, '_coverage', None)
+    monkeypatch.setattr(announcement_store, '_index', None)
+    return announcement_store
+
+
+@pytest.fixture
+def holder_store(tmp_path, monkeypatch):
+    """文件写到 tmp_path 下、缓存清空的 holder_store"""
+    import holder_store
+    monkeypatch.setattr(holder_store, 'HOLDER_DIR', str(tmp_path / 'holders'))
+    monkeypatch.setattr(holder_store, 'TOP10_FILE', str(tmp_path / 'holders' / 'top10_first_ratio.json'))
+    monkeypatch.setattr(holder_store, '_top10', None)
+    monkeypatch.setattr(holder_store, '_periods', {})
+    monkeypatch.setattr(holder_store, '_unsaved', 0)
+    monkeypatch.setattr(holder_store, 'CHANGE_FILE', str(tmp_path / 'holders' / 'holder_change.parquet'))
+    monkeypatch.setattr(holder_store, 'CHANGE_FETCHED_FILE', str(tmp_path / 'holders' / 'holder_change_symbols.json'))
+    monkeypatch.setattr(holder_store, '_changes', None)
+    monkeypatch.setattr(holder_store, '_changes_fetched', None)
+    monkeypatch.setattr(holder_store, '_changes_unsaved', 0)
+    monkeypatch.setattr(holder_store, 'COUNT_FILE', str(tmp_path / 'holders' / 'holder_count.parquet'))
+    monkeypatch.setattr(holder_store, 'COUNT_FETCHED_FILE', str(tmp_path / 'holders' / 'holder_count_symbols.json'))
+    monkeypatch.setattr(holder_store, '_counts', None)
+    monkeypatch.setattr(holder_store, '_counts_fetched', None)
+    return holder_store
+
+
+@pytest.fixture
+def financial_index(tmp_path, monkeypatch):
+    """文件写到 tmp_path 下、缓存清空的 financial_index"""
+    import financial_index
+    monkeypatch.setattr(financial_index, 'FIN_DIR', str(tmp_path / 'financial'))
+    monkeypatch.setattr(financial_index, 'REPORT_FILE', str(tmp_path / 'financial' / 'report_em.parquet'))
+    monkeypatch.setattr(financial_index, 'FETCHED_FILE', str(tmp_path / 'financial' / 'report_em_symbols.json'))
+    for name in ('_history', '_fetched', '_latest', '_index'):
+        monkeypatch.setattr(financial_index, name, None)
+    return financial_index
+
+
+@pytest.fixture
+def financial_abstract(tmp_path, monkeypatch):
+    """文件写到 tmp_path 下、缓存清空的 financial_abstract"""
+    import financial_abstract
+    monkeypatch.setattr(financial_abstract, 'FIN_DIR', str(tmp_path / 'financial'))
+    monkeypatch.setattr(financial_abstract, 'ABSTRACT_FILE', str(tmp_path / 'financial' / 'abstract_ths.parquet'))
+    monkeypatch.setattr(financial_abstract, 'FETCHED_FILE', str(tmp_path / 'financial' / 'abstract_ths_symbols.json'))
+    for name in ('_history', '_fetched', '_latest'):
+        monkeypatch.setattr(financial_abstract, name, None)
+    return financial_abstract
+
+
+@pytest.fixture
+def use_bulk(monkeypatch):
+    """返回一个函数，调用之后 data_planner 不论股票多少都选全市场批量接口"""
+    import data_planner
+
+    def apply():
+        for source in data_planner.SOURCES:
+            if source.bulk:
+                monkeypatch.setattr(source, 'cost', 0)
+    return apply
+
+
+@pytest.fixture
+def calls():
+    """清零假接口的调用计数，返回读取计数的函数"""
+    fake_akshare.reset_counts()
+    return lambda endpoint: fake_akshare.call_counts().get(endpoint, 0)
+
+
+@pytest.fixture
+def lock_free():
+    """返回判断一把锁此刻是否空闲（另一个线程能否拿到）的函数"""
+    def check(lock):
+        free = []
+
+        def probe():
+            if lock.acquire(blocking=False):
+                lock.release()
+                free.append(True)
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return bool(free)
+    return check
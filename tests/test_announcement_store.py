@@ -0,0 +1,77 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def requests(announcement_store, monkeypatch):
+    """假的巨潮公告接口：每次请求返回一条起始日的公告，并记下请求的区间"""
+    seen = []
+
+    def disclosure(symbol, market, start_date, end_date):
+        seen.append((symbol, start_date, end_date))
+        return pd.DataFrame({'代码': [symbol], '公告标题': [f'关于{symbol}重整的公告'], '公告时间': [start_date]})
+
+    monkeypatch.setattr(announcement_store.ak, 'stock_zh_a_disclosure_report_cninfo', disclosure, raising=False)
+    return seen
+
+
+def test_aho_corasick_finds_overlapping_keywords(announcement_store):
+    matcher = announcement_store.AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert matcher.find('ushers') == {'he', 'she', 'hers'}
+    assert matcher.find('this') == {'his'}
+    assert matcher.find('xyz') == set()
+
+
+def test_aho_corasick_chinese_keywords(announcement_store):
+    matcher = announcement_store.AhoCorasick(['重整', '重组', '资产重组', '破产'])
+    assert matcher.find('关于重大资产重组的进展公告') == {'重组', '资产重组'}
+    assert matcher.find('关于公司被申请破产重整的提示性公告') == {'破产', '重整'}
+    assert matcher.find('关于股东减持股份的公告') == set()
+
+
+def test_sync_fetches_every_hole_once(announcement_store, requests):
+    announcement_store.sync(['600000'], '20240801', '20240805')
+    announcement_store.sync(['600000'], '20240810', '20240815')
+    del requests[:]
+    assert announcement_store.sync(['600000'], '20240801', '20240820') == 2
+    assert requests == [('600000', '20240806', '20240809'), ('600000', '20240816', '20240820')]
+    assert announcement_store._coverage['600000'] == [['20240801', '20240820']]
+    assert announcement_store.sync(['600000'], '20240801', '20240820') == 0
+
+
+def test_old_single_range_coverage_is_migrated(announcement_store, requests):
+    os.makedirs(announcement_store.ANN_DIR)
+    with open(announcement_store.COVERAGE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'600000': ['20240801', '20240810']}, f)
+    assert announcement_store.sync(['600000'], '20240801', '20240812') == 1
+    assert requests == [('600000', '20240811', '20240812')]
+    assert announcement_store._coverage['600000'] == [['20240801', '20240812']]
+
+
+def test_append_days_does_not_stretch_coverage_over_gap(announcement_store, requests):
+    announcement_store.sync(['600000'], '20240801', '20240802')
+    df = pd.DataFrame({'代码': ['600000', '000001'], '公告标题': ['关于破产清算的公告', '关于重组的公告'],
+                       '公告日期': ['2024-08-07', '2024-08-07']})
+    assert announcement_store.append_days('20240807', '20240807', df, ['600000']) == 1
+    assert announcement_store._coverage['600000'] == [['20240801', '20240802'], ['20240807', '20240807']]
+    del requests[:]
+    announcement_store.sync(['600000'], '20240801', '20240807')
+    assert requests == [('600000', '20240803', '20240806')]
+
+
+def test_match_filters_by_keyword_date_and_symbol(announcement_store, requests):
+    announcement_store.sync(['600000', '000001'], '20240801', '20240801')
+    df = pd.DataFrame({'代码': ['600000', '000001'], '公告标题': ['关于破产清算的公告', '关于回购股份的公告'],
+                       '公告日期': ['2024-08-05', '2024-08-05']})
+    announcement_store.append_days('20240805', '20240805', df, ['600000', '000001'])
+
+    result = announcement_store.match(['破产', '清算', '重整'])
+    assert list(result['股票代码']) == ['000001', '600000', '600000']
+    assert list(result['关键词']) == ['重整', '重整', '清算、破产']
+    assert announcement_store.restructuring_stocks('20240805') == ['600000']
+    assert announcement_store.match(['重整'], symbols=['600000'])['股票代码'].tolist() == ['600000']
+    assert not announcement_store.match(['回购']).empty
+    assert announcement_store.match(['不存在的词']).empty
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import fetch_engine
+
+
+def test_merge_ranges_joins_overlapping_and_adjacent(bar_store):
+    ranges = [['20240110', '20240120'], ['20240101', '20240105'], ['20240106', '20240108'],
+              ['20240115', '20240125'], ['20240201', '20240203']]
+    assert bar_store._merge_ranges(ranges) == [
+        ['20240101', '20240108'], ['20240110', '20240125'], ['20240201', '20240203']]
+
+
+def test_merge_ranges_keeps_contained_range(bar_store):
+    assert bar_store._merge_ranges([['20240101', '20240131'], ['20240105', '20240110']]) == [
+        ['20240101', '20240131']]
+
+
+def test_missing_ranges_returns_every_hole(bar_store):
+    covered = [['20240105', '20240110'], ['20240115', '20240120']]
+    assert bar_store._missing_ranges(covered, '20240101', '20240125') == [
+        ('20240101', '20240104'), ('20240111', '20240114'), ('20240121', '20240125')]
+
+
+def test_missing_ranges_inside_coverage(bar_store):
+    covered = [['20240101', '20240131']]
+    assert bar_store._missing_ranges(covered, '20240105', '20240110') == []
+    assert bar_store._missing_ranges([], '20240105', '20240110') == [('20240105', '20240110')]
+    assert bar_store._missing_ranges(covered, '20240125', '20240205') == [('20240201', '20240205')]
+
+
+def test_sync_only_requests_missing_ranges(bar_store, calls):
+    assert bar_store.sync(['600000', '000001'], '20240801', '20240809') == 2
+    assert bar_store.sync(['600000', '000001'], '20240801', '20240809') == 0
+    assert calls('stock_zh_a_hist') == 2
+
+    # 与已同步区间隔开的一段单独记录，中间的缺口在下次覆盖它时只补缺口
+    assert bar_store.sync(['600000'], '20240901', '20240906') == 1
+    assert bar_store._load_coverage()['600000'] == [['20240801', '20240809'], ['20240901', '20240906']]
+    assert bar_store.sync(['600000'], '20240805', '20240903') == 1
+    assert bar_store._load_coverage()['600000'] == [['20240801', '20240906']]
+    assert calls('stock_zh_a_hist') == 4
+
+
+def test_sync_writes_readable_partitions(bar_store):
+    bar_store.sync(['600000'], '20240805', '20240809')
+    bars = bar_store.get_bars('600000', '20240805', '20240809')
+    assert not bars.empty
+    assert set(bars['股票代码']) == {'600000'}
+    assert bars['日期'].between(pd.Timestamp('2024-08-05'), pd.Timestamp('2024-08-09')).all()
+
+
+def test_append_day_bridges_from_previous_trading_day(bar_store):
+    bar_store.sync(['600000', '000001'], '20240801', '20240802')
+    bar_store.append_day('20240805', None, ['600000', '000001', '601000'], since='20240802')
+    coverage = bar_store._load_coverage()
+    # 已同步到上一个交易日的股票把周末一起记为已同步
+    assert coverage['600000'] == [['20240801', '20240805']]
+    assert coverage['000001'] == [['20240801', '20240805']]
+    # 之前没同步过的股票只记当天，不会把缺口当成已同步
+    assert coverage['601000'] == [['20240805', '20240805']]
+
+
+def test_append_day_without_since_keeps_gap(bar_store):
+    bar_store.sync(['600000'], '20240801', '20240802')
+    bar_store.append_day('20240806', None, ['600000'])
+    assert bar_store._load_coverage()['600000'] == [['20240801', '20240802'], ['20240806', '20240806']]
+
+
+def test_sync_saves_successes_and_raises_for_failures(bar_store, monkeypatch):
+    hist = bar_store.ak.stock_zh_a_hist
+
+    def flaky(symbol, **kwargs):
+        if symbol == '000001':
+            raise KeyError('data')
+        return hist(symbol=symbol, **kwargs)
+    monkeypatch.setattr(bar_store.ak, 'stock_zh_a_hist', flaky)
+    with pytest.raises(fetch_engine.FetchFailed) as error:
+        bar_store.sync(['600000', '000001'], '20240801', '20240809')
+    assert set(error.value.failed) == {'000001'}
+    coverage = bar_store._load_coverage()
+    assert coverage['600000'] == [['20240801', '20240809']]
+    assert '000001' not in coverage
@@ -0,0 +1,30 @@
+import chongzu
+
+
+def test_trading_data_batch_reads_window_once(bar_store, monkeypatch):
+    listings, reads = [], []
+    partition_dates, read_window = bar_store.partition_dates, bar_store.read_window
+
+    def counting_listing(start_date, end_date):
+        listings.append((start_date, end_date))
+        return partition_dates(start_date, end_date)
+
+    def counting_read(start_date, end_date, symbols=None):
+        reads.append(list(symbols))
+        return read_window(start_date, end_date, symbols)
+    monkeypatch.setattr(bar_store, 'partition_dates', counting_listing)
+    monkeypatch.setattr(bar_store, 'read_window', counting_read)
+
+    data = chongzu.get_trading_data_batch(['600000', '000001'], '20240809')
+    assert reads == [['600000', '000001']]
+    assert len(listings) == 1
+    for code in ('600000', '000001'):
+        assert len(data[code]) == 6
+        assert set(data[code]['股票代码']) == {code}
+        assert data[code]['日期'].is_monotonic_increasing
+    assert chongzu.get_trading_data('600000', '20240809').equals(data['600000'])
+
+
+def test_trading_data_batch_without_bars_returns_none(bar_store, monkeypatch):
+    monkeypatch.setattr(bar_store, 'READ_ONLY', True)
+    assert chongzu.get_trading_data_batch(['600000', '000001'], '20240809') == {'600000': None, '000001': None}
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import chongzu2
+from run_journal import RecordBuffer
+
+
+@pytest.fixture
+def day(monkeypatch):
+    """三只股票的交易日：截面筛选选中 C，记录它实际筛选过的股票"""
+    monkeypatch.setattr(chongzu2, 'get_trading_stocks', lambda: ['A', 'B', 'C'])
+    monkeypatch.setattr(chongzu2, 'get_stock_data_batch', lambda date: pd.DataFrame())
+    monkeypatch.setattr(chongzu2, 'get_financial_data_batch', lambda date: {})
+    screened = []
+
+    def select(stocks, date, stock_data_batch, financial_data_batch, journal=None):
+        screened.append(list(stocks))
+        for stock in stocks:
+            journal.record_stock(date, stock, stock == 'C')
+        return [stock for stock in stocks if stock == 'C']
+    monkeypatch.setattr(chongzu2, 'select_cross_sectional', select)
+    return screened
+
+
+def test_cross_sectional_resume_skips_done_stocks(day):
+    journal = RecordBuffer({'A': {'selected': True}, 'B': {'selected': False}})
+    assert chongzu2.run_daily_selection('20240805', cross_sectional=True, journal=journal) == {'20240805': ['A', 'C']}
+    assert day == [['C']]
+    assert [stock for _, stock, _, _ in journal.records] == ['C']
+
+
+def test_cross_sectional_all_done_does_not_screen(day):
+    journal = RecordBuffer({stock: {'selected': stock == 'B'} for stock in 'ABC'})
+    assert chongzu2.run_daily_selection('20240805', cross_sectional=True, journal=journal) == {'20240805': ['B']}
+    assert day == []
+    assert journal.records == []
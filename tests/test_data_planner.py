@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+import data_planner
+
+
+def test_plan_picks_bulk_for_large_universe():
+    assert data_planner.plan(['营业收入', '净利润'], 3000, 1).name == 'stock_yjbb_em'
+    assert data_planner.plan(['营业收入', '净利润'], 5, 1).name == 'stock_financial_report_em'
+    assert data_planner.plan(['总股本', '股东户数'], 3000, 40).name == 'stock_zh_a_gdhs'
+    assert data_planner.plan(['股东户数'], 100, 40).name == 'stock_zh_a_gdhs_detail_em'
+
+
+def test_plan_prefers_bulk_on_tie_and_rejects_unknown_fields():
+    assert data_planner.plan(['营业收入'], 12, 1).bulk
+    with pytest.raises(KeyError):
+        data_planner.plan(['营业收入', '股东户数'], 10, 1)
+    with pytest.raises(KeyError):
+        data_planner.plan(['扣非净利润'], 10, 1)
+
+
+def test_periods_to_fetch_starts_after_local_history():
+    latest = {'600000': pd.Timestamp('2024-03-31'), '000001': pd.Timestamp('2024-05-15')}
+    assert data_planner.periods_to_fetch(latest, ['600000'], '20240930') == ['20240630', '20240930']
+    # 统计截止日不在季末时从下一个季末补起
+    assert data_planner.periods_to_fetch(latest, ['000001'], '20240930') == ['20240630', '20240930']
+    periods = data_planner.periods_to_fetch(latest, ['600000', '601000'], '20240930')
+    assert periods[0] == data_planner.HISTORY_START and periods[-1] == '20240930'
+    assert data_planner.periods_to_fetch(latest, ['600000'], '20240930', force=True)[0] == data_planner.HISTORY_START
+    assert data_planner.periods_to_fetch(latest, [], '20240930') == []
+
+
+def test_quarter_ends_includes_boundaries():
+    assert data_planner.quarter_ends('2024-03-31 15:00', '20240930') == ['20240331', '20240630', '20240930']
+    assert data_planner.quarter_ends('20240401', '20240629') == []
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import fetch_engine
+import financial_abstract
+
+
+def test_parse_units():
+    values = ['1.23亿', '-456.7万', '12.5%', '--', '1,234', '2万亿', '+8', None, '', 'abc', '3.2千']
+    expected = [1.23e8, -4.567e6, 12.5, np.nan, 1234.0, 2e12, 8.0, np.nan, np.nan, np.nan, np.nan]
+    result = financial_abstract.parse_units(values)
+    assert result.dtype == np.float64
+    np.testing.assert_allclose(result.values, expected)
+
+
+def test_parse_frame_keeps_only_numeric_columns():
+    df = pd.DataFrame({
+        '报告期': ['2024-03-31', '2023-12-31', 'bad'],
+        '营业总收入': ['1.5亿', '--', '2亿'],
+        '净利润同比增长率': ['10.5%', '-3%', False],
+        '备注': ['无', '无', '无'],
+        '每股收益': [0.1, 0.2, 0.3],
+    })
+    result = financial_abstract.parse_frame(df)
+    assert list(result.columns) == ['报告期', '营业总收入', '净利润同比增长率', '每股收益']
+    assert list(result['报告期']) == [pd.Timestamp('2024-03-31'), pd.Timestamp('2023-12-31')]
+    np.testing.assert_allclose(result['营业总收入'].values, [1.5e8, np.nan])
+    np.testing.assert_allclose(result['净利润同比增长率'].values, [10.5, -3.0])
+    np.testing.assert_allclose(result['每股收益'].values, [0.1, 0.2])
+
+
+def test_update_downloads_without_holding_lock(financial_abstract, monkeypatch, lock_free):
+    fetch_many = fetch_engine.fetch_many
+    seen = []
+
+    def probe(func, kwargs_list):
+        seen.append(lock_free(financial_abstract._lock))
+        return fetch_many(func, kwargs_list)
+    monkeypatch.setattr(fetch_engine, 'fetch_many', probe)
+    assert financial_abstract.update(['600000', '000001']) == 2
+    assert seen == [True]
+    latest = financial_abstract.as_of('20240805', ['600000', '000001'], ['营业总收入', '扣非净利润'])
+    assert set(latest.index) == {'600000', '000001'}
+    assert latest.notna().all().all()
+    assert financial_abstract.update(['600000', '000001']) == 0
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+import data_planner
+import fetch_engine
+
+
+def test_update_downloads_without_holding_lock(financial_index, monkeypatch, lock_free):
+    fetch_many = fetch_engine.fetch_many
+    seen = []
+
+    def probe(func, kwargs_list):
+        seen.append(lock_free(financial_index._lock))
+        return fetch_many(func, kwargs_list)
+    monkeypatch.setattr(fetch_engine, 'fetch_many', probe)
+    assert financial_index.update(['600000', '000001']) == 2
+    assert seen == [True]
+    assert set(financial_index.as_of('20240805', ['600000', '000001']).index) == {'600000', '000001'}
+    assert financial_index.update(['600000', '000001']) == 0
+
+
+SYMBOLS = ['600000', '000001', '601000']
+PERIODS = pd.to_datetime(['2024-03-31', '2024-06-30', '2024-09-30'])
+
+
+def test_bulk_update_matches_per_symbol_history(financial_index, use_bulk, calls):
+    assert financial_index.update(SYMBOLS) == 3
+    per_symbol = financial_index.reports(SYMBOLS, PERIODS)
+    as_of = financial_index.as_of('20240815', SYMBOLS)
+
+    use_bulk()
+    periods = data_planner.periods_to_fetch({}, SYMBOLS, financial_index.latest_due_period()[0])
+    assert financial_index.update(SYMBOLS, force=True) == len(periods)
+    assert calls('stock_yjbb_em') == len(periods)
+    assert calls('stock_financial_report_em') == 3
+    pd.testing.assert_frame_equal(financial_index.reports(SYMBOLS, PERIODS), per_symbol)
+    pd.testing.assert_frame_equal(financial_index.as_of('20240815', SYMBOLS), as_of)
+
+
+def test_bulk_update_only_fetches_missing_periods(financial_index, use_bulk, calls):
+    financial_index.update(SYMBOLS)
+    full = financial_index.reports(SYMBOLS, PERIODS)
+    history = financial_index._history
+    financial_index._history = history[pd.to_datetime(history['报告日期']) < '2024-06-30'].reset_index(drop=True)
+    financial_index._fetched.update(dict.fromkeys(SYMBOLS, ''))
+    financial_index._latest = financial_index._index = None
+
+    use_bulk()
+    periods = data_planner.quarter_ends('20240630', financial_index.latest_due_period()[0])
+    assert financial_index.update(SYMBOLS) == len(periods)
+    assert calls('stock_yjbb_em') == len(periods)
+    pd.testing.assert_frame_equal(financial_index.reports(SYMBOLS, PERIODS), full)
+    assert financial_index.update(SYMBOLS) == 0
+
+
+def test_bulk_failure_resumes_from_failed_period(financial_index, use_bulk, monkeypatch, calls):
+    yjbb = financial_index.data_planner.ak.stock_yjbb_em
+    failures = ['20240630']
+
+    def flaky(date):
+        if date in failures:
+            failures.remove(date)
+            raise KeyError('data')
+        return yjbb(date=date)
+    monkeypatch.setattr(financial_index.data_planner.ak, 'stock_yjbb_em', flaky)
+    monkeypatch.setattr(fetch_engine.get_engine(), 'max_retries', 0)
+    use_bulk()
+    with pytest.raises(fetch_engine.FetchFailed) as error:
+        financial_index.update(SYMBOLS)
+    assert set(error.value.failed) == set(SYMBOLS)
+    assert financial_index._fetched == {}
+    # 失败报告期之前的照常保存，之后的不保存，历史中间没有缺口
+    assert pd.to_datetime(financial_index._history['报告日期']).max() == pd.Timestamp('2024-03-31')
+
+    calls('stock_yjbb_em')
+    periods = data_planner.quarter_ends('20240630', financial_index.latest_due_period()[0])
+    assert financial_index.update(SYMBOLS) == len(periods)
+    assert set(financial_index.as_of('20241231', SYMBOLS, by='report')['report_date']) == {pd.Timestamp('2024-12-31')}
+    assert set(financial_index._fetched) == set(SYMBOLS)
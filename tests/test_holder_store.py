@@ -0,0 +1,102 @@
+import json
+
+import pandas as pd
+import pytest
+
+import fetch_engine
+
+
+def test_mark_changes_fetched_only_extends_contiguous_history(holder_store):
+    holder_store._load_changes()
+    holder_store._changes_fetched.update({'600000': '20240802', '000001': '20240725'})
+    assert holder_store.mark_changes_fetched(['600000', '000001', '601000'], '20240805', since='20240802') == 1
+    # 下载到上一个交易日的股票顺延，有缺口的和没下载过的保持不变
+    assert holder_store._changes_fetched == {'600000': '20240805', '000001': '20240725'}
+    with open(holder_store.CHANGE_FETCHED_FILE, 'r', encoding='utf-8') as f:
+        assert json.load(f) == holder_store._changes_fetched
+
+
+def test_mark_changes_fetched_never_moves_date_back(holder_store):
+    holder_store._load_changes()
+    holder_store._changes_fetched['600000'] = '20240810'
+    holder_store.mark_changes_fetched(['600000'], '20240805', since='20240802')
+    assert holder_store._changes_fetched['600000'] == '20240810'
+
+
+def test_update_changes_saves_in_batches(holder_store, monkeypatch, calls):
+    saves = []
+    save = holder_store._save_changes
+    monkeypatch.setattr(holder_store, '_save_changes', lambda: (saves.append(holder_store._changes_unsaved), save()))
+    monkeypatch.setattr(holder_store, 'SAVE_EVERY', 3)
+    symbols = ['600000', '601000', '603000', '000000', '001000']
+    for symbol in symbols:
+        assert holder_store.update_changes([symbol], end_date='20240805') == 1
+    assert saves == [3]
+    assert holder_store._changes_unsaved == 2
+    holder_store.save_changes()
+    assert saves == [3, 2]
+    assert calls('stock_holder_change') == 5
+    assert set(holder_store._changes['股票代码']) == set(symbols)
+
+    # 已经下载过的股票不再请求
+    assert holder_store.update_changes(symbols, end_date='20240805') == 0
+    assert calls('stock_holder_change') == 5
+
+
+def _top10_endpoint(holder_store, monkeypatch, error):
+    def top10(symbol, date):
+        raise error
+    monkeypatch.setattr(holder_store.ak, 'stock_gdfx_top_10_em', top10)
+    monkeypatch.setattr(fetch_engine.get_engine(), 'max_retries', 0)
+
+
+def test_first_holder_ratio_network_error_is_not_cached(holder_store, monkeypatch):
+    _top10_endpoint(holder_store, monkeypatch, ConnectionError('timeout'))
+    with pytest.raises(ConnectionError):
+        holder_store.first_holder_ratio('600000', '20240805')
+    assert 'sh600000' not in holder_store._load()
+
+
+def test_first_holder_ratio_caches_empty_settled_period(holder_store, monkeypatch):
+    _top10_endpoint(holder_store, monkeypatch, KeyError('占总股本持股比例'))
+    assert holder_store.first_holder_ratio('600000', '20240805') is None
+    assert holder_store._load()['sh600000'] == {'20240630': None}
+
+
+def test_first_holder_ratio_reads_first_holder(holder_store, calls):
+    ratio = holder_store.first_holder_ratio('600000', '20240805')
+    assert ratio > 0
+    assert holder_store.first_holder_ratio('600000', '20240805') == ratio
+    assert calls('stock_gdfx_top_10_em') == 1
+
+
+def test_load_change_panel_saves_for_worker_processes(holder_store):
+    symbols = ['600000', '601000']
+    holder_store.load_change_panel('20240801', '20240805', symbols)
+    assert holder_store._changes_unsaved == 0
+    saved = pd.read_parquet(holder_store.CHANGE_FILE)
+    assert set(saved['股票代码']) == set(symbols)
+
+
+def test_holder_counts_point_in_time(holder_store, calls):
+    counts = holder_store.holder_counts('20240815', ['600000', '000001'])
+    assert calls('stock_zh_a_gdhs_detail_em') == 2
+    # 二季度的股东户数 8 月 9 日公告，8 月 8 日还只能看到一季度的
+    assert list(counts.index) == ['600000', '000001']
+    assert set(counts['报告期']) == {pd.Timestamp('2024-06-30')}
+    assert set(holder_store.holder_counts('20240808', ['600000'])['报告期']) == {pd.Timestamp('2024-03-31')}
+    assert (counts['股东户数'] > 0).all() and (counts['总股本'] > 0).all()
+    assert holder_store.update_counts(['600000', '000001']) == 0
+    assert holder_store.holder_counts('20000101', ['600000']).empty
+
+
+def test_bulk_holder_counts_match_per_symbol(holder_store, use_bulk, calls):
+    symbols = ['600000', '000001', '601000']
+    per_symbol = holder_store.holder_counts('20240815', symbols)
+
+    use_bulk()
+    periods = holder_store.data_planner.periods_to_fetch({}, symbols, holder_store.latest_due_period()[0])
+    assert holder_store.update_counts(symbols, force=True) == len(periods)
+    assert calls('stock_zh_a_gdhs') == len(periods)
+    pd.testing.assert_frame_equal(holder_store.holder_counts('20240815', symbols), per_symbol)
+    assert calls('stock_zh_a_gdhs_detail_em') == 3
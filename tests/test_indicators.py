@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import indicators
+
+
+def _prices():
+    rng = np.random.default_rng(0)
+    values = 1000 + np.cumsum(rng.normal(size=(40, 3)), axis=0)
+    values[5, 0] = np.nan
+    values[20:23, 1] = np.nan
+    return values
+
+
+def _pandas_slope(values, window):
+    x = np.arange(window)
+    return pd.DataFrame(values).rolling(window).apply(lambda y: np.polyfit(x, y, 1)[0], raw=True).values
+
+
+def test_ma_matches_pandas_with_nan():
+    values = _prices()
+    expected = pd.DataFrame(values).rolling(5).mean().values
+    np.testing.assert_allclose(indicators.ma(values, 5), expected, rtol=1e-10)
+    np.testing.assert_allclose(indicators.ma(values[:, 1], 5), expected[:, 1], rtol=1e-10)
+
+
+def test_ma_recovers_after_window_passes_nan():
+    result = indicators.ma(np.array([1.0, 2.0, np.nan, 4.0, 5.0, 6.0, 7.0]), 3)
+    np.testing.assert_allclose(result, [np.nan, np.nan, np.nan, np.nan, np.nan, 5.0, 6.0])
+
+
+def test_rolling_slope_matches_least_squares():
+    values = _prices()
+    np.testing.assert_allclose(indicators.rolling_slope(values, 10), _pandas_slope(values, 10),
+                               rtol=1e-6, atol=1e-9)
+
+
+def test_slope_of_last_window():
+    values = _prices()
+    np.testing.assert_allclose(indicators.slope(values, 10), _pandas_slope(values, 10)[-1], rtol=1e-6)
+    assert indicators.slope([1.0, 3.0, 5.0, 7.0]) == 2.0
+    assert np.isnan(indicators.slope([1.0, 2.0], 5))
+    assert indicators.slope(values[:3], 5).shape == (3,)
+
+
+def test_amplitude_ignores_nan():
+    values = np.array([[10.0, np.nan], [12.0, np.nan], [np.nan, np.nan], [8.0, np.nan]])
+    result = indicators.amplitude(values)
+    np.testing.assert_allclose(result[0], 12.0 / 8.0 - 1)
+    assert np.isnan(result[1])
+    assert indicators.amplitude([10.0, 20.0, 11.0], window=2) == 20.0 / 11.0 - 1
+
+
+def test_streaks():
+    mask = np.array([[True, False, True], [False, True, True], [True, True, True]])
+    assert list(indicators.streaks(mask)) == [1, 2, 3]
+    assert indicators.streaks([True, True, False]) == 0
@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import jq_data
+import jq_engine
+import trade_calendar
+
+A = '600000.XSHG'
+B = '600004.XSHG'
+BENCHMARK = '000300.XSHG'
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """2024-08-02 作为前收盘价的预热行，回测区间 2024-08-05 ~ 2024-08-07：
+    A 每天开收盘都是 10 元；B 08-05 开盘涨停、08-06 停牌、08-07 开盘跌停"""
+    days = trade_calendar.trading_range('2024-08-02', '2024-08-07')
+    panel = jq_data.DailyPanel(days, [A, B, BENCHMARK])
+    for field in ('open', 'close', 'high', 'low'):
+        panel.arrays[field][:, 0] = 10.0
+        panel.arrays[field][:, 2] = 3000.0
+    panel.arrays['open'][:, 1] = [10.0, 11.0, np.nan, 9.0]
+    panel.arrays['close'][:, 1] = [10.0, 10.0, np.nan, 9.0]
+    panel.arrays['volume'][:] = 1e6
+    panel.arrays['money'][:] = 1e7
+    strategy = tmp_path / 'strategy.py'
+    strategy.write_text('def initialize(context):\n    pass\n', encoding='utf-8')
+    engine = jq_engine.Engine(str(strategy), '2024-08-05', '2024-08-07', capital=100000, panel=panel)
+    engine.slippage = jq_engine.FixedSlippage(0)
+    return engine
+
+
+def _at(engine, day, clock='09:30'):
+    engine.context.current_dt = pd.Timestamp(f"{day} {clock}").to_pydatetime()
+
+
+def test_order_cost_fee_uses_min_commission_and_close_tax():
+    cost = jq_engine.OrderCost()
+    assert cost.fee(10000, True) == 5
+    assert cost.fee(100000, True) == pytest.approx(30)
+    assert cost.fee(10000, False) == pytest.approx(5 + 10)
+    assert cost.fee(100000, False) == pytest.approx(30 + 100)
+
+
+def test_buy_rounds_down_to_lots_and_charges_fee(engine):
+    _at(engine, '2024-08-05')
+    order = engine.order(A, 250)
+    assert order.amount == 200 and order.price == 10.0 and order.commission == 5
+    portfolio = engine.context.portfolio
+    assert portfolio.cash == pytest.approx(100000 - 2000 - 5)
+    assert portfolio.positions[A].total_amount == 200
+    assert engine.order(A, 99) is None
+
+
+def test_buy_limited_by_cash(engine):
+    _at(engine, '2024-08-05')
+    order = engine.order(A, 100000)
+    # 10000 股的成本加佣金超过了 10 万元现金，按手减到买得起为止
+    assert order.amount == 9900
+    assert engine.context.portfolio.cash >= 0
+
+
+def test_rejects_limit_up_buy_paused_and_limit_down_sell(engine):
+    portfolio = engine.context.portfolio
+    position = portfolio.positions[B]
+    position.total_amount = position.closeable_amount = 1000
+    portfolio.positions[B] = position
+
+    _at(engine, '2024-08-05')
+    assert engine.order(B, 100) is None
+    assert engine.order(B, -100) is not None
+    _at(engine, '2024-08-06')
+    assert engine.order(B, -100) is None
+    assert engine.order(B, 100) is None
+    _at(engine, '2024-08-07')
+    assert engine.order(B, -100) is None
+    assert engine.order(B, 100) is not None
+    assert portfolio.positions[B].total_amount == 1000
+
+
+def test_sell_odd_lot_only_when_closing_whole_position(engine):
+    portfolio = engine.context.portfolio
+    position = portfolio.positions[A]
+    position.total_amount = position.closeable_amount = 350
+    portfolio.positions[A] = position
+    _at(engine, '2024-08-05')
+    assert engine.order(A, -250).amount == 200
+    assert engine.order(A, -500).amount == 150
+    assert A not in portfolio.positions
+
+
+def test_t_plus_one_through_backtest(engine, tmp_path):
+    strategy = tmp_path / 'strategy.py'
+    strategy.write_text(
+        "def initialize(context):\n"
+        "    g.sold = []\n"
+        "    run_daily(trade, '9:30')\n"
+        "\n"
+        "def trade(context):\n"
+        "    if context.current_dt.day == 5:\n"
+        "        order('600000.XSHG', 1000)\n"
+        "    g.sold.append(order('600000.XSHG', -1000) is not None)\n",
+        encoding='utf-8')
+    results = engine.run()
+    # 当天买入的不能卖，第二天可以全部卖出
+    assert engine.g.sold == [False, True, False]
+    assert list(results['positions']) == [1, 0, 0]
+
+
+def test_strategy_using_finance_fails_at_load(engine, tmp_path):
+    strategy = tmp_path / 'finance_strategy.py'
+    strategy.write_text("from jqdata import finance\n\ndef initialize(context):\n    pass\n", encoding='utf-8')
+    engine.strategy_path = str(strategy)
+    with pytest.raises(ImportError, match='finance'):
+        engine.load_strategy()
+
+
+def test_unsupported_names():
+    with open(os.path.join(os.path.dirname(jq_engine.__file__), 'lirunbenpao.py'), encoding='utf-8') as f:
+        assert jq_engine.unsupported_names(f.read()) == ['finance']
+    assert jq_engine.unsupported_names("from jqdata import *\nq = finance.run_query(None)\n") == ['finance']
+    assert jq_engine.unsupported_names("finance = 1\nprint(finance)\n") == []
+    assert jq_engine.unsupported_names("from jqdata import *\nget_price('000001.XSHE')\n") == []
+
+
+def test_unsupported_queries_raise_value_error(engine):
+    api = jq_engine.Api(engine)
+    _at(engine, '2024-08-05')
+    with pytest.raises(ValueError, match='statDate'):
+        api.get_fundamentals(None, statDate='2023q4')
+    with pytest.raises(ValueError, match='频率'):
+        api.get_price(A, count=1, frequency='1w')
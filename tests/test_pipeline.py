@@ -0,0 +1,53 @@
+import pytest
+
+import fetch_engine
+import pipeline
+
+
+def _flaky(calls, bad='B'):
+    """批量取数函数：codes 中含 bad 时像 store 一样抛出 FetchFailed"""
+    def fetch(codes, date):
+        calls.append(list(codes))
+        if bad in codes:
+            raise fetch_engine.FetchFailed({bad: ConnectionError('timeout')})
+        return {code: 1.0 for code in codes}
+    return fetch
+
+
+def test_batch_source_marks_failed_stocks_and_refetches_the_rest():
+    calls = []
+    result = pipeline.batch_source('x', _flaky(calls), cost=1).fetch(['A', 'B', 'C'], '20240805')
+    assert result['A'] == 1.0 and result['C'] == 1.0
+    assert isinstance(result['B'], pipeline.FetchError)
+    assert calls == [['A', 'B', 'C'], ['A', 'C']]
+
+
+def test_batch_source_reraises_failures_outside_codes():
+    def fetch(codes, date):
+        raise fetch_engine.FetchFailed({'Z': ConnectionError('timeout')})
+    with pytest.raises(fetch_engine.FetchFailed):
+        pipeline.batch_source('x', fetch, cost=1).fetch(['A'], '20240805')
+
+
+def test_failed_stocks_are_never_reported_done():
+    source = pipeline.batch_source('x', _flaky([]), cost=1)
+    stage = pipeline.Stage('s', ['x'], lambda values: values['x'] is not None and values['x'] > 0)
+    screen = pipeline.Pipeline([source], [stage])
+    done = []
+    selected, _ = screen.run(['A', 'B', 'C'], '20240805', lambda code, ok, values: done.append((code, ok)))
+    assert selected == ['A', 'C']
+    assert sorted(done) == [('A', True), ('C', True)]
+    assert set(screen.last_failed) == {'B'}
+
+
+def test_per_stock_source_errors_land_in_last_failed():
+    def holder(code, date):
+        if code == 'B':
+            raise ConnectionError('timeout')
+        return 40.0
+    source = pipeline.per_stock_source('x', holder, cost=1)
+    screen = pipeline.Pipeline([source], [pipeline.Stage('s', ['x'], lambda values: values['x'] >= 30)])
+    done = []
+    screen.run(['A', 'B'], '20240805', lambda code, ok, values: done.append(code))
+    assert done == ['A']
+    assert set(screen.last_failed) == {'B'}
@@ -0,0 +1,126 @@
+# 交易日历
+# 交易日历只下载一次，存为有序的 datetime64 数组并缓存到本地，每天最多刷新一次。
+# 前一交易日、后一交易日、平移 N 个交易日和区间查询都是对有序数组的 searchsorted，可以一次处理一批日期。
+import os
+import time
+import threading
+
+import akshare as ak
+import numpy as np
+import pandas as pd
+
+import fetch_engine
+from config import DATA_DIR
+
+CALENDAR_FILE = os.path.join(DATA_DIR, 'trade_calendar.npy')
+# 本地日历超过这么多秒没有刷新就重新下载
+REFRESH_SECONDS = 24 * 3600
+
+_lock = threading.Lock()
+_days = None
+_loaded_at = 0.0
+
+
+def _download():
+    trading_calendar = fetch_engine.call(ak.tool_trade_date_hist_sina)
+    days = pd.to_datetime(trading_calendar['trade_date']).values.astype('datetime64[D]')
+    return np.unique(days)
+
+
+def trading_days():
+    """全部交易日（有序 datetime64[D] 数组），本地缓存过期时才重新下载"""
+    global _days, _loaded_at
+    with _lock:
+        now = time.time()
+        if _days is not None and now - _loaded_at < REFRESH_SECONDS:
+            return _days
+        if _days is None and os.path.exists(CALENDAR_FILE) and now - os.path.getmtime(CALENDAR_FILE) < REFRESH_SECONDS:
+            _days = np.load(CALENDAR_FILE)
+            _loaded_at = os.path.getmtime(CALENDAR_FILE)
+            return _days
+        try:
+            days = _download()
+            os.makedirs(DATA_DIR, exist_ok=True)
+            tmp = CALENDAR_FILE + '.tmp.npy'
+            np.save(tmp, days)
+            os.replace(tmp, CALENDAR_FILE)
+            _days, _loaded_at = days, now
+        except Exception as e:
+            # 下载失败时退回到旧的本地日历
+            if _days is None and os.path.exists(CALENDAR_FILE):
+                _days = np.load(CALENDAR_FILE)
+            if _days is None:
+                raise
+            print(f"刷新交易日历失败，使用本地缓存: {e}")
+            _loaded_at = now
+        return _days
+
+
+def _as_days(dates):
+    """把单个日期或一批日期转成 datetime64[D] 数组，同时返回是否为单个日期"""
+    scalar = np.ndim(dates) == 0
+    days = pd.to_datetime(np.atleast_1d(dates)).values.astype('datetime64[D]')
+    return days, scalar
+
+
+def _wrap(days, scalar):
+    result = pd.DatetimeIndex(days.astype('datetime64[ns]'))
+    return result[0] if scalar else result
+
+
+def _take(positions):
+    """按位置取交易日，越界的位置返回 NaT"""
+    days = trading_days()
+    valid = (positions >= 0) & (positions < len(days))
+    result = np.full(len(positions), np.datetime64('NaT'), dtype='datetime64[D]')
+    result[valid] = days[positions[valid]]
+    return result
+
+
+def is_trading_day(dates):
+    """是否为交易日"""
+    days, scalar = _as_days(dates)
+    calendar = trading_days()
+    pos = np.clip(np.searchsorted(calendar, days), 0, len(calendar) - 1)
+    result = calendar[pos] == days
+    return bool(result[0]) if scalar else result
+
+
+def prev_trading_day(dates):
+    """严格早于 dates 的上一个交易日"""
+    days, scalar = _as_days(dates)
+    pos = np.searchsorted(trading_days(), days, side='left') - 1
+    return _wrap(_take(pos), scalar)
+
+
+def next_trading_day(dates):
+    """严格晚于 dates 的下一个交易日"""
+    days, scalar = _as_days(dates)
+    pos = np.searchsorted(trading_days(), days, side='right')
+    return _wrap(_take(pos), scalar)
+
+
+def shift(dates, n):
+    """以不晚于 dates 的最近交易日为起点，平移 n 个交易日（n 为负表示往前）"""
+    days, scalar = _as_days(dates)
+    pos = np.searchsorted(trading_days(), days, side='right') - 1 + n
+    return _wrap(_take(pos), scalar)
+
+
+def trading_range(start_date, end_date):
+    """[start_date, end_date] 内的全部交易日"""
+    calendar = trading_days()
+    start = np.datetime64(pd.to_datetime(start_date).date(), 'D')
+    end = np.datetime64(pd.to_datetime(end_date).date(), 'D')
+    lo = np.searchsorted(calendar, start, side='left')
+    hi = np.searchsorted(calendar, end, side='right')
+    return _wrap(calendar[lo:hi], False)
+
+
+def get_trading_dates(start_date, end_date, fmt='%Y-%m-%d'):
+    """获取交易日历，返回格式化后的日期字符串列表"""
+    try:
+        return trading_range(start_date, end_date).strftime(fmt).tolist()
+    except Exception as e:
+        print(f"获取交易日历失败: {e}")
+        return []
@@ -1,27 +1,17 @@
-import akshare as ak
+import financial_abstract
 
 # stock_financial_abstract_ths_df = ak.stock_financial_abstract_ths(symbol="002693", indicator="按报告期")
 # print(stock_financial_abstract_ths_df[["报告期", "营业总收入", "扣非净利润"]].iloc[0])
 
-def convert_to_float(value_str):
-    """将带有单位的字符串数据转换为浮点数"""
-    if '亿' in value_str:
-        return float(value_str.replace('亿', '')) * 100000000
-    elif '万' in value_str:
-        return float(value_str.replace('万', '')) * 10000
-    else:
-        return float(value_str)
-
 def get_financial_data(stock_code, date):
-    """获取财务数据"""
+    """获取财务数据（财务摘要下载时已经整列解析成数字）"""
     try:
-        financial = ak.stock_financial_abstract_ths(symbol=stock_code, indicator="按报告期")
+        latest = financial_abstract.as_of(date, [stock_code], ['营业总收入', '扣非净利润'])
 
-        if not financial.empty:
-            # 获取最近的财务数据
-            latest = financial.iloc[0]
-            revenue=convert_to_float(latest['营业总收入'])
-            net_profit= convert_to_float(latest['扣非净利润'])
+        if not latest.empty:
+            # 获取 date 当天已经公告的最新一期财务数据
+            revenue = latest['营业总收入'].iloc[0]
+            net_profit = latest['扣非净利润'].iloc[0]
             return {
                 'revenue': revenue,
                 'net_profit': net_profit